@@ -2,6 +2,8 @@
 ASGI config for hens project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Serve it with an ASGI server, e.g. ``uvicorn hens.asgi:application --workers 2``,
+so the async JSON API views run natively on the event loop.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
@@ -43,10 +43,11 @@ AUTH_USER_MODEL = "home.UserProfile"
 
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
-    "django.contrib.sessions.middleware.SessionMiddleware",
+    "home.middleware.CompressionMiddleware",
+    "home.middleware.TokenSessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
-    "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "home.middleware.TokenAuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
@@ -66,8 +67,27 @@ TEMPLATES = [
             ],
         },
     },
+    {
+        # Jinja2 ports of the high-traffic pages, see JINJA2_HOT_PAGES below
+        "BACKEND": "django.template.backends.jinja2.Jinja2",
+        "DIRS": [],
+        "APP_DIRS": True,
+        "OPTIONS": {
+            "environment": "home.jinja2_env.environment",
+            "context_processors": [
+                "django.template.context_processors.request",
+                "django.contrib.auth.context_processors.auth",
+                "django.contrib.messages.context_processors.messages",
+            ],
+        },
+    },
 ]
 
+# Render the dashboards, request/farmer lists and sales report with Jinja2.
+# The Django templates remain the fallback until parity is confirmed with
+# `python manage.py benchmark_templates`.
+JINJA2_HOT_PAGES = False
+
 WSGI_APPLICATION = "hens.wsgi.application"
 
 
@@ -117,14 +137,182 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/5.2/howto/static-files/
 
 STATIC_URL = "static/"
+STATIC_ROOT = BASE_DIR / "staticfiles"
+
+# collectstatic writes a .gz copy next to every asset, served by home.staticfiles
+STORAGES = {
+    "default": {
+        "BACKEND": "django.core.files.storage.FileSystemStorage",
+    },
+    "staticfiles": {
+        "BACKEND": "home.staticfiles.GzipStaticFilesStorage",
+    },
+}
+
+# Responses smaller than this (in bytes) are not worth compressing
+COMPRESSION_MIN_SIZE = 1024
+
+# Caches. The throttle alias holds the token buckets of home.throttling and the
+# sessions alias the session data of home.sessions. The throttle buckets
+# default to each worker's memory, so with N workers a client gets up to N
+# times the configured rate; point the alias at RedisCache to share the
+# buckets and take tokens atomically across workers (see
+# home.throttling.take_token). A DatabaseCache would add writes on every
+# throttled request and needs `python manage.py createcachetable` on deploy.
+# Sessions default to files, shared by the workers of one host without adding
+# database writes; use RedisCache when the workers run on several hosts.
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    "throttle": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "home-throttle",
+        "OPTIONS": {"MAX_ENTRIES": 100000},
+    },
+    "sessions": {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": BASE_DIR / "cache" / "sessions",
+        "OPTIONS": {"MAX_ENTRIES": 100000},
+    },
+}
+THROTTLE_CACHE_ALIAS = "throttle"
+
+# Request header (as a META key) holding the client address set by a trusted
+# reverse proxy, e.g. "HTTP_X_REAL_IP" or "HTTP_X_FORWARDED_FOR". Behind a
+# proxy REMOTE_ADDR is the proxy's own address, so every client would share
+# one "ip" bucket. Leave as None when clients connect directly, as the header
+# could then be forged to dodge the limit.
+THROTTLE_CLIENT_IP_HEADER = None
+
+# Token buckets per API endpoint: bucket -> (capacity, tokens refilled per second).
+# "ip", "nin" and "user" buckets answer 429; the "global" bucket caps the whole
+# endpoint and answers 503 so a flood cannot starve the rest of the site.
+API_THROTTLES = {
+    "api_token": {
+        "ip": (10, 10 / 60),
+    },
+    "check_farmer_status": {
+        "ip": (10, 10 / 60),
+        "nin": (5, 5 / 300),
+        "global": (100, 20),
+    },
+    "get_farmer_data": {
+        "user": (60, 1),
+    },
+    "dashboard_stats_api": {
+        "user": (30, 0.5),
+    },
+    "farmer_search": {
+        "user": (60, 5),
+    },
+    "change_feed": {
+        "user": (30, 0.5),
+    },
+    "batch_ingest": {
+        "user": (10, 0.2),
+    },
+    "read_api": {
+        "user": (120, 2),
+    },
+    "jobs": {
+        "user": (60, 1),
+    },
+    "request_analytics": {
+        "user": (60, 1),
+    },
+    "farmer_cohorts": {
+        "user": (60, 1),
+    },
+    "request_sla": {
+        "user": (60, 1),
+    },
+}
+
+# Lifetime in seconds of the bearer tokens issued by /api/token/. Tokens are
+# only accepted on /api/ paths; role changes, deactivation and password changes
+# apply to existing tokens within USER_SNAPSHOT_TTL seconds.
+API_TOKEN_MAX_AGE = 60 * 60 * 12
+
+# How long a "no farmer found" status lookup is answered from cache
+FARMER_STATUS_MISS_CACHE_SECONDS = 30
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
-# Message settings
-MESSAGE_STORAGE = 'django.contrib.messages.storage.session.SessionStorage'
+# Sessions live in the "sessions" cache; their database rows are written in
+# batches of up to SESSION_WRITE_BATCH_SIZE, at most SESSION_WRITE_BATCH_SECONDS
+# after the first queued write. Logins, logouts and new sessions are written
+# at once (see home/sessions.py).
+SESSION_ENGINE = "home.sessions"
+SESSION_CACHE_ALIAS = "sessions"
+SESSION_WRITE_BATCH_SIZE = 50
+SESSION_WRITE_BATCH_SECONDS = 2
+
+# Each worker keeps a snapshot of up to USER_SNAPSHOT_CACHE_SIZE sessions'
+# users so request.user needs no query (see home/usercache.py). Saving a user
+# evicts it in the saving worker; other workers reload it within
+# USER_SNAPSHOT_TTL seconds.
+USER_SNAPSHOT_CACHE_SIZE = 1024
+USER_SNAPSHOT_TTL = 60
+
+# Background jobs (see home/jobs.py) are run by `python manage.py run_jobs`,
+# which starts JOB_WORKERS processes polling the queue every JOB_POLL_SECONDS.
+# Finished jobs are deleted after JOB_RETENTION_DAYS when run_jobs starts.
+# Running jobs send a heartbeat every JOB_HEARTBEAT_SECONDS and are queued
+# again once it is JOB_STALE_SECONDS old; a page waiting for a job that no
+# worker claimed within JOB_INLINE_AFTER_SECONDS runs it itself.
+JOB_WORKERS = 2
+JOB_POLL_SECONDS = 1
+JOB_RETENTION_DAYS = 7
+JOB_HEARTBEAT_SECONDS = 10
+JOB_STALE_SECONDS = 60
+JOB_INLINE_AFTER_SECONDS = 15
+
+# Sales reports spanning at least REPORT_PARALLEL_MIN_MONTHS months are
+# computed one month per task in REPORT_PARALLEL_WORKERS processes
+# (None: one per CPU core; see home/reports.py)
+REPORT_PARALLEL_WORKERS = None
+REPORT_PARALLEL_MIN_MONTHS = 3
+
+# The request analytics cube (home/analytics.py) and the farmer cohorts
+# (home/cohorts.py) check the change log for updates at most every
+# ANALYTICS_REFRESH_SECONDS, applying at most ANALYTICS_MAX_INCREMENTAL_CHANGES
+# entries at a time (the cube without a snapshot, and the cohorts, reload
+# everything when more are pending)
+ANALYTICS_REFRESH_SECONDS = 5
+ANALYTICS_MAX_INCREMENTAL_CHANGES = 5000
+
+# Column files written by `python manage.py build_analytics_snapshot`, mapped
+# read-only by every worker's analytics cube and farmer cohorts (see
+# home/snapshots.py). Until the first one exists the analytics and cohorts
+# APIs answer 503 and queue a job to build it.
+ANALYTICS_SNAPSHOT_DIR = BASE_DIR / "snapshots"
+
+# Month-partitioned gzip CSV/NDJSON files for BI tools, written by
+# `python manage.py export_data` (see home/exports.py). Each run also
+# re-exports rows updated up to DATA_EXPORT_WATERMARK_LAG seconds before the
+# previous run's watermark, covering transactions still open at that time.
+DATA_EXPORT_DIR = BASE_DIR / "exports"
+DATA_EXPORT_WATERMARK_LAG = 300
+
+# Chick demand forecast (see home/forecast.py), recomputed nightly by
+# `python manage.py forecast_demand`: FORECAST_WEEKS weeks projected from the
+# last FORECAST_HISTORY_WEEKS weeks of requests, with new-farmer demand
+# averaged over the last FORECAST_BASE_WEEKS of them
+FORECAST_WEEKS = 12
+FORECAST_HISTORY_WEEKS = 104
+FORECAST_BASE_WEEKS = 8
+
+# Weeks of request status durations shown by the SLA panel of the manager
+# dashboard and by /api/analytics/sla/ by default (see home/sla.py)
+SLA_WEEKS = 8
+
+# Message settings. Messages travel in a cookie and only fall back to the
+# session when they do not fit, so flashing a message costs no session write.
+MESSAGE_STORAGE = 'django.contrib.messages.storage.fallback.FallbackStorage'
 
 from django.contrib.messages import constants as messages
 MESSAGE_TAGS = {
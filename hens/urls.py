@@ -15,9 +15,11 @@ Including another URLconf
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
 
+from django.conf import settings
 from django.contrib import admin
-from django.urls import path
+from django.urls import path, re_path
 from home import views
+from home.staticfiles import serve_precompressed
 
 urlpatterns = [
     # Admin
@@ -65,7 +67,28 @@ urlpatterns = [
     path("requests/<int:pk>/authorize-sale/", views.authorize_sale, name="authorize_sale"),
     
     # API URLs
+    path("api/token/", views.api_token, name="api_token"),
     path("api/farmer/<int:farmer_id>/", views.get_farmer_data, name="api_farmer_data"),
     path("api/dashboard-stats/", views.dashboard_stats_api, name="api_dashboard_stats"),
+    path("api/farmers/search/", views.farmer_search, name="api_farmer_search"),
     path("api/check-farmer-status/", views.check_farmer_status, name="api_check_farmer_status"),
-]
\ No newline at end of file
+    path("api/changes/", views.change_feed, name="api_changes"),
+    path("api/ingest/", views.batch_ingest, name="api_batch_ingest"),
+    path("api/analytics/requests/", views.request_analytics, name="api_request_analytics"),
+    path("api/analytics/cohorts/", views.farmer_cohorts, name="api_farmer_cohorts"),
+    path("api/analytics/sla/", views.request_sla, name="api_request_sla"),
+    path("api/jobs/", views.job_submit, name="api_job_submit"),
+    path("api/jobs/<int:job_id>/", views.job_detail, name="api_job_status"),
+    path("api/jobs/<int:job_id>/result/", views.job_result, name="api_job_result"),
+    path("api/stock/", views.read_api, {"resource": "stock"}, name="api_stock_list"),
+    path("api/feedstock/", views.read_api, {"resource": "feedstock"}, name="api_feedstock_list"),
+    path("api/farmers/", views.read_api, {"resource": "farmers"}, name="api_farmer_list"),
+    path("api/requests/", views.read_api, {"resource": "requests"}, name="api_request_list"),
+]
+
+# Static files (precompressed variants from collectstatic). Production serves
+# STATIC_ROOT from the web server instead, with its gzip_static equivalent.
+if settings.DEBUG:
+    urlpatterns += [
+        re_path(rf"^{settings.STATIC_URL.lstrip('/')}(?P<path>.*)$", serve_precompressed, name="static"),
+    ]
@@ -1,12 +1,156 @@
+import csv
+
 from django.contrib import admin
+from django.contrib.admin.utils import display_for_field, label_for_field, lookup_field
 from django.contrib.auth.admin import UserAdmin
-from django.utils.html import format_html
-from .models import UserProfile, Stock, Feedstock, Farmer, ChickRequest
+from django.core.exceptions import FieldDoesNotExist
+from django.core.paginator import Paginator
+from django.db import connections, models
+from django.db.models import Max
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from django.utils.functional import cached_property
+from django.utils.html import format_html, strip_tags
+from django.utils.text import capfirst
+from .models import UserProfile, Stock, Feedstock, Farmer, ChickRequest, StatusTransition
+
+
+class ApproximateCountPaginator(Paginator):
+    """Paginator that never runs an unbounded COUNT(*)
+
+    Unfiltered changelists of large tables use the database's row estimate;
+    filtered ones count at most ``count_limit`` matching rows.
+    """
+    count_limit = 10000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.where:
+            estimate = self.estimate_rows(queryset)
+            if estimate is not None and estimate > self.count_limit:
+                return estimate
+        return queryset.order_by()[:self.count_limit].count()
+
+    def estimate_rows(self, queryset):
+        connection = connections[queryset.db]
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass', [queryset.model._meta.db_table])
+                row = cursor.fetchone()
+            return row[0] if row and row[0] >= 0 else None
+        # Highest primary key: one index probe, overestimates only by deleted rows
+        return queryset.aggregate(highest=Max('pk'))['highest']
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """ModelAdmin defaults for tables that grow without bound"""
+    paginator = ApproximateCountPaginator
+    show_full_result_count = False
+
+
+class Echo:
+    """File-like object whose write() hands the line back, so csv.writer can feed a streaming response"""
+
+    def write(self, value):
+        return value
+
+
+class CSVExportMixin:
+    """Adds an "Export to CSV" action that streams the list_display columns of the chosen rows
+
+    Selecting "all" in the changelist exports the whole filtered changelist.
+    Rows are read with a chunked iterator and written as they arrive, so an
+    export never holds the result set in memory.
+    """
+    export_chunk_size = 2000
+
+    def get_actions(self, request):
+        actions = super().get_actions(request)
+        if self.has_view_permission(request):
+            actions['export_csv'] = self.get_action('export_csv')
+        return actions
+
+    def get_export_columns(self, request):
+        return [name for name in self.get_list_display(request) if name != 'action_checkbox']
+
+    def get_export_queryset(self, request, queryset, columns):
+        """Load only the columns being exported (admin methods declare theirs via admin_order_field)"""
+        opts = self.model._meta
+        fields, related = [opts.pk.name], []
+        for name in columns:
+            try:
+                field = opts.get_field(name)
+            except FieldDoesNotExist:
+                attr = getattr(self, name, None) or getattr(self.model, name, None)
+                order_field = getattr(attr, 'admin_order_field', None)
+                if not isinstance(order_field, str) or '__' in order_field:
+                    # Unknown inputs: load whole rows rather than a query per deferred field
+                    return queryset
+                fields.append(order_field.lstrip('-'))
+                continue
+            fields.append(field.name)
+            if field.is_relation:
+                related.append(field.name)
+        # Related rows are rendered with __str__, so they are joined in whole
+        return queryset.select_related(*related).only(*fields)
+
+    def export_value(self, name, obj):
+        field, attr, value = lookup_field(name, obj, self)
+        if value is None:
+            return ''
+        if field is None or field.is_relation:
+            return strip_tags(str(value))
+        if isinstance(field, models.BooleanField):
+            return 'Yes' if value else 'No'
+        if isinstance(field, models.DateTimeField):
+            # Spreadsheet-friendly rather than the changelist's "Oct. 19, 2026, 2:42 a.m."
+            return timezone.localtime(value).strftime('%Y-%m-%d %H:%M:%S')
+        return display_for_field(value, field, '')
+
+    @admin.action(description='Export selected to CSV')
+    def export_csv(self, request, queryset):
+        columns = self.get_export_columns(request)
+        rows = self.get_export_queryset(request, queryset, columns).iterator(chunk_size=self.export_chunk_size)
+        writer = csv.writer(Echo())
+
+        def stream():
+            yield writer.writerow([capfirst(strip_tags(str(label_for_field(name, self.model, self)))) for name in columns])
+            for obj in rows:
+                yield writer.writerow([self.export_value(name, obj) for name in columns])
+
+        filename = f'{self.model._meta.model_name}-{timezone.localdate():%Y%m%d}.csv'
+        return StreamingHttpResponse(
+            stream(),
+            content_type='text/csv',
+            headers={'Content-Disposition': f'attachment; filename="{filename}"'},
+        )
+
+
+class AgeBandFilter(admin.SimpleListFilter):
+    """Fixed age bands instead of one filter entry per distinct age (a full-table scan)"""
+    title = 'age'
+    parameter_name = 'age_band'
+    bands = {
+        '18-21': (18, 21),
+        '22-25': (22, 25),
+        '26-30': (26, 30),
+    }
+
+    def lookups(self, request, model_admin):
+        return [(band, band) for band in self.bands]
+
+    def queryset(self, request, queryset):
+        if self.value() in self.bands:
+            return queryset.filter(farmer_age__range=self.bands[self.value()])
+        return queryset
 
 
 # Custom User Admin
 @admin.register(UserProfile)
 class UserProfileAdmin(UserAdmin):
+    paginator = ApproximateCountPaginator
+    show_full_result_count = False
     list_display = ('username', 'email', 'first_name', 'last_name', 'role_display', 'phone', 'is_staff', 'is_active', 'date_joined')
     list_filter = ('is_staff', 'is_active', 'is_salesagent', 'is_manager', 'date_joined')
     search_fields = ('username', 'email', 'first_name', 'last_name', 'phone')
@@ -52,9 +196,10 @@ class UserProfileAdmin(UserAdmin):
 
 # Stock Admin
 @admin.register(Stock)
-class StockAdmin(admin.ModelAdmin):
+class StockAdmin(CSVExportMixin, LargeTableAdmin):
     list_display = ('stock_name', 'chick_type', 'chick_breed', 'quantity', 'chicks_period', 'price', 'manager_name', 'date_added')
-    list_filter = ('chick_type', 'chick_breed', 'date_added', 'manager_name')
+    # Date filters offer fixed ranges; free-text fields such as manager_name are searched instead of listed
+    list_filter = ('chick_type', 'chick_breed', 'date_added')
     search_fields = ('stock_name', 'manager_name')
     ordering = ('-date_added',)
     readonly_fields = ('date_added',)
@@ -71,18 +216,15 @@ class StockAdmin(admin.ModelAdmin):
             'classes': ('collapse',)
         }),
     )
-    
-    def get_queryset(self, request):
-        qs = super().get_queryset(request)
-        return qs.select_related()
 
 
 # Feedstock Admin
 @admin.register(Feedstock)
-class FeedstockAdmin(admin.ModelAdmin):
+class FeedstockAdmin(CSVExportMixin, LargeTableAdmin):
     list_display = ('name_of_feeds', 'brand_of_feeds', 'quantity_of_feeds', 'type_of_feeds', 'selling_price', 'supplier_name', 'date')
-    list_filter = ('type_of_feeds', 'brand_of_feeds', 'date', 'supplier_name')
-    search_fields = ('name_of_feeds', 'brand_of_feeds', 'supplier_name')
+    # Free-text columns are searched rather than listed, which would scan for distinct values
+    list_filter = ('date',)
+    search_fields = ('name_of_feeds', 'type_of_feeds', 'brand_of_feeds', 'supplier_name')
     ordering = ('-date',)
     readonly_fields = ('date',)
     
@@ -105,9 +247,9 @@ class FeedstockAdmin(admin.ModelAdmin):
 
 # Farmer Admin
 @admin.register(Farmer)
-class FarmerAdmin(admin.ModelAdmin):
+class FarmerAdmin(CSVExportMixin, LargeTableAdmin):
     list_display = ('farmer_name', 'farmer_gender', 'farmer_age', 'type_of_farmer', 'phone_number', 'status_display', 'date_registered', 'nin_display')
-    list_filter = ('farmer_gender', 'type_of_farmer', 'farmer_age', 'status', 'date_registered')
+    list_filter = ('farmer_gender', 'type_of_farmer', AgeBandFilter, 'status', 'date_registered')
     search_fields = ('farmer_name', 'nin', 'phone_number', 'recommender_name')
     ordering = ('-date_registered',)
     readonly_fields = ('date_registered',)
@@ -144,6 +286,7 @@ class FarmerAdmin(admin.ModelAdmin):
         )
     
     status_display.short_description = 'Status'  # type: ignore
+    status_display.admin_order_field = 'status'  # type: ignore
     
     def approve_farmers(self, request, queryset):
         updated = queryset.update(status='approved')
@@ -169,16 +312,34 @@ class FarmerAdmin(admin.ModelAdmin):
         return "N/A"
     
     nin_display.short_description = 'NIN (Masked)'  # type: ignore
+    nin_display.admin_order_field = 'nin'  # type: ignore
+
+
+class StatusTransitionInline(admin.TabularInline):
+    """Read-only status history of a request"""
+    model = StatusTransition
+    fields = ('from_status', 'to_status', 'changed_by', 'changed_at', 'seconds_in_state')
+    readonly_fields = fields
+    ordering = ('changed_at',)
+    extra = 0
+    can_delete = False
+    
+    def has_add_permission(self, request, obj=None):
+        return False
 
 
 # ChickRequest Admin
 @admin.register(ChickRequest)
-class ChickRequestAdmin(admin.ModelAdmin):
+class ChickRequestAdmin(CSVExportMixin, LargeTableAdmin):
     list_display = ('farmer_name', 'chicks_type', 'chicks_breed', 'quantity', 'status_display', 'sales_authorized', 'feeds_needed', 'delivered', 'date_time')
     list_filter = ('status', 'chicks_type', 'chicks_breed', 'feeds_needed', 'delivered', 'sales_authorized', 'date_time')
+    list_select_related = ('farmer_name',)
+    # Substring search over a few columns, as before; the result count stays bounded by ApproximateCountPaginator
     search_fields = ('farmer_name__farmer_name', 'chicks_type', 'sales_authorized_by__username')
+    autocomplete_fields = ('farmer_name', 'sales_authorized_by')
     ordering = ('-date_time',)
     readonly_fields = ('date_time', 'sales_authorized_date')
+    inlines = [StatusTransitionInline]
     
     fieldsets = (
         ('Request Information', {
@@ -212,17 +373,21 @@ class ChickRequestAdmin(admin.ModelAdmin):
         )
     
     status_display.short_description = 'Status'  # type: ignore
+    status_display.admin_order_field = 'status'  # type: ignore
+    
+    def save_model(self, request, obj, form, change):
+        obj.save(changed_by=request.user)
     
     actions = ['approve_requests', 'reject_requests', 'mark_delivered', 'authorize_sales']
     
     def approve_requests(self, request, queryset):
-        updated = queryset.update(status='approved')
+        updated = queryset.update_by(request.user, status='approved')
         self.message_user(request, f'{updated} requests were approved.')
     
     approve_requests.short_description = "Approve selected requests"  # type: ignore
     
     def reject_requests(self, request, queryset):
-        updated = queryset.update(status='rejected')
+        updated = queryset.update_by(request.user, status='rejected')
         self.message_user(request, f'{updated} requests were rejected.')
     
     reject_requests.short_description = "Reject selected requests"  # type: ignore
@@ -235,7 +400,8 @@ class ChickRequestAdmin(admin.ModelAdmin):
     
     def authorize_sales(self, request, queryset):
         from django.utils import timezone
-        updated = queryset.filter(status='approved').update(
+        updated = queryset.filter(status='approved').update_by(
+            request.user,
             status='sold',
             sales_authorized=True,
             sales_authorized_by=request.user,
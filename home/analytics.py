@@ -0,0 +1,338 @@
+"""
+Columnar analytics over chick requests.
+
+RequestCube holds every ChickRequest joined with its Farmer as NumPy columns:
+categoricals are dictionary-encoded into small integer codes and dates are
+datetime64 values in the current timezone. A group-by folds the codes of the
+chosen dimensions into one integer key and sums the measures with bincount
+(or unique, when the key space is large), so any combination of dimensions
+and filters takes milliseconds.
+
+The cube's base columns are mapped from the latest snapshot (home/snapshots.py),
+so worker processes share them and a cold start reads no table. Until the
+first snapshot is published there is no cube and /api/analytics/ queues an
+analytics_snapshot job instead. Changes the ChangeLog records after the base
+was taken are applied incrementally: changed requests (directly or through
+their farmer) are masked out of the base and reloaded into a small private
+delta.
+"""
+import threading
+import time
+from datetime import datetime
+from typing import Optional
+
+import numpy as np
+from django.conf import settings
+from django.db.models import Max
+from django.utils import timezone
+
+from . import snapshots
+from .models import ChangeLog, ChickRequest
+
+# Dimension -> field of the rows loaded by RequestCube.load
+CATEGORICAL_DIMENSIONS = {
+    'status': 'status',
+    'chicks_type': 'chicks_type',
+    'chicks_breed': 'chicks_breed',
+    'feeds_needed': 'feeds_needed',
+    'farmer_gender': 'farmer_name__farmer_gender',
+    'type_of_farmer': 'farmer_name__type_of_farmer',
+}
+# Dimension -> date column it groups by calendar month
+MONTH_DIMENSIONS = {
+    'month': 'day',
+    'sale_month': 'sale_day',
+}
+DIMENSIONS = (*CATEGORICAL_DIMENSIONS, *MONTH_DIMENSIONS)
+
+BINCOUNT_MAX_GROUPS = 1 << 22  # larger key spaces are grouped with np.unique instead
+
+
+class Dictionary:
+    """Append-only mapping between category values and their integer codes"""
+
+    def __init__(self, values=()):
+        self.values = list(values)
+        self.codes = {value: code for code, value in enumerate(self.values)}
+
+    def __len__(self):
+        return len(self.values)
+
+    def encode(self, values) -> np.ndarray:
+        codes = self.codes
+        for value in values:
+            if value not in codes:
+                codes[value] = len(self.values)
+                self.values.append(value)
+        return np.fromiter((codes[value] for value in values), dtype=np.int32, count=len(values))
+
+
+def local_date(value):
+    return timezone.localdate(value) if value is not None else None
+
+
+def month_number(value: str) -> int:
+    """Months since 1970-01 of a YYYY-MM string"""
+    parsed = datetime.strptime(value, '%Y-%m')
+    return (parsed.year - 1970) * 12 + parsed.month - 1
+
+
+def month_label(number: int) -> str:
+    return f'{1970 + number // 12:04d}-{number % 12 + 1:02d}'
+
+
+def months(dates: np.ndarray) -> np.ndarray:
+    """Months since 1970-01 of datetime64 values (NaT gives the minimum int64)"""
+    return dates.astype('datetime64[M]').astype(np.int64)
+
+
+class RequestCube:
+    LOAD_FIELDS = ('pk', 'farmer_name_id', 'quantity', 'date_time', 'sales_authorized_date', *CATEGORICAL_DIMENSIONS.values())
+
+    def __init__(self):
+        self.lock = threading.Lock()  # held while swapping in new columns
+        self.dictionaries = {dimension: Dictionary() for dimension in CATEGORICAL_DIMENSIONS}
+        self.base = self.load(ChickRequest.objects.none())
+        self.live = None  # base rows not since changed, or None for all of them
+        self.delta = self.load(ChickRequest.objects.none())
+        self.snapshot_version = None
+        self.cursor = 0  # last ChangeLog id the columns reflect
+        self.refreshed_at = None
+
+    def load(self, queryset, dictionaries=None) -> dict:
+        """Columns for the requests in the queryset, encoded with the cube's (or the given) dictionaries"""
+        dictionaries = dictionaries or self.dictionaries
+        rows = list(queryset.values_list(*self.LOAD_FIELDS))
+        fields = list(zip(*rows)) if rows else [()] * len(self.LOAD_FIELDS)
+        values = dict(zip(self.LOAD_FIELDS, fields))
+        columns = {
+            'id': np.array(values['pk'], dtype=np.int64),
+            'farmer_id': np.array(values['farmer_name_id'], dtype=np.int64),
+            'quantity': np.array(values['quantity'], dtype=np.int64),
+            'day': np.array([local_date(value) for value in values['date_time']], dtype='datetime64[D]'),
+            'sale_day': np.array([local_date(value) for value in values['sales_authorized_date']], dtype='datetime64[D]'),
+        }
+        for dimension, field in CATEGORICAL_DIMENSIONS.items():
+            columns[dimension] = dictionaries[dimension].encode(values[field])
+        return columns
+
+    def map_snapshot(self, snapshot):
+        """Use the snapshot's request columns as the base, without copying them"""
+        column = lambda name: snapshot.column('chickrequest', name)
+        dictionaries = {
+            dimension: Dictionary(snapshot.dictionary('chickrequest', dimension)) for dimension in CATEGORICAL_DIMENSIONS
+        }
+        base = {
+            'id': column('id'),
+            'farmer_id': column('farmer_name_id'),
+            'quantity': column('quantity'),
+            'day': column('date_time'),
+            'sale_day': column('sales_authorized_date'),
+            **{dimension: column(dimension) for dimension in CATEGORICAL_DIMENSIONS},
+        }
+        with self.lock:
+            self.dictionaries, self.base, self.live = dictionaries, base, None
+            self.delta = self.load(ChickRequest.objects.none())
+        self.snapshot_version = snapshot.version
+        self.cursor = snapshot.change_cursor
+
+    def rebuild(self):
+        """Start over from the latest snapshot, or from the database when there is none"""
+        snapshot = snapshots.current_snapshot()
+        if snapshot is not None:
+            self.map_snapshot(snapshot)
+            return self.refresh(rebuild_if_behind=False)
+        # The cursor is taken first so changes made while loading are picked up by the next refresh
+        cursor = ChangeLog.objects.aggregate(Max('pk'))['pk__max'] or 0
+        dictionaries = {dimension: Dictionary() for dimension in CATEGORICAL_DIMENSIONS}
+        base = self.load(ChickRequest.objects.all(), dictionaries)
+        with self.lock:
+            self.dictionaries, self.base, self.live = dictionaries, base, None
+            self.delta = self.load(ChickRequest.objects.none())
+        self.snapshot_version = None
+        self.cursor = cursor
+        self.refreshed_at = timezone.now()
+
+    def refresh(self, rebuild_if_behind=True):
+        """Apply the changes logged since the last refresh, or rebuild if a new snapshot or too many changes exist"""
+        snapshot = snapshots.current_snapshot()
+        if rebuild_if_behind and snapshot is not None and snapshot.version != self.snapshot_version:
+            return self.rebuild()
+
+        max_changes = getattr(settings, 'ANALYTICS_MAX_INCREMENTAL_CHANGES', 5000)
+        entries = list(
+            ChangeLog.objects.filter(pk__gt=self.cursor, model__in=('chickrequest', 'farmer'))
+            .order_by('pk').values_list('pk', 'model', 'object_id')[:max_changes + 1]
+        )
+        if len(entries) > max_changes:
+            if snapshot is None:
+                return self.rebuild()
+            # Catch up in steps; publishing a newer snapshot is what empties the delta
+            entries = entries[:max_changes]
+        if not entries:
+            self.refreshed_at = timezone.now()
+            return
+
+        base, delta = self.base, self.delta
+        request_ids = {object_id for _, model, object_id in entries if model == 'chickrequest'}
+        farmer_ids = [object_id for _, model, object_id in entries if model == 'farmer']
+        if farmer_ids:
+            # Farmer columns are copied onto each of the farmer's requests
+            for part in (base, delta):
+                request_ids.update(part['id'][np.isin(part['farmer_id'], farmer_ids)].tolist())
+
+        changed = np.fromiter(request_ids, dtype=np.int64, count=len(request_ids))
+        live = ~np.isin(base['id'], changed)
+        if self.live is not None:
+            live &= self.live
+        keep = ~np.isin(delta['id'], changed)
+        parts = [{name: column[keep] for name, column in delta.items()}]
+        ids = sorted(request_ids)
+        for start in range(0, len(ids), 500):
+            # Deleted requests are simply not found
+            parts.append(self.load(ChickRequest.objects.filter(pk__in=ids[start:start + 500])))
+        delta = {name: np.concatenate([part[name] for part in parts]) for name in delta}
+        with self.lock:
+            self.live, self.delta = live, delta
+        self.cursor = entries[-1][0]
+        self.refreshed_at = timezone.now()
+
+    def query(self, group_by, filters) -> list:
+        """Request count and chick quantity per combination of the group_by dimensions
+
+        ``filters`` maps categorical dimensions to the values to keep and month
+        dimensions to an inclusive (first, last) range of month numbers.
+        """
+        with self.lock:
+            base, live, delta, dictionaries = self.base, self.live, self.delta, self.dictionaries
+        parts = [(base, live), (delta, None)]
+        selected = []  # (columns, row mask, month columns) per part
+        for columns, live in parts:
+            mask = np.ones(len(columns['id']), dtype=bool) if live is None else live.copy()
+            month_columns = {}
+            for dimension in set(group_by) | set(filters):
+                if dimension in MONTH_DIMENSIONS:
+                    dates = columns[MONTH_DIMENSIONS[dimension]]
+                    mask &= ~np.isnat(dates)
+                    month_columns[dimension] = months(dates)
+            for dimension, wanted in filters.items():
+                if dimension in MONTH_DIMENSIONS:
+                    first, last = wanted
+                    if first is not None:
+                        mask &= month_columns[dimension] >= first
+                    if last is not None:
+                        mask &= month_columns[dimension] <= last
+                else:
+                    codes = dictionaries[dimension].codes
+                    wanted_codes = [codes[value] for value in wanted if value in codes]
+                    mask &= np.isin(columns[dimension], wanted_codes)
+            selected.append((columns, mask, {name: values[mask] for name, values in month_columns.items()}))
+
+        # Every part folds its codes with the same radices, so keys are comparable across parts
+        radices, offsets = [], []
+        for dimension in group_by:
+            if dimension in MONTH_DIMENSIONS:
+                present = [month_columns[dimension] for _, _, month_columns in selected if len(month_columns[dimension])]
+                offset = min(int(values.min()) for values in present) if present else 0
+                radix = max(int(values.max()) for values in present) - offset + 1 if present else 1
+            else:
+                offset, radix = 0, max(len(dictionaries[dimension]), 1)
+            radices.append(radix)
+            offsets.append(offset)
+
+        keys, quantities = [], []
+        for columns, mask, month_columns in selected:
+            key = np.zeros(int(mask.sum()), dtype=np.int64)
+            for dimension, radix, offset in zip(group_by, radices, offsets):
+                if dimension in MONTH_DIMENSIONS:
+                    codes = month_columns[dimension] - offset
+                else:
+                    codes = columns[dimension][mask]
+                key = key * radix + codes
+            keys.append(key)
+            quantities.append(columns['quantity'][mask])
+        key, quantity = np.concatenate(keys), np.concatenate(quantities)
+
+        groups = int(np.prod(radices, dtype=np.float64)) if radices else 1
+        if groups <= BINCOUNT_MAX_GROUPS:
+            counts = np.bincount(key, minlength=groups)
+            totals = np.bincount(key, weights=quantity, minlength=groups)
+            keys = np.flatnonzero(counts)
+            counts, totals = counts[keys], totals[keys]
+        else:
+            keys, inverse = np.unique(key, return_inverse=True)
+            counts = np.bincount(inverse)
+            totals = np.bincount(inverse, weights=quantity)
+
+        # Unfold the keys back into each dimension's codes, last dimension first
+        labels = {}
+        remainder = keys
+        for dimension, radix, offset in reversed(list(zip(group_by, radices, offsets))):
+            codes = remainder % radix
+            remainder = remainder // radix
+            if dimension in MONTH_DIMENSIONS:
+                labels[dimension] = [month_label(int(code) + offset) for code in codes]
+            else:
+                values = dictionaries[dimension].values
+                labels[dimension] = [values[code] for code in codes]
+
+        rows = [
+            {
+                **{dimension: labels[dimension][i] for dimension in group_by},
+                'requests': int(counts[i]),
+                'quantity': int(totals[i]),
+            }
+            for i in range(len(keys))
+        ]
+        rows.sort(key=lambda row: tuple(str(row[dimension]) for dimension in group_by))
+        return rows
+
+
+def parse_query(params) -> tuple:
+    """group_by dimensions and filters from query parameters; raises ValueError when invalid
+
+    ``group_by`` is a comma-separated list of dimensions. Categorical
+    dimensions filter on comma-separated values (``status=sold,approved``);
+    month dimensions take ``<dimension>_from`` / ``<dimension>_to`` as YYYY-MM.
+    """
+    group_by = [dimension for dimension in params.get('group_by', '').split(',') if dimension]
+    unknown = [dimension for dimension in group_by if dimension not in DIMENSIONS]
+    if unknown:
+        raise ValueError(f"Unknown dimension(s): {', '.join(unknown)}. Choose from {', '.join(DIMENSIONS)}")
+    if len(set(group_by)) != len(group_by):
+        raise ValueError('Each dimension can be grouped by once')
+
+    filters = {}
+    for dimension in CATEGORICAL_DIMENSIONS:
+        if params.get(dimension):
+            filters[dimension] = params.get(dimension).split(',')
+    for dimension in MONTH_DIMENSIONS:
+        first, last = params.get(f'{dimension}_from'), params.get(f'{dimension}_to')
+        if first or last:
+            try:
+                filters[dimension] = (month_number(first) if first else None, month_number(last) if last else None)
+            except ValueError:
+                raise ValueError(f'{dimension}_from and {dimension}_to must be YYYY-MM')
+    return group_by, filters
+
+
+_cube = None
+_cube_lock = threading.Lock()
+_last_refresh = 0.0
+
+
+def request_cube() -> Optional[RequestCube]:
+    """This process's cube, refreshed at most every ANALYTICS_REFRESH_SECONDS; None until a snapshot exists"""
+    global _cube, _last_refresh
+    with _cube_lock:
+        if _cube is None:
+            # Built from the database the first request would wait for every table to load
+            if snapshots.current_snapshot() is None:
+                return None
+            _cube = RequestCube()
+            _cube.rebuild()
+            _last_refresh = time.monotonic()
+        elif time.monotonic() - _last_refresh >= getattr(settings, 'ANALYTICS_REFRESH_SECONDS', 5):
+            _cube.refresh()
+            _last_refresh = time.monotonic()
+        return _cube
@@ -0,0 +1,252 @@
+"""
+Starter-to-returning cohort analytics.
+
+Farmers are grouped into cohorts by registration month. For every cohort
+FarmerCohorts keeps, as counters:
+
+- its size;
+- per month since registration, how many of its farmers made a request
+  (rejected requests do not count);
+- per number of days between a farmer's first and second request, how many
+  farmers came back after that long.
+
+All three are additive over farmers, so the counters are built in one sorted
+pass over the farmer and request columns with NumPy and kept current
+incrementally: the farmers touched by the changes the ChangeLog records have
+their contribution subtracted, their rows reloaded and their contribution
+added back. Each process's first build maps the latest analytics snapshot
+(home/snapshots.py), so it reads no table; until the first snapshot exists
+there are no counters and /api/analytics/cohorts/ queues an
+analytics_snapshot job instead, like /api/analytics/.
+"""
+import threading
+import time
+from collections import Counter
+from typing import Optional
+
+import numpy as np
+from django.conf import settings
+from django.db.models import Max
+from django.utils import timezone
+
+from . import snapshots
+from .analytics import month_label, months
+from .models import ChangeLog, ChickRequest, Farmer
+
+STRIDE = 1 << 12  # packs (cohort, months or days) pairs into one integer key
+
+
+def counter(keys: np.ndarray) -> Counter:
+    values, counts = np.unique(keys, return_counts=True)
+    return Counter(dict(zip(values.tolist(), counts.tolist())))
+
+
+class FarmerCohorts:
+    def __init__(self):
+        self.lock = threading.Lock()  # held while swapping in new counters
+        self.farmers = self.load_farmers(Farmer.objects.none())
+        self.requests = self.load_requests(ChickRequest.objects.none())
+        self.sizes = Counter()  # cohort -> farmers
+        self.active = Counter()  # cohort * STRIDE + months since registration -> farmers who requested
+        self.returns = Counter()  # cohort * STRIDE + days from first to second request -> farmers
+        self.cursor = 0  # last ChangeLog id the counters reflect
+        self.refreshed_at = None
+
+    @staticmethod
+    def load_farmers(queryset) -> dict:
+        rows = list(queryset.order_by('pk').values_list('pk', 'date_registered'))
+        ids, registered = zip(*rows) if rows else ((), ())
+        return {'id': np.array(ids, dtype=np.int64), 'cohort': months(snapshots.local_wall_times(registered))}
+
+    @staticmethod
+    def load_requests(queryset) -> dict:
+        rows = list(queryset.exclude(status='rejected').values_list('pk', 'farmer_name_id', 'date_time'))
+        ids, farmer_ids, dates = zip(*rows) if rows else ((), (), ())
+        return {
+            'id': np.array(ids, dtype=np.int64),
+            'farmer_id': np.array(farmer_ids, dtype=np.int64),
+            'day': snapshots.local_wall_times(dates).astype('datetime64[D]'),
+        }
+
+    @staticmethod
+    def contribution(farmers, requests) -> tuple:
+        """The (sizes, active, returns) counters of the given farmers and their requests"""
+        sizes = counter(farmers['cohort'])
+        position = np.searchsorted(farmers['id'], requests['farmer_id'])
+        known = position < len(farmers['id'])
+        known[known] = farmers['id'][position[known]] == requests['farmer_id'][known]
+        farmer_id, day, position = requests['farmer_id'][known], requests['day'][known], position[known]
+        cohort = farmers['cohort'][position]
+
+        # Months since registration in which each farmer requested, counted once per farmer
+        offset = np.clip(months(day) - cohort, 0, STRIDE - 1)
+        requested = np.unique(position * STRIDE + offset)
+        active = counter(farmers['cohort'][requested // STRIDE] * STRIDE + requested % STRIDE)
+
+        # Sorted by farmer and date, a farmer's second request directly follows the first
+        order = np.lexsort((day, farmer_id))
+        farmer_id, day, cohort = farmer_id[order], day[order], cohort[order]
+        first = np.ones(len(farmer_id), dtype=bool)
+        first[1:] = farmer_id[1:] != farmer_id[:-1]
+        second = np.flatnonzero(first[:-1] & ~first[1:]) + 1
+        days = np.clip((day[second] - day[second - 1]).astype(np.int64), 0, STRIDE - 1)
+        returns = counter(cohort[second] * STRIDE + days)
+        return sizes, active, returns
+
+    def rebuild(self, use_snapshot=True):
+        """Start over from the latest snapshot, or from the database when there is none"""
+        snapshot = snapshots.current_snapshot() if use_snapshot else None
+        if snapshot is not None:
+            order = np.argsort(snapshot.column('farmer', 'id'), kind='stable')
+            farmers = {
+                'id': np.asarray(snapshot.column('farmer', 'id'))[order],
+                'cohort': months(np.asarray(snapshot.column('farmer', 'date_registered'))[order]),
+            }
+            statuses = snapshot.dictionary('chickrequest', 'status')
+            counted = ~np.isin(
+                snapshot.column('chickrequest', 'status'),
+                [code for code, status in enumerate(statuses) if status == 'rejected'],
+            )
+            requests = {
+                'id': np.asarray(snapshot.column('chickrequest', 'id'))[counted],
+                'farmer_id': np.asarray(snapshot.column('chickrequest', 'farmer_name_id'))[counted],
+                'day': np.asarray(snapshot.column('chickrequest', 'date_time'))[counted].astype('datetime64[D]'),
+            }
+            cursor = snapshot.change_cursor
+        else:
+            # The cursor is taken first so changes made while loading are picked up by the next refresh
+            cursor = ChangeLog.objects.aggregate(Max('pk'))['pk__max'] or 0
+            farmers = self.load_farmers(Farmer.objects.all())
+            requests = self.load_requests(ChickRequest.objects.all())
+        sizes, active, returns = self.contribution(farmers, requests)
+        with self.lock:
+            self.farmers, self.requests = farmers, requests
+            self.sizes, self.active, self.returns = sizes, active, returns
+        self.cursor = cursor
+        self.refreshed_at = timezone.now()
+        if snapshot is not None:
+            self.refresh()
+
+    def refresh(self):
+        """Apply the changes logged since the last refresh, or rebuild when too many are pending"""
+        max_changes = getattr(settings, 'ANALYTICS_MAX_INCREMENTAL_CHANGES', 5000)
+        entries = list(
+            ChangeLog.objects.filter(pk__gt=self.cursor, model__in=('chickrequest', 'farmer'))
+            .order_by('pk').values_list('pk', 'model', 'object_id')[:max_changes + 1]
+        )
+        if len(entries) > max_changes:
+            # A snapshot would be at least as far behind
+            return self.rebuild(use_snapshot=False)
+        if not entries:
+            self.refreshed_at = timezone.now()
+            return
+
+        request_ids = sorted({object_id for _, model, object_id in entries if model == 'chickrequest'})
+        farmer_ids = {object_id for _, model, object_id in entries if model == 'farmer'}
+        # Deleted rows are simply not found
+        loaded = [self.load_requests(ChickRequest.objects.none())]
+        for start in range(0, len(request_ids), 500):
+            loaded.append(self.load_requests(ChickRequest.objects.filter(pk__in=request_ids[start:start + 500])))
+        loaded = {name: np.concatenate([part[name] for part in loaded]) for name in self.requests}
+
+        farmers, requests = self.farmers, self.requests
+        replaced = np.isin(requests['id'], request_ids)
+        farmer_ids.update(requests['farmer_id'][replaced].tolist())
+        farmer_ids.update(loaded['farmer_id'].tolist())
+        affected = np.fromiter(farmer_ids, dtype=np.int64, count=len(farmer_ids))
+
+        def of_affected(farmers, requests):
+            farmer_mask = np.isin(farmers['id'], affected)
+            request_mask = np.isin(requests['farmer_id'], affected)
+            return (
+                {name: column[farmer_mask] for name, column in farmers.items()},
+                {name: column[request_mask] for name, column in requests.items()},
+            )
+
+        old = self.contribution(*of_affected(farmers, requests))
+        reloaded = self.load_farmers(Farmer.objects.filter(pk__in=farmer_ids))
+        kept = ~np.isin(farmers['id'], affected)
+        farmers = {name: np.concatenate([column[kept], reloaded[name]]) for name, column in farmers.items()}
+        order = np.argsort(farmers['id'], kind='stable')
+        farmers = {name: column[order] for name, column in farmers.items()}
+        requests = {name: np.concatenate([column[~replaced], loaded[name]]) for name, column in requests.items()}
+        new = self.contribution(*of_affected(farmers, requests))
+
+        counters = []
+        for current, removed, added in zip((self.sizes, self.active, self.returns), old, new):
+            updated = current.copy()
+            updated.subtract(removed)
+            updated.update(added)
+            counters.append(+updated)  # drops the keys that reached zero
+        with self.lock:
+            self.farmers, self.requests = farmers, requests
+            self.sizes, self.active, self.returns = counters
+        self.cursor = entries[-1][0]
+        self.refreshed_at = timezone.now()
+
+    def matrix(self, first=None, last=None, max_months=None) -> list:
+        """One row per cohort (registration month) between the first and last month numbers
+
+        ``retention`` holds, for each month since registration up to the
+        current one, the share of the cohort's farmers who made a request in
+        that month; ``returned`` counts the farmers who made a second request.
+        """
+        with self.lock:
+            sizes, active, returns = self.sizes, self.active, self.returns
+        current_month = int(months(np.datetime64(timezone.localdate(), 'D')))
+        cohorts = sorted(
+            cohort for cohort in sizes
+            if (first is None or cohort >= first) and (last is None or cohort <= last)
+        )
+        return_days = {}
+        for key, count in returns.items():
+            return_days.setdefault(key // STRIDE, []).append((key % STRIDE, count))
+
+        rows = []
+        for cohort in cohorts:
+            size = sizes[cohort]
+            elapsed = max(current_month - cohort, 0)
+            if max_months is not None:
+                elapsed = min(elapsed, max_months - 1)
+            counts = [active.get(cohort * STRIDE + offset, 0) for offset in range(elapsed + 1)]
+            durations = sorted(return_days.get(cohort, []))
+            returned = sum(count for _, count in durations)
+            median = None
+            seen = 0
+            for days, count in durations:
+                seen += count
+                if seen * 2 >= returned:
+                    median = days
+                    break
+            rows.append({
+                'cohort': month_label(cohort),
+                'farmers': size,
+                'returned': returned,
+                'return_rate': round(returned / size, 4) if size else 0,
+                'median_days_to_return': median,
+                'active': counts,
+                'retention': [round(count / size, 4) if size else 0 for count in counts],
+            })
+        return rows
+
+
+_cohorts = None
+_cohorts_lock = threading.Lock()
+_last_refresh = 0.0
+
+
+def farmer_cohorts() -> Optional[FarmerCohorts]:
+    """This process's cohort counters, refreshed at most every ANALYTICS_REFRESH_SECONDS; None until a snapshot exists"""
+    global _cohorts, _last_refresh
+    with _cohorts_lock:
+        if _cohorts is None:
+            # Built from the database the first request would wait for both tables to load
+            if snapshots.current_snapshot() is None:
+                return None
+            _cohorts = FarmerCohorts()
+            _cohorts.rebuild()
+            _last_refresh = time.monotonic()
+        elif time.monotonic() - _last_refresh >= getattr(settings, 'ANALYTICS_REFRESH_SECONDS', 5):
+            _cohorts.refresh()
+            _last_refresh = time.monotonic()
+        return _cohorts
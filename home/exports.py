@@ -0,0 +1,205 @@
+"""
+Incremental, month-partitioned data exports for BI tools.
+
+export_tables() writes each table under DATA_EXPORT_DIR as one gzip-compressed
+CSV or NDJSON file per calendar month (``<table>/month=YYYY-MM/part.csv.gz``)
+and records a watermark per table in manifest.json. A run only rewrites the
+months that changed since the last one: those holding rows whose updated_at
+passed the watermark (or whose copied related columns, like a sale's farmer
+name, changed since), plus those whose row count no longer matches the
+manifest, which catches deleted rows and rows that moved to another month.
+A table whose columns or format changed is rewritten in full.
+Files are replaced atomically, so readers never see a partial partition.
+"""
+import csv
+import gzip
+import io
+import json
+import os
+import shutil
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Count, F, Max, Q
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import ChickRequest, Farmer, Feedstock, Stock
+from .reports import CHICK_PRICE
+
+MANIFEST = 'manifest.json'
+FORMATS = {
+    # format: file name inside each partition
+    'csv': 'part.csv.gz',
+    'ndjson': 'part.ndjson.gz',
+}
+
+
+def model_columns(model) -> dict:
+    return {field.attname: F(field.attname) for field in model._meta.concrete_fields}
+
+
+# Table: (queryset factory, month partition field, column -> expression,
+# updated_at lookups of the rows each exported row copies columns from)
+EXPORT_TABLES = {
+    'chickrequest': (lambda: ChickRequest.objects.all(), 'date_time', model_columns(ChickRequest), ('updated_at',)),
+    'sales': (
+        lambda: ChickRequest.objects.filter(status='sold', sales_authorized_date__isnull=False),
+        'sales_authorized_date',
+        {
+            'request_id': F('pk'),
+            'sales_authorized_date': F('sales_authorized_date'),
+            'farmer_id': F('farmer_name_id'),
+            'farmer_name': F('farmer_name__farmer_name'),
+            'farmer_nin': F('farmer_name__nin'),
+            # Only the id: users carry no updated_at to tell when a copied username went stale
+            'sales_agent_id': F('sales_authorized_by_id'),
+            'chicks_type': F('chicks_type'),
+            'chicks_breed': F('chicks_breed'),
+            'quantity': F('quantity'),
+            'value': F('quantity') * CHICK_PRICE,
+            'delivered': F('delivered'),
+            'updated_at': F('updated_at'),
+        },
+        ('updated_at', 'farmer_name__updated_at'),
+    ),
+    'farmer': (lambda: Farmer.objects.all(), 'date_registered', model_columns(Farmer), ('updated_at',)),
+    'stock': (lambda: Stock.objects.all(), 'date_added', model_columns(Stock), ('updated_at',)),
+    'feedstock': (lambda: Feedstock.objects.all(), 'date', model_columns(Feedstock), ('updated_at',)),
+}
+
+
+def export_dir():
+    return os.fspath(getattr(settings, 'DATA_EXPORT_DIR', os.path.join(settings.BASE_DIR, 'exports')))
+
+
+def month_key(value) -> str:
+    return timezone.localtime(value).strftime('%Y-%m')
+
+
+def month_range(key: str) -> tuple:
+    start = datetime.strptime(key, '%Y-%m')
+    end = (start + timedelta(days=32)).replace(day=1)
+    return timezone.make_aware(start), timezone.make_aware(end)
+
+
+def read_manifest(root) -> dict:
+    try:
+        with open(os.path.join(root, MANIFEST)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {'tables': {}}
+
+
+def write_manifest(root, manifest):
+    tmp = os.path.join(root, f'.{MANIFEST}.tmp')
+    with open(tmp, 'w') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tmp, os.path.join(root, MANIFEST))
+
+
+def csv_value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return '' if value is None else value
+
+
+def write_partition(path, export_format, columns, rows) -> int:
+    """Write the rows as a gzip-compressed partition file, replacing any previous one atomically"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f'{path}.tmp'
+    count = 0
+    # mtime=0 keeps the bytes of unchanged partitions identical between runs
+    with open(tmp, 'wb') as raw, gzip.GzipFile(fileobj=raw, mode='wb', mtime=0) as compressed:
+        with io.TextIOWrapper(compressed, encoding='utf-8', newline='') as f:
+            if export_format == 'csv':
+                writer = csv.writer(f)
+                writer.writerow(columns)
+                for row in rows:
+                    writer.writerow([csv_value(value) for value in row])
+                    count += 1
+            else:
+                for row in rows:
+                    f.write(json.dumps(dict(zip(columns, row)), cls=DjangoJSONEncoder, separators=(',', ':')) + '\n')
+                    count += 1
+    os.replace(tmp, path)
+    return count
+
+
+def changed_months(name, state, full=False) -> tuple:
+    """Months to rewrite for a table, the current row count per month and the new watermark"""
+    queryset, partition_field, expressions, timestamps = EXPORT_TABLES[name]
+    counts = {
+        month_key(row['month']): row['rows']
+        for row in queryset().annotate(month=TruncMonth(partition_field)).values('month').annotate(rows=Count('pk'))
+    }
+    latest = queryset().aggregate(**{f'latest_{index}': Max(lookup) for index, lookup in enumerate(timestamps)})
+    watermark = max(filter(None, latest.values()), default=None)
+    exported = state.get('partitions', {})
+    if full or not state.get('watermark') or state.get('columns') != list(expressions):
+        return set(counts) | set(exported), counts, watermark
+
+    # Rows saved in transactions that committed after the last run started can carry an older updated_at
+    since = parse_datetime(state['watermark']) - timedelta(seconds=getattr(settings, 'DATA_EXPORT_WATERMARK_LAG', 300))
+    updated = Q()
+    for lookup in timestamps:
+        updated |= Q(**{f'{lookup}__gt': since})
+    months = {
+        month_key(value)
+        for value in queryset().filter(updated).values_list(partition_field, flat=True).distinct()
+    }
+    # Deleted rows and rows moved to another month only show up in the counts
+    months |= {
+        month for month in set(counts) | set(exported)
+        if counts.get(month, 0) != exported.get(month, {}).get('rows', 0)
+    }
+    return months, counts, watermark
+
+
+def export_table(root, name, export_format, state, full=False) -> list:
+    """Rewrite the table's changed partitions and update its manifest entry; returns the rewritten months"""
+    queryset, partition_field, expressions, _ = EXPORT_TABLES[name]
+    months, counts, watermark = changed_months(name, state, full)
+    columns = list(expressions)
+    partitions = state.setdefault('partitions', {})
+    for month in sorted(months):
+        directory = os.path.join(root, name, f'month={month}')
+        if not counts.get(month):
+            shutil.rmtree(directory, ignore_errors=True)
+            partitions.pop(month, None)
+            continue
+        start, end = month_range(month)
+        rows = queryset().filter(**{f'{partition_field}__gte': start, f'{partition_field}__lt': end}).annotate(
+            **{f'export_{column}': expression for column, expression in expressions.items()}
+        ).order_by(partition_field, 'pk').values_list(*[f'export_{column}' for column in columns]).iterator(chunk_size=2000)
+        written = write_partition(os.path.join(directory, FORMATS[export_format]), export_format, columns, rows)
+        partitions[month] = {
+            'rows': written,
+            'file': f'{name}/month={month}/{FORMATS[export_format]}',
+            'exported_at': timezone.now().isoformat(),
+        }
+    if watermark is not None:
+        state['watermark'] = watermark.isoformat()
+    state['columns'] = columns
+    return sorted(months)
+
+
+def export_tables(names=None, export_format='csv', full=False) -> dict:
+    """Bring the exports of the given tables (all by default) up to date; returns the rewritten months per table"""
+    root = export_dir()
+    os.makedirs(root, exist_ok=True)
+    manifest = read_manifest(root)
+    rewritten = {}
+    for name in names or EXPORT_TABLES:
+        state = manifest['tables'].get(name, {})
+        if state.get('format') != export_format:
+            # Switching format replaces every partition of the table
+            shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+            state = {'format': export_format}
+        manifest['tables'][name] = state
+        rewritten[name] = export_table(root, name, export_format, state, full)
+        # Saved after each table so an interrupted run keeps the finished ones
+        write_manifest(root, manifest)
+    return rewritten
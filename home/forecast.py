@@ -0,0 +1,207 @@
+"""
+Chick demand forecasting per type and breed.
+
+build_forecast() projects the chicks requested per (type, breed) for each of
+the next FORECAST_WEEKS weeks as the sum of two parts:
+
+- new demand (farmers' first requests): the average of the last
+  FORECAST_BASE_WEEKS complete weeks, scaled by how demand moved over the same
+  weeks one year earlier when there is a year of history;
+- returning demand: each farmer's latest approved or sold request comes back
+  REQUEST_COOLDOWN_DAYS later, weighted by the share of past requests of that
+  type and breed that were followed by another one.
+
+Weekly series are built with NumPy over every request at once. The forecast
+runs as the "demand_forecast" background job, recomputed nightly by
+``python manage.py forecast_demand``; pages compare the stored result with
+the current stock (stock_outlook()).
+"""
+from datetime import date, timedelta
+from typing import Optional
+
+import numpy as np
+from django.conf import settings
+from django.db.models import Sum
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from .models import REQUEST_COOLDOWN_DAYS, ChickRequest, Job, Stock
+
+YEAR_WEEKS = 52
+
+
+def forecast_params(params) -> dict:
+    default = getattr(settings, 'FORECAST_WEEKS', 12)
+    try:
+        weeks = int(params.get('weeks', default))
+    except (TypeError, ValueError):
+        weeks = default
+    # Part of the job key, so each day gets a fresh forecast
+    return {'weeks': min(max(weeks, 1), 26), 'as_of': timezone.localdate().isoformat()}
+
+
+def load_requests() -> dict:
+    """Column arrays of every request that was not rejected, sorted by farmer and date"""
+    rows = list(ChickRequest.objects.exclude(status='rejected').values_list(
+        'farmer_name_id', 'date_time', 'chicks_type', 'chicks_breed', 'quantity', 'status',
+    ))
+    groups = sorted({(chicks_type, chicks_breed) for _, _, chicks_type, chicks_breed, _, _ in rows})
+    codes = {group: code for code, group in enumerate(groups)}
+    count = len(rows)
+    columns = {
+        'farmer': np.fromiter((row[0] for row in rows), dtype=np.int64, count=count),
+        'day': np.fromiter((timezone.localtime(row[1]).toordinal() for row in rows), dtype=np.int64, count=count),
+        'code': np.fromiter((codes[row[2], row[3]] for row in rows), dtype=np.int64, count=count),
+        'quantity': np.fromiter((row[4] for row in rows), dtype=np.float64, count=count),
+        'active': np.fromiter((row[5] in ('approved', 'sold') for row in rows), dtype=bool, count=count),
+    }
+    order = np.lexsort((columns['day'], columns['farmer']))
+    columns = {name: values[order] for name, values in columns.items()}
+    columns['groups'] = groups
+    return columns
+
+
+def weekly_series(code, week, quantity, mask, group_count, weeks) -> np.ndarray:
+    """groups x weeks totals of the masked rows whose week index is in [-weeks, 0)"""
+    selected = mask & (week >= -weeks) & (week < 0)
+    totals = np.bincount(
+        code[selected] * weeks + week[selected] + weeks, weights=quantity[selected], minlength=group_count * weeks,
+    )
+    return totals.reshape(group_count, weeks)
+
+
+def seasonal_ratio(new_series, horizon, base_weeks, first_week) -> np.ndarray:
+    """groups x horizon factors: last year's demand in the projected weeks over its preceding base weeks"""
+    history = new_series.shape[1]
+    group_count = new_series.shape[0]
+    # Needs the series to reach back before last year's base weeks
+    if history < YEAR_WEEKS + base_weeks + 1 or first_week > -(YEAR_WEEKS + base_weeks):
+        return np.ones((group_count, horizon))
+    # Columns of the same weeks one year earlier, smoothed over the neighbouring weeks
+    same_week = history + np.arange(1, horizon + 1) - YEAR_WEEKS
+    last_year = (new_series[:, same_week - 1] + new_series[:, same_week] + new_series[:, same_week + 1]) / 3
+    last_year_base = new_series[:, history - YEAR_WEEKS - base_weeks:history - YEAR_WEEKS].mean(axis=1, keepdims=True)
+    ratio = np.divide(last_year, last_year_base, out=np.ones_like(last_year), where=last_year_base > 0)
+    # Groups with no sales at all a year ago carry no seasonal signal
+    ratio[(last_year_base[:, 0] == 0)] = 1
+    return ratio
+
+
+def return_rates(data, today_ordinal, grace_days) -> np.ndarray:
+    """Per group, the share of approved or sold requests followed by another request from the same farmer"""
+    day, farmer, code = data['day'], data['farmer'], data['code']
+    group_count = len(data['groups'])
+    has_next = np.zeros(len(day), dtype=bool)
+    has_next[:-1] = farmer[1:] == farmer[:-1]
+    next_day = np.roll(day, -1)
+    window = REQUEST_COOLDOWN_DAYS + grace_days
+    # Only requests old enough for their farmer to have come back count
+    eligible = data['active'] & (day + window <= today_ordinal)
+    returned = eligible & has_next & (next_day - day <= window)
+    eligible_counts = np.bincount(code[eligible], minlength=group_count)
+    returned_counts = np.bincount(code[returned], minlength=group_count)
+    overall = returned_counts.sum() / eligible_counts.sum() if eligible_counts.sum() else 0.0
+    return np.divide(
+        returned_counts, eligible_counts, out=np.full(group_count, overall), where=eligible_counts > 0,
+    )
+
+
+def build_forecast(weeks: Optional[int] = None, today: Optional[date] = None) -> dict:
+    """Weekly demand projection per type and breed for the weeks after the current one"""
+    horizon = weeks or getattr(settings, 'FORECAST_WEEKS', 12)
+    history = getattr(settings, 'FORECAST_HISTORY_WEEKS', 104)
+    base_weeks = getattr(settings, 'FORECAST_BASE_WEEKS', 8)
+    today = today or timezone.localdate()
+    week_start = today - timedelta(days=today.weekday())
+    origin = week_start.toordinal()
+
+    data = load_requests()
+    groups = data['groups']
+    group_count = len(groups)
+    day, code, quantity, active = data['day'], data['code'], data['quantity'], data['active']
+    # Week 0 is the current, incomplete week; the forecast covers weeks 1..horizon
+    week = (day - origin) // 7
+    first = np.ones(len(day), dtype=bool)
+    first[1:] = data['farmer'][1:] != data['farmer'][:-1]
+    last = np.ones(len(day), dtype=bool)
+    last[:-1] = data['farmer'][1:] != data['farmer'][:-1]
+
+    new_series = weekly_series(code, week, quantity, first, group_count, history)
+    all_series = new_series + weekly_series(code, week, quantity, ~first, group_count, history)
+    base = new_series[:, -base_weeks:].mean(axis=1, keepdims=True)
+    new_demand = base * seasonal_ratio(new_series, horizon, base_weeks, week.min(initial=0))
+
+    rates = return_rates(data, today.toordinal(), base_weeks * 7)
+    due_week = (day + REQUEST_COOLDOWN_DAYS - origin) // 7
+    due = active & last & (due_week >= 1) & (due_week <= horizon)
+    returning = np.bincount(
+        code[due] * horizon + due_week[due] - 1, weights=quantity[due] * rates[code[due]],
+        minlength=group_count * horizon,
+    ).reshape(group_count, horizon)
+    projected = (new_demand + returning).round().astype(int)
+
+    return {
+        'generated_at': timezone.now().isoformat(),
+        'week_starts': [(week_start + timedelta(weeks=offset)).isoformat() for offset in range(1, horizon + 1)],
+        'history_week_starts': [
+            (week_start - timedelta(weeks=offset)).isoformat() for offset in range(base_weeks, 0, -1)
+        ],
+        'groups': [
+            {
+                'chicks_type': chicks_type,
+                'chicks_breed': chicks_breed,
+                'history': all_series[index, -base_weeks:].round().astype(int).tolist(),
+                'new': new_demand[index].round(1).tolist(),
+                'returning': returning[index].round(1).tolist(),
+                'projected': projected[index].tolist(),
+                'projected_total': int(projected[index].sum()),
+                'return_rate': round(float(rates[index]), 3),
+            }
+            for index, (chicks_type, chicks_breed) in enumerate(groups)
+        ],
+    }
+
+
+def run_forecast(params) -> dict:
+    return build_forecast(weeks=params['weeks'], today=parse_date(params['as_of']))
+
+
+def latest_forecast() -> Optional[dict]:
+    """The most recently finished forecast, or None before the first one"""
+    job = Job.objects.filter(kind='demand_forecast', status='done').order_by('-finished_at').first()
+    return job.result if job is not None else None
+
+
+def stock_outlook(forecast: dict) -> list:
+    """Per type and breed, current stock against open requests plus projected demand, largest shortfall first"""
+    in_stock = {
+        (row['chick_type'], row['chick_breed']): row['total']
+        for row in Stock.objects.values('chick_type', 'chick_breed').annotate(total=Sum('quantity'))
+    }
+    # Stock is not drawn down until delivery, so open requests are still owed from it
+    open_requests = {
+        (row['chicks_type'], row['chicks_breed']): row['total']
+        for row in ChickRequest.objects.filter(status__in=('pending', 'approved'))
+        .values('chicks_type', 'chicks_breed').annotate(total=Sum('quantity'))
+    }
+    projections = {(group['chicks_type'], group['chicks_breed']): group for group in forecast['groups']}
+    week_starts = [parse_date(value) for value in forecast['week_starts']]
+
+    outlook = []
+    for key in sorted(set(in_stock) | set(open_requests) | set(projections)):
+        stock = in_stock.get(key) or 0
+        owed = open_requests.get(key) or 0
+        weekly = projections[key]['projected'] if key in projections else [0] * len(week_starts)
+        needed = owed + np.cumsum(weekly)
+        short = np.flatnonzero(needed > stock)
+        outlook.append({
+            'chicks_type': key[0],
+            'chicks_breed': key[1],
+            'in_stock': stock,
+            'open_requests': owed,
+            'projected': int(sum(weekly)),
+            'shortfall': max(int(needed[-1]) - stock, 0) if len(needed) else max(owed - stock, 0),
+            'short_from': week_starts[short[0]] if len(short) else None,
+        })
+    outlook.sort(key=lambda row: (-row['shortfall'], row['chicks_type'], row['chicks_breed']))
+    return outlook
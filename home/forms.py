@@ -3,6 +3,7 @@ from django import forms
 from .models import UserProfile, Stock, Feedstock, Farmer, ChickRequest
 from django.forms import ModelForm
 from django.core.exceptions import ValidationError
+from django.urls import reverse_lazy
 
 class UserCreation(UserCreationForm):
     email = forms.EmailField(required=True, widget=forms.EmailInput(attrs={'class': 'form-control'}))
@@ -89,10 +90,10 @@ class FarmerForm(ModelForm):
         }
 
 class ChickRequestForm(ModelForm):
+    # Chosen through the typeahead (farmer_typeahead.js); a <select> would render every approved farmer
     farmer_name = forms.ModelChoiceField(
         queryset=Farmer.objects.filter(status='approved'),
-        widget=forms.Select(attrs={'class': 'form-control'}),
-        empty_label="Select a farmer"
+        widget=forms.HiddenInput(attrs={'data-farmer-search': reverse_lazy('api_farmer_search')}),
     )
     
     class Meta:
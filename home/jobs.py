@@ -0,0 +1,208 @@
+"""
+Local background jobs.
+
+Views and the /api/jobs/ endpoints queue work with submit(); the worker
+processes started by ``python manage.py run_jobs`` claim queued rows of the
+Job table and store their JSON result. A submission with the same kind and
+parameters as an earlier job gets that job back, finished or not, unless the
+ChangeLog shows that one of the models the result depends on changed since
+the job started, or, for kinds with their own check, that the changes alter
+the result.
+
+A running job's worker bumps its heartbeat every JOB_HEARTBEAT_SECONDS. A job
+whose heartbeat is older than JOB_STALE_SECONDS was left by a worker that
+died and is queued again; a job no worker has claimed within
+JOB_INLINE_AFTER_SECONDS may be run by the request waiting for it (see
+run_unclaimed).
+"""
+import hashlib
+import json
+import logging
+import os
+import socket
+import threading
+import time
+from datetime import timedelta
+from typing import Callable, NamedTuple, Optional
+
+from django.conf import settings
+from django.db import close_old_connections, connection
+from django.db.models import Max
+from django.utils import timezone
+
+from . import forecast, reports, snapshots
+from .models import ChangeLog, Job
+
+logger = logging.getLogger(__name__)
+
+
+class JobKind(NamedTuple):
+    clean_params: Callable  # submitted params -> normalized, JSON-serializable params
+    run: Callable  # normalized params -> JSON-serializable result
+    depends_on: tuple  # ChangeLog.model values whose changes make a result stale
+    permission: str  # user flag required to submit the job or read its result
+    # finished job -> whether the changes since it started alter its result; by default any change to depends_on does
+    is_stale: Optional[Callable] = None
+
+
+JOB_KINDS = {
+    'sales_report': JobKind(
+        reports.sales_report_params, reports.run_sales_report, ('chickrequest', 'farmer'), 'is_manager',
+        reports.sales_report_is_stale,
+    ),
+    'demand_forecast': JobKind(
+        forecast.forecast_params, forecast.run_forecast, ('chickrequest',), 'is_manager',
+    ),
+    'analytics_snapshot': JobKind(
+        snapshots.snapshot_params, snapshots.run_snapshot, (), 'is_manager', snapshots.snapshot_is_stale,
+    ),
+}
+
+
+def params_key(kind: str, params: dict) -> str:
+    return hashlib.sha256(json.dumps([kind, params], sort_keys=True).encode()).hexdigest()
+
+
+def can_access(user, kind: str) -> bool:
+    return kind in JOB_KINDS and getattr(user, JOB_KINDS[kind].permission, False)
+
+
+def is_stalled(job: Job) -> bool:
+    """Whether a running job's worker stopped sending heartbeats"""
+    last_beat = job.heartbeat_at or job.started_at
+    cutoff = timezone.now() - timedelta(seconds=getattr(settings, 'JOB_STALE_SECONDS', 60))
+    return job.status == 'running' and (last_beat is None or last_beat < cutoff)
+
+
+def requeue(job: Job) -> Job:
+    """Queue a stalled job again, unless its worker finished it or another caller requeued it meanwhile"""
+    Job.objects.filter(pk=job.pk, status='running', worker=job.worker, started_at=job.started_at).update(
+        status='queued', worker='', started_at=None, heartbeat_at=None,
+    )
+    job.refresh_from_db()
+    return job
+
+
+def is_current(job: Job) -> bool:
+    """Whether the job's result (or the one it will produce) still matches the data"""
+    if job.status in ('queued', 'running'):
+        return True
+    if job.status == 'failed':
+        return False
+    kind = JOB_KINDS[job.kind]
+    if kind.is_stale is not None:
+        return not kind.is_stale(job)
+    return not ChangeLog.objects.filter(pk__gt=job.change_mark, model__in=kind.depends_on).exists()
+
+
+def submit(kind: str, params: dict, user=None) -> Job:
+    """The job computing ``kind`` for the params, reusing a current one when there is one"""
+    params = JOB_KINDS[kind].clean_params(params)
+    key = params_key(kind, params)
+    job = Job.objects.filter(params_key=key).exclude(status='failed').order_by('-pk').first()
+    if job is not None and is_stalled(job):
+        job = requeue(job)
+    if job is not None and is_current(job):
+        return job
+    return Job.objects.create(kind=kind, params=params, params_key=key, created_by=user)
+
+
+def claim(job: Job, worker: str) -> bool:
+    """Mark a queued job as running for this worker; False if another worker got it first"""
+    # Taken before the job reads anything, so later changes make it stale
+    change_mark = ChangeLog.objects.aggregate(Max('pk'))['pk__max'] or 0
+    now = timezone.now()
+    claimed = Job.objects.filter(pk=job.pk, status='queued').update(
+        status='running', worker=worker, change_mark=change_mark, started_at=now, heartbeat_at=now,
+    )
+    if claimed:
+        job.refresh_from_db()
+    return bool(claimed)
+
+
+def claim_next(worker: str) -> Optional[Job]:
+    """Mark the oldest queued job as running for this worker and return it"""
+    while True:
+        job = Job.objects.filter(status='queued').order_by('pk').first()
+        if job is None:
+            return None
+        if claim(job, worker):
+            return job
+        # Another worker got it first
+
+
+def heartbeat(job_id: int, done: threading.Event):
+    """Bump the running job's heartbeat_at until it is done (run in a thread next to the job)"""
+    interval = getattr(settings, 'JOB_HEARTBEAT_SECONDS', 10)
+    try:
+        while not done.wait(interval):
+            Job.objects.filter(pk=job_id, status='running').update(heartbeat_at=timezone.now())
+    finally:
+        # The thread's own connection
+        connection.close()
+
+
+def run(job: Job):
+    done = threading.Event()
+    beat = threading.Thread(target=heartbeat, args=(job.pk, done), name=f'job-{job.pk}-heartbeat', daemon=True)
+    beat.start()
+    try:
+        result = JOB_KINDS[job.kind].run(job.params)
+    except Exception as exc:
+        logger.exception('Job %s failed', job.pk)
+        Job.objects.filter(pk=job.pk).update(status='failed', error=repr(exc), finished_at=timezone.now())
+    else:
+        Job.objects.filter(pk=job.pk).update(status='done', result=result, finished_at=timezone.now())
+    finally:
+        done.set()
+        beat.join()
+
+
+def run_unclaimed(job: Job) -> Job:
+    """Run a job here if no worker has claimed it within JOB_INLINE_AFTER_SECONDS, e.g. when run_jobs is down"""
+    cutoff = timezone.now() - timedelta(seconds=getattr(settings, 'JOB_INLINE_AFTER_SECONDS', 15))
+    if job.status == 'queued' and job.created_at < cutoff and claim(job, worker_name('inline:')):
+        run(job)
+        job.refresh_from_db()
+    return job
+
+
+def requeue_abandoned() -> int:
+    """Queue again the jobs left running by workers that stopped; run_jobs must be the only runner"""
+    return Job.objects.filter(status='running').update(status='queued', worker='', started_at=None, heartbeat_at=None)
+
+
+def requeue_stalled() -> int:
+    """Queue again the running jobs whose heartbeat stopped, while other workers keep running"""
+    cutoff = timezone.now() - timedelta(seconds=getattr(settings, 'JOB_STALE_SECONDS', 60))
+    stalled = Job.objects.filter(status='running', heartbeat_at__lt=cutoff)
+    # Checked first so an idle queue costs no write
+    if not stalled.exists():
+        return 0
+    return stalled.update(status='queued', worker='', started_at=None, heartbeat_at=None)
+
+
+def prune_finished() -> int:
+    cutoff = timezone.now() - timedelta(days=getattr(settings, 'JOB_RETENTION_DAYS', 7))
+    deleted, _ = Job.objects.filter(status__in=('done', 'failed'), finished_at__lt=cutoff).delete()
+    return deleted
+
+
+def worker_name(prefix: str = '') -> str:
+    return f'{prefix}{socket.gethostname()}:{os.getpid()}'[:50]
+
+
+def work(once: bool = False):
+    """Worker process loop: run queued jobs, polling when the queue is empty"""
+    worker = worker_name()
+    poll_seconds = getattr(settings, 'JOB_POLL_SECONDS', 1)
+    while True:
+        close_old_connections()
+        requeue_stalled()
+        job = claim_next(worker)
+        if job is None:
+            if once:
+                return
+            time.sleep(poll_seconds)
+            continue
+        run(job)
@@ -0,0 +1,169 @@
+import json
+import os
+import secrets
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from importlib import import_module
+
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+
+from home.models import UserProfile, Farmer
+
+SERVERS = {
+    # name: (executable, command line template)
+    'wsgi': ('gunicorn', ['gunicorn', 'hens.wsgi:application', '--workers', '{workers}', '--bind', '127.0.0.1:{port}']),
+    'asgi': ('uvicorn', ['uvicorn', 'hens.asgi:application', '--workers', '{workers}', '--host', '127.0.0.1', '--port', '{port}', '--log-level', 'warning']),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare how the JSON API endpoints handle concurrent clients under WSGI (gunicorn) '
+        'and ASGI (uvicorn) with the same number of workers'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--username', required=True, help='User whose session authenticates the requests')
+        parser.add_argument('--workers', type=int, default=2, help='Worker processes for both servers')
+        parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 10, 50], help='Concurrent clients')
+        parser.add_argument('--requests', type=int, default=500, help='Requests per endpoint and concurrency level')
+        parser.add_argument('--servers', nargs='+', choices=sorted(SERVERS), default=['wsgi', 'asgi'])
+
+    def handle(self, *args, **options):
+        try:
+            user = UserProfile.objects.get(username=options['username'])
+        except UserProfile.DoesNotExist:
+            raise CommandError(f'User "{options["username"]}" does not exist')
+
+        farmer = Farmer.objects.order_by('pk').first()
+        if farmer is None:
+            raise CommandError('At least one farmer is needed to benchmark the farmer endpoints')
+
+        headers = self.auth_headers(user)
+        endpoints = [
+            ('dashboard_stats_api', 'GET', reverse('api_dashboard_stats'), None),
+            ('get_farmer_data', 'GET', reverse('api_farmer_data', args=[farmer.pk]), None),
+            ('check_farmer_status', 'POST', reverse('api_check_farmer_status'),
+             json.dumps({'nin': farmer.nin, 'phone': farmer.phone_number}).encode()),
+        ]
+
+        self.stdout.write(f"{'server':<6}{'endpoint':<22}{'clients':>8}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'errors':>8}")
+        with tempfile.TemporaryDirectory() as settings_dir:
+            env = self.server_env(settings_dir)
+            for server in options['servers']:
+                with self.run_server(server, options['workers'], env) as base_url:
+                    for name, method, path, body in endpoints:
+                        for concurrency in options['concurrency']:
+                            result = self.load(base_url + path, method, body, headers, concurrency, options['requests'])
+                            self.stdout.write(
+                                f"{server:<6}{name:<22}{concurrency:>8}{result['rps']:>10.1f}"
+                                f"{result['p50']:>10.1f}{result['p95']:>10.1f}{result['errors']:>8}"
+                            )
+
+    def server_env(self, settings_dir):
+        """Environment running the servers with the current settings minus API_THROTTLES
+
+        With the endpoints' token buckets in place most requests would be
+        answered 429 and counted as errors instead of measuring the views.
+        """
+        with open(os.path.join(settings_dir, 'benchmark_settings.py'), 'w') as module:
+            module.write(f'from {settings.SETTINGS_MODULE} import *\n\nAPI_THROTTLES = {{}}\n')
+        return {
+            **os.environ,
+            'DJANGO_SETTINGS_MODULE': 'benchmark_settings',
+            'PYTHONPATH': os.pathsep.join(filter(None, [settings_dir, str(settings.BASE_DIR), os.environ.get('PYTHONPATH')])),
+        }
+
+    def auth_headers(self, user):
+        """Create a logged-in session for the user plus a CSRF cookie/header pair"""
+        # The configured engine, so the servers find the session where they look for it
+        session = import_module(settings.SESSION_ENGINE).SessionStore()
+        session[SESSION_KEY] = str(user.pk)
+        session[BACKEND_SESSION_KEY] = 'django.contrib.auth.backends.ModelBackend'
+        session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+        session.create()
+
+        csrf_secret = secrets.token_hex(16)
+        return {
+            'Cookie': f'{settings.SESSION_COOKIE_NAME}={session.session_key}; {settings.CSRF_COOKIE_NAME}={csrf_secret}',
+            'X-CSRFToken': csrf_secret,
+            'Content-Type': 'application/json',
+        }
+
+    def run_server(self, server, workers, env):
+        executable, template = SERVERS[server]
+        if shutil.which(executable) is None:
+            raise CommandError(f'{executable} is not installed; install it to benchmark the {server.upper()} deployment')
+        return _Server(template, workers, settings.BASE_DIR, env)
+
+    def load(self, url, method, body, headers, concurrency, total):
+        """Fire `total` requests from `concurrency` client threads and summarise the latencies"""
+        def one_request(_):
+            request = urllib.request.Request(url, data=body, headers=headers, method=method)
+            start = time.perf_counter()
+            try:
+                with urllib.request.urlopen(request, timeout=30) as response:
+                    response.read()
+                ok = True
+            except (urllib.error.URLError, OSError):
+                ok = False
+            return ok, (time.perf_counter() - start) * 1000
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            results = list(pool.map(one_request, range(total)))
+        elapsed = time.perf_counter() - start
+
+        latencies = sorted(latency for ok, latency in results if ok)
+        return {
+            'rps': len(latencies) / elapsed,
+            'p50': statistics.median(latencies) if latencies else 0,
+            'p95': latencies[int(len(latencies) * 0.95) - 1] if latencies else 0,
+            'errors': total - len(latencies),
+        }
+
+
+class _Server:
+    """Context manager that starts an application server on a free port and stops it afterwards"""
+
+    def __init__(self, template, workers, cwd, env=None):
+        with socket.socket() as sock:
+            sock.bind(('127.0.0.1', 0))
+            self.port = sock.getsockname()[1]
+        self.command = [part.format(workers=workers, port=self.port) for part in template]
+        self.cwd = cwd
+        self.env = env
+        self.process = None
+
+    def __enter__(self):
+        self.process = subprocess.Popen(self.command, cwd=self.cwd, stdout=subprocess.DEVNULL, stderr=sys.stderr, env=self.env)
+        base_url = f'http://127.0.0.1:{self.port}'
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            try:
+                urllib.request.urlopen(base_url + reverse('login'), timeout=1).read()
+                return base_url
+            except (urllib.error.URLError, OSError):
+                if self.process.poll() is not None:
+                    raise CommandError(f'{self.command[0]} exited with code {self.process.returncode}')
+                time.sleep(0.2)
+        self.__exit__(None, None, None)
+        raise CommandError(f'{self.command[0]} did not start within 30 seconds')
+
+    def __exit__(self, exc_type, exc, tb):
+        self.process.terminate()
+        try:
+            self.process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
@@ -0,0 +1,41 @@
+import os
+import time
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from home.reports import build_sales_report, can_partition, month_partitions
+
+
+class Command(BaseCommand):
+    help = 'Time the sales report computed serially and in month partitions, and check both give the same result'
+
+    def add_arguments(self, parser):
+        parser.add_argument('start_date', help='YYYY-MM-DD')
+        parser.add_argument('end_date', help='YYYY-MM-DD')
+        parser.add_argument(
+            '--workers', type=int, nargs='+', default=[os.cpu_count() or 1], help='Process counts to compare',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            start_date = datetime.strptime(options['start_date'], '%Y-%m-%d').date()
+            end_date = datetime.strptime(options['end_date'], '%Y-%m-%d').date()
+        except ValueError:
+            raise CommandError('Dates must be given as YYYY-MM-DD')
+        if not can_partition():
+            raise CommandError('Partitioned reports need a database that worker processes can open')
+
+        self.stdout.write(f'{len(month_partitions(start_date, end_date))} month partitions')
+        self.stdout.write(f"{'workers':<10}{'seconds':>10}{'speedup':>10}  matches serial")
+        serial_seconds, serial = self.time_report(start_date, end_date, 1)
+        self.stdout.write(f"{1:<10}{serial_seconds:>10.2f}{1:>9.1f}x  -")
+        for workers in options['workers']:
+            seconds, result = self.time_report(start_date, end_date, workers)
+            matches = 'yes' if result == serial else 'NO'
+            self.stdout.write(f'{workers:<10}{seconds:>10.2f}{serial_seconds / seconds:>9.1f}x  {matches}')
+
+    def time_report(self, start_date, end_date, workers):
+        start = time.perf_counter()
+        result = build_sales_report(start_date, end_date, workers=workers)
+        return time.perf_counter() - start, result
@@ -0,0 +1,127 @@
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from importlib import import_module
+
+from django.contrib.messages.storage.session import SessionStorage
+from django.contrib.sessions.models import Session
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection, connections, transaction
+
+from home import sessions
+from home.models import Stock
+
+ENGINES = {
+    # name: session engine module
+    'before': 'django.contrib.sessions.backends.db',
+    'after': 'home.sessions',
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure how session writes from flash messages contend with business writes for the '
+        'SQLite write lock, with the database session engine (before) and home.sessions (after)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--page-views', type=int, default=2000, help='Simulated page views per engine')
+        parser.add_argument('--session-threads', type=int, default=8, help='Concurrent simulated browsers')
+        parser.add_argument('--writer-threads', type=int, default=2, help='Concurrent business writers')
+        parser.add_argument('--engines', nargs='+', choices=sorted(ENGINES), default=['before', 'after'])
+
+    def handle(self, *args, **options):
+        stock_pk = Stock.objects.order_by('pk').values_list('pk', flat=True).first()
+        if stock_pk is None:
+            raise CommandError('At least one stock entry is needed as the target of the business writes')
+
+        self.stdout.write(
+            f"{'engine':<8}{'session writes':>16}{'write p50 ms':>14}{'write p95 ms':>14}"
+            f"{'write max ms':>14}{'lock errors':>13}{'writes/s':>10}"
+        )
+        for name in options['engines']:
+            result = self.run(ENGINES[name], stock_pk, options)
+            self.stdout.write(
+                f"{name:<8}{result['session_writes']:>16}{result['p50']:>14.1f}{result['p95']:>14.1f}"
+                f"{result['max']:>14.1f}{result['lock_errors']:>13}{result['writes_per_second']:>10.1f}"
+            )
+
+    def run(self, engine, stock_pk, options):
+        SessionStore = import_module(engine).SessionStore
+        session_keys = []
+        for i in range(options['session_threads']):
+            store = SessionStore()
+            store['benchmark'] = i
+            store.create()
+            session_keys.append(store.session_key)
+        sessions.flush_pending()
+
+        session_writes = 0
+        counter_lock = threading.Lock()
+
+        def count_session_writes(execute, sql, params, many, context):
+            nonlocal session_writes
+            if sql.startswith(('UPDATE "django_session"', 'INSERT INTO "django_session"')):
+                with counter_lock:
+                    session_writes += 1
+            return execute(sql, params, many, context)
+
+        done = threading.Event()
+        latencies, lock_errors = [], [0]
+
+        def browser(session_key, views):
+            # Each view flashes a message and the following view displays (clears) it
+            with connection.execute_wrapper(count_session_writes):
+                for view in range(views):
+                    store = SessionStore(session_key)
+                    if view % 2 == 0:
+                        store[SessionStorage.session_key] = f'[["__json_message",0,20,"Saved item {view}"]]'
+                    else:
+                        store.pop(SessionStorage.session_key, None)
+                    try:
+                        store.save()
+                    except OperationalError:
+                        with counter_lock:
+                            lock_errors[0] += 1
+            connections.close_all()
+
+        def writer():
+            # A business write that takes the write lock without changing data or the change log
+            while not done.is_set():
+                start = time.perf_counter()
+                try:
+                    with transaction.atomic(), connection.cursor() as cursor:
+                        cursor.execute('UPDATE home_stock SET quantity = quantity WHERE id = %s', [stock_pk])
+                    with counter_lock:
+                        latencies.append((time.perf_counter() - start) * 1000)
+                except OperationalError:
+                    with counter_lock:
+                        lock_errors[0] += 1
+            connections.close_all()
+
+        views_per_browser = max(options['page_views'] // len(session_keys), 1)
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['writer_threads'] + len(session_keys)) as pool:
+            writers = [pool.submit(writer) for _ in range(options['writer_threads'])]
+            browsers = [pool.submit(browser, key, views_per_browser) for key in session_keys]
+            for future in browsers:
+                future.result()
+            done.set()
+            for future in writers:
+                future.result()
+        elapsed = time.perf_counter() - start
+
+        with connection.execute_wrapper(count_session_writes):
+            sessions.flush_pending()
+        Session.objects.filter(session_key__in=session_keys).delete()
+
+        latencies.sort()
+        return {
+            'session_writes': session_writes,
+            'p50': statistics.median(latencies) if latencies else 0,
+            'p95': latencies[int(len(latencies) * 0.95) - 1] if latencies else 0,
+            'max': latencies[-1] if latencies else 0,
+            'lock_errors': lock_errors[0],
+            'writes_per_second': len(latencies) / elapsed,
+        }
@@ -0,0 +1,259 @@
+import re
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.core.paginator import Paginator
+from django.template import engines
+from django.test import RequestFactory
+from django.urls import resolve, reverse
+from django.utils import timezone
+
+from home.models import UserProfile, Stock, Farmer, ChickRequest
+from home.sla import format_duration
+
+# Masked CSRF tokens differ on every render, so they are blanked before comparing output
+CSRF_TOKEN_RE = re.compile(r'[A-Za-z0-9]{64}')
+WHITESPACE_RE = re.compile(r'\s+')
+
+
+def sla_row(state, i):
+    p50, p90 = 600 * (i + 1), 3600 * (i + 2)
+    return {
+        'state': state, 'count': 10 + i, 'p50_seconds': p50, 'p90_seconds': p90,
+        'p50': format_duration(p50), 'p90': format_duration(p90),
+    }
+
+
+class Command(BaseCommand):
+    help = 'Compare Django and Jinja2 render times for the high-traffic pages at 10/100/1000 rows'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, nargs='+', default=[10, 100, 1000], help='Row counts to render')
+        parser.add_argument('--repeat', type=int, default=20, help='Renders per page, engine and row count')
+
+    def handle(self, *args, **options):
+        self.user = UserProfile(pk=1, username='benchmark', is_manager=True, is_salesagent=True)
+        pages = [
+            ('request_list', 'request/request_list.html', self.request_list_context),
+            ('farmer_list', 'farmer/farmer_list.html', self.farmer_list_context),
+            ('manager_dashboard', 'managerdashbord.html', self.manager_dashboard_context),
+            ('sales_dashboard', 'salesdashbord.html', self.sales_dashboard_context),
+            ('sales_report', 'reports/sales_report.html', self.sales_report_context),
+        ]
+
+        self.stdout.write(f"{'page':<20}{'rows':>6}{'django ms':>12}{'jinja2 ms':>12}{'speedup':>10}  parity")
+        for url_name, template_name, build_context in pages:
+            for rows in options['rows']:
+                context = build_context(rows)
+                django_ms, django_html = self.time_render('django', template_name, url_name, context, options['repeat'])
+                jinja_ms, jinja_html = self.time_render('jinja2', template_name, url_name, context, options['repeat'])
+                parity = 'yes' if self.normalize(django_html) == self.normalize(jinja_html) else 'NO'
+                self.stdout.write(
+                    f'{url_name:<20}{rows:>6}{django_ms:>12.2f}{jinja_ms:>12.2f}{django_ms / jinja_ms:>9.1f}x  {parity}'
+                )
+
+    def time_render(self, engine, template_name, url_name, context, repeat):
+        """Render a template repeatedly and return the mean time in ms with the last output"""
+        template = engines[engine].get_template(template_name)
+        request = self.make_request(url_name)
+        html = template.render(context, request)  # warm up caches outside the timed loop
+
+        start = time.perf_counter()
+        for _ in range(repeat):
+            html = template.render(context, request)
+        elapsed = (time.perf_counter() - start) / repeat
+        return elapsed * 1000, html
+
+    def make_request(self, url_name):
+        path = reverse(url_name)
+        request = RequestFactory().get(path)
+        request.user = self.user
+        request.resolver_match = resolve(path)
+        return request
+
+    def normalize(self, html):
+        return WHITESPACE_RE.sub(' ', CSRF_TOKEN_RE.sub('', html)).strip()
+
+    # Context builders using unsaved model instances, so no database is needed
+    def make_farmers(self, rows):
+        return [
+            Farmer(
+                pk=i + 1,
+                farmer_name=f'Farmer {i}',
+                farmer_gender='M' if i % 2 else 'F',
+                nin=f'CM{i:012d}',
+                recommender_name=f'Recommender {i}',
+                recommender_nin=f'CF{i:012d}',
+                phone_number=f'07{i:08d}',
+                farmer_age=18 + i % 13,
+                type_of_farmer='starter' if i % 3 else 'returning',
+                status=['pending', 'approved', 'rejected'][i % 3],
+                date_registered=timezone.now() - timedelta(days=i),
+            )
+            for i in range(rows)
+        ]
+
+    def make_requests(self, rows):
+        farmers = self.make_farmers(rows)
+        requests = []
+        for i, farmer in enumerate(farmers):
+            status = ['pending', 'approved', 'rejected', 'sold'][i % 4]
+            chick_request = ChickRequest(
+                pk=i + 1,
+                farmer_name=farmer,
+                chicks_type='Broilers' if i % 2 else 'Layers',
+                chicks_breed='local' if i % 3 else 'exotic',
+                quantity=50 + i % 450,
+                date_time=timezone.now() - timedelta(hours=i),
+                status=status,
+                feeds_needed='Y' if i % 2 else 'N',
+                chicks_period=i % 30,
+                sales_authorized=status == 'sold',
+                sales_authorized_by=self.user if status == 'sold' else None,
+            )
+            requests.append(chick_request)
+        return requests
+
+    def request_list_context(self, rows):
+        return {
+            'page_obj': Paginator(self.make_requests(rows), rows).get_page(1),
+            'search_query': None,
+            'status': None,
+            'status_choices': ChickRequest.STATUS_CHOICES,
+        }
+
+    def farmer_list_context(self, rows):
+        return {
+            'page_obj': Paginator(self.make_farmers(rows), rows).get_page(1),
+            'search_query': None,
+            'farmer_type': None,
+            'farmer_types': Farmer.FARMER_TYPE_CHOICES,
+        }
+
+    def manager_dashboard_context(self, rows):
+        today = timezone.localdate()
+        week_start = today - timedelta(days=today.weekday())
+        stocks = [
+            Stock(
+                pk=i + 1,
+                stock_name=f'Batch {i}',
+                quantity=100 + i,
+                date_added=timezone.now() - timedelta(days=i),
+                chick_type='Broilers' if i % 2 else 'Layers',
+                chick_breed='local',
+                manager_name='Manager',
+                chicks_period=i % 30,
+            )
+            for i in range(rows)
+        ]
+        return {
+            'total_stock': rows * 100,
+            'total_feedstock': rows * 10,
+            'total_farmers': rows,
+            'pending_requests': rows // 4,
+            'approved_requests': rows // 4,
+            'recent_stocks': stocks,
+            'recent_requests': self.make_requests(rows),
+            'stock_by_type': [
+                {'chick_type': 'Broilers', 'total_quantity': rows * 50},
+                {'chick_type': 'Layers', 'total_quantity': rows * 50},
+            ],
+            'stock_count': rows * 100,
+            'feedstock_count': rows * 10,
+            'farmer_count': rows,
+            'demand_forecast': {'week_starts': [(week_start + timedelta(weeks=i)).isoformat() for i in range(1, 13)]},
+            'forecast_generated_at': timezone.now(),
+            'stock_outlook': [
+                {
+                    'chicks_type': 'Broilers' if i % 2 else 'Layers',
+                    'chicks_breed': 'local' if i % 3 else 'exotic',
+                    'in_stock': 100 + i,
+                    'open_requests': 50 + i % 100,
+                    'projected': 80 + i % 60,
+                    'shortfall': i % 40 if i % 2 else 0,
+                    'short_from': week_start + timedelta(weeks=1 + i % 12),
+                }
+                for i in range(rows)
+            ],
+            'request_sla': {
+                'weeks': [(week_start - timedelta(weeks=i)).isoformat() for i in range(7, -1, -1)],
+                'overall': [sla_row(state, i) for i, state in enumerate(('pending', 'approved'))],
+                'users': [
+                    {**sla_row(['pending', 'approved'][i % 2], i), 'user': f'user{i}', 'role': ['manager', 'agent'][i % 2]}
+                    for i in range(rows)
+                ],
+            },
+        }
+
+    def sales_dashboard_context(self, rows):
+        return {
+            'total_farmers': rows,
+            'approved_farmers': rows // 3,
+            'pending_requests': rows // 4,
+            'approved_requests': rows // 4,
+            'sold_requests': rows // 4,
+            'total_requests': rows,
+            'my_sales': rows // 4,
+            'recent_farmers': self.make_farmers(rows),
+            'recent_requests': self.make_requests(rows),
+        }
+
+    def sales_report_context(self, rows):
+        end_date = timezone.now().date()
+        sales_by_rep = {}
+        for i in range(rows):
+            username = f'agent{i % max(rows // 10, 1)}'
+            rep = sales_by_rep.setdefault(username, {
+                'rep_name': username.title(),
+                'username': username,
+                'total_sales': 0,
+                'total_chicks': 0,
+                'total_value': 0,
+                'farmers_served': [],
+                'sales_details': [],
+            })
+            quantity = 50 + i % 450
+            rep['total_sales'] += 1
+            rep['total_chicks'] += quantity
+            rep['total_value'] += quantity * 1650
+            rep['farmers_served'].append(f'Farmer {i}')
+            rep['sales_details'].append({
+                'date': timezone.now() - timedelta(hours=i),
+                'farmer': f'Farmer {i}',
+                'chick_type': 'Broilers',
+                'chick_breed': 'local',
+                'quantity': quantity,
+                'value': quantity * 1650,
+                'request_id': i + 1,
+            })
+        for rep in sales_by_rep.values():
+            rep['unique_farmers'] = len(rep['farmers_served'])
+            rep['avg_per_sale'] = rep['total_value'] / rep['total_sales']
+
+        daily_sales = [
+            {
+                'date': end_date - timedelta(days=i),
+                'sales_count': 3,
+                'chicks_sold': 300,
+                'total_value': 300 * 1650,
+                'avg_per_sale': 100 * 1650,
+            }
+            for i in range(rows)
+        ]
+        total_value = sum(rep['total_value'] for rep in sales_by_rep.values())
+        total_chicks = sum(rep['total_chicks'] for rep in sales_by_rep.values())
+        return {
+            'start_date': end_date - timedelta(days=rows),
+            'end_date': end_date,
+            'sales_by_rep': sales_by_rep,
+            'total_sales_count': rows,
+            'total_chicks_sold': total_chicks,
+            'total_sales_value': total_value,
+            'active_sales_reps': len(sales_by_rep),
+            'top_rep': max(sales_by_rep.values(), key=lambda rep: rep['total_value']),
+            'daily_sales': daily_sales,
+            'average_sale_value': total_value / rows,
+            'average_chicks_per_sale': total_chicks / rows,
+            'generated_at': timezone.now(),
+        }
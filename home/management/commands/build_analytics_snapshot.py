@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from home.snapshots import build_snapshot, snapshot_dir
+
+
+class Command(BaseCommand):
+    help = (
+        'Write ChickRequest, Farmer, Stock and Feedstock as memory-mappable column files and publish them as '
+        'the current analytics snapshot (run from cron or a scheduler to keep analytics fresh)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--keep', type=int, default=2, help='Snapshots to keep, including the new one')
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        manifest = build_snapshot(keep=options['keep'])
+        tables = ', '.join(f"{name} {table['rows']}" for name, table in manifest['tables'].items())
+        self.stdout.write(self.style.SUCCESS(
+            f"Published snapshot {manifest['version']} in {snapshot_dir()} "
+            f"({tables} rows, {time.perf_counter() - start:.1f}s)"
+        ))
@@ -0,0 +1,38 @@
+import os
+import socket
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from home import jobs
+
+
+class Command(BaseCommand):
+    help = (
+        'Compute the chick demand forecast per type and breed and store it for the dashboards '
+        '(run nightly from cron or a scheduler)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--weeks', type=int, help='Weeks to project (default: FORECAST_WEEKS)')
+
+    def handle(self, *args, **options):
+        params = {'weeks': options['weeks']} if options['weeks'] else {}
+        job = jobs.submit('demand_forecast', params)
+        start = time.perf_counter()
+        # Run it here rather than waiting for run_jobs, unless a worker already has it
+        if job.status == 'queued' and jobs.claim(job, f'{socket.gethostname()}:{os.getpid()}'[:50]):
+            jobs.run(job)
+            job.refresh_from_db()
+        if job.status == 'failed':
+            raise CommandError(f'Forecast job {job.pk} failed: {job.error}')
+        if job.status != 'done':
+            self.stdout.write(f'Forecast job {job.pk} is {job.status} in another worker')
+            return
+        groups = ', '.join(
+            f"{group['chicks_type']} {group['chicks_breed']} {group['projected_total']}" for group in job.result['groups']
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Forecast job {job.pk}: {len(job.result['week_starts'])} weeks from {job.result['week_starts'][0]} "
+            f"({groups or 'no requests'}; {time.perf_counter() - start:.1f}s)"
+        ))
@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from home.models import Farmer
+
+COUNTER_FIELDS = Farmer.REQUEST_COUNTER_FIELDS
+
+
+class Command(BaseCommand):
+    help = 'Recompute the denormalized request counters on Farmer and fix any that have drifted'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Farmers checked per transaction')
+        parser.add_argument('--dry-run', action='store_true', help='Report drifted farmers without fixing them')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        checked = fixed = 0
+        last_pk = 0
+        while True:
+            batch = list(
+                Farmer.objects.filter(pk__gt=last_pk).order_by('pk').values('pk', *COUNTER_FIELDS)[:batch_size]
+            )
+            if not batch:
+                break
+            last_pk = batch[-1]['pk']
+            checked += len(batch)
+
+            with transaction.atomic():
+                expected = Farmer.request_stats_for(row['pk'] for row in batch)
+                for row in batch:
+                    counts = expected[row['pk']]
+                    if all(row[field] == counts[field] for field in COUNTER_FIELDS):
+                        continue
+                    fixed += 1
+                    self.stdout.write(f"Farmer {row['pk']}: {self.describe(row, counts)}")
+                    if not options['dry_run']:
+                        Farmer.objects.filter(pk=row['pk']).update(**counts)
+
+        verb = 'would be fixed' if options['dry_run'] else 'fixed'
+        self.stdout.write(self.style.SUCCESS(f'Checked {checked} farmers, {fixed} {verb}'))
+
+    def describe(self, row, counts):
+        return ', '.join(
+            f'{field} {row[field]} -> {counts[field]}' for field in COUNTER_FIELDS if row[field] != counts[field]
+        )
@@ -0,0 +1,45 @@
+import multiprocessing
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from home import jobs
+
+
+class Command(BaseCommand):
+    help = 'Run queued background jobs (see home/jobs.py) in a pool of worker processes'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=getattr(settings, 'JOB_WORKERS', 2), help='Worker processes to start',
+        )
+        parser.add_argument('--once', action='store_true', help='Exit once the queue is empty instead of polling')
+
+    def handle(self, *args, **options):
+        requeued = jobs.requeue_abandoned()
+        if requeued:
+            self.stdout.write(f'Requeued {requeued} jobs left running by a previous run')
+        pruned = jobs.prune_finished()
+        if pruned:
+            self.stdout.write(f'Deleted {pruned} old finished jobs')
+
+        # Forked workers inherit the configured Django setup and open their own connections
+        connections.close_all()
+        context = multiprocessing.get_context('fork')
+        workers = [
+            context.Process(target=jobs.work, kwargs={'once': options['once']}, name=f'job-worker-{i}')
+            for i in range(max(options['workers'], 1))
+        ]
+        for worker in workers:
+            worker.start()
+        self.stdout.write(self.style.SUCCESS(f'Started {len(workers)} job workers'))
+        try:
+            for worker in workers:
+                worker.join()
+        except KeyboardInterrupt:
+            # Jobs interrupted here are requeued by the next run
+            for worker in workers:
+                worker.terminate()
+            for worker in workers:
+                worker.join()
@@ -0,0 +1,87 @@
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.middleware import AuthenticationMiddleware
+from django.contrib.sessions.middleware import SessionMiddleware
+from django.http import JsonResponse
+from django.middleware.gzip import GZipMiddleware
+from django.utils.functional import SimpleLazyObject
+
+from . import usercache
+from .tokens import NullSession, bearer_token, user_from_token
+
+
+class CompressionMiddleware(GZipMiddleware):
+    """Gzip dynamic HTML/JSON responses, skipping small or already-encoded bodies"""
+
+    compressible_types = ('text/html', 'application/json')
+
+    def process_response(self, request, response):
+        # Static files are streamed and served precompressed by home.staticfiles
+        if response.streaming or response.has_header('Content-Encoding'):
+            return response
+
+        content_type = response.get('Content-Type', '').split(';')[0].strip()
+        if content_type not in self.compressible_types:
+            return response
+
+        if len(response.content) < getattr(settings, 'COMPRESSION_MIN_SIZE', 1024):
+            return response
+
+        # GZipMiddleware handles Accept-Encoding negotiation, Vary and ETag weakening
+        return super().process_response(request, response)
+
+
+API_PATH_PREFIX = '/api/'
+
+
+class TokenSessionMiddleware(SessionMiddleware):
+    """SessionMiddleware that leaves the session store alone for bearer-token requests to the API"""
+
+    def process_request(self, request):
+        token = bearer_token(request) if request.path_info.startswith(API_PATH_PREFIX) else None
+        if token is None:
+            return super().process_request(request)
+        user = user_from_token(token)
+        if user is None:
+            response = JsonResponse({'success': False, 'error': 'Invalid or expired token'}, status=401)
+            response.headers['WWW-Authenticate'] = 'Bearer error="invalid_token"'
+            return response
+
+        request.token_user = user
+        request.session = NullSession()
+        # The token is not an ambient credential like a cookie, so CSRF does not apply
+        request._dont_enforce_csrf_checks = True
+
+    def process_response(self, request, response):
+        if hasattr(request, 'token_user'):
+            return response
+        return super().process_response(request, response)
+
+
+class TokenAuthenticationMiddleware(AuthenticationMiddleware):
+    """Use the user carried by a verified API token, or the session's cached user snapshot"""
+
+    def process_request(self, request):
+        user = getattr(request, 'token_user', None)
+        if user is None:
+            return self.process_session_request(request)
+
+        async def auser():
+            return user
+
+        request.user = user
+        request.auser = auser
+
+    def process_session_request(self, request):
+        super().process_request(request)  # keeps the missing-SessionMiddleware check
+
+        def get_user():
+            if not hasattr(request, '_cached_user'):
+                request._cached_user = usercache.get_user(request)
+            return request._cached_user
+
+        async def auser():
+            return await sync_to_async(get_user)()
+
+        request.user = SimpleLazyObject(get_user)
+        request.auser = auser
@@ -0,0 +1,66 @@
+# Generated by Django 5.2.4 on 2026-10-19 10:05
+
+from django.db import migrations, models
+
+COUNTER_FIELDS = ('total_requests', 'pending_requests', 'approved_requests', 'rejected_requests', 'sold_requests')
+
+
+def backfill_request_stats(apps, schema_editor):
+    """Fill the new counters of existing farmers, as Farmer.request_stats_for and repair_farmer_request_stats do"""
+    Farmer = apps.get_model('home', 'Farmer')
+    ChickRequest = apps.get_model('home', 'ChickRequest')
+    last_pk = 0
+    while True:
+        farmer_ids = list(Farmer.objects.filter(pk__gt=last_pk).order_by('pk').values_list('pk', flat=True)[:1000])
+        if not farmer_ids:
+            break
+        last_pk = farmer_ids[-1]
+        stats = {farmer_id: dict.fromkeys(COUNTER_FIELDS, 0) for farmer_id in farmer_ids}
+        rows = (
+            ChickRequest.objects.filter(farmer_name__in=farmer_ids)
+            .values_list('farmer_name', 'status')
+            .annotate(count=models.Count('pk'))
+            .order_by()
+        )
+        for farmer_id, status, count in rows:
+            stats[farmer_id]['total_requests'] += count
+            stats[farmer_id][f'{status}_requests'] += count
+        for farmer_id, counts in stats.items():
+            if counts['total_requests']:
+                Farmer.objects.filter(pk=farmer_id).update(**counts)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0005_chickrequest_updated_at_farmer_updated_at_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='farmer',
+            name='approved_requests',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='farmer',
+            name='pending_requests',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='farmer',
+            name='rejected_requests',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='farmer',
+            name='sold_requests',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='farmer',
+            name='total_requests',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_request_stats, migrations.RunPython.noop),
+    ]
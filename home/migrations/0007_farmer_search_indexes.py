@@ -0,0 +1,26 @@
+# Generated by Django 5.2.4 on 2026-10-19 11:20
+
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0006_farmer_request_stats'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='farmer',
+            index=models.Index(models.F('status'), django.db.models.functions.text.Lower('farmer_name'), name='farmer_status_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='farmer',
+            index=models.Index(fields=['status', 'nin'], name='farmer_status_nin_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='farmer',
+            index=models.Index(fields=['status', 'phone_number'], name='farmer_status_phone_idx'),
+        ),
+    ]
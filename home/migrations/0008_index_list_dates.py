@@ -0,0 +1,34 @@
+# Generated by Django 5.2.4 on 2026-10-19 12:40
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0007_farmer_search_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='chickrequest',
+            name='date_time',
+            field=models.DateTimeField(auto_now_add=True, db_index=True),
+        ),
+        migrations.AlterField(
+            model_name='farmer',
+            name='date_registered',
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now),
+        ),
+        migrations.AlterField(
+            model_name='feedstock',
+            name='date',
+            field=models.DateTimeField(auto_now_add=True, db_index=True),
+        ),
+        migrations.AlterField(
+            model_name='stock',
+            name='date_added',
+            field=models.DateTimeField(auto_now_add=True, db_index=True),
+        ),
+    ]
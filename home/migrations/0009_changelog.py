@@ -0,0 +1,35 @@
+# Generated by Django 5.2.4 on 2026-10-19 14:05
+
+from django.db import migrations, models
+
+
+def seed_change_log(apps, schema_editor):
+    """Log every existing synced row so a client starting from cursor 0 receives a full snapshot"""
+    ChangeLog = apps.get_model('home', 'ChangeLog')
+    for model_name in ('farmer', 'chickrequest', 'stock'):
+        model = apps.get_model('home', model_name)
+        pks = model.objects.order_by('pk').values_list('pk', flat=True).iterator(chunk_size=2000)
+        ChangeLog.objects.bulk_create(
+            (ChangeLog(model=model_name, object_id=pk, action='upsert') for pk in pks), batch_size=2000
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0008_index_list_dates'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChangeLog',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model', models.CharField(max_length=20)),
+                ('object_id', models.BigIntegerField()),
+                ('action', models.CharField(choices=[('upsert', 'Insert/Update'), ('delete', 'Delete')], default='upsert', max_length=6)),
+                ('changed_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.RunPython(seed_change_log, migrations.RunPython.noop),
+    ]
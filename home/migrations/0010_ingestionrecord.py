@@ -0,0 +1,29 @@
+# Generated by Django 5.2.4 on 2026-10-19 15:30
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0009_changelog'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IngestionRecord',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('idempotency_key', models.CharField(max_length=64)),
+                ('kind', models.CharField(choices=[('farmer', 'Farmer registration'), ('request', 'Chick request')], max_length=10)),
+                ('object_id', models.BigIntegerField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('created_by', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('created_by', 'idempotency_key'), name='unique_ingestion_key_per_user')],
+            },
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.4 on 2026-10-19 10:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0011_job'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='chickrequest',
+            index=models.Index(fields=['status', 'sales_authorized_date'], name='request_status_sold_idx'),
+        ),
+    ]
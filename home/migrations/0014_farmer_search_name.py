@@ -0,0 +1,41 @@
+# Generated by Django 5.2.4 on 2026-10-19 22:40
+
+from django.db import migrations, models
+
+
+def backfill_search_name(apps, schema_editor):
+    """Lowercase the names of existing farmers in Python, as Farmer.save does"""
+    Farmer = apps.get_model('home', 'Farmer')
+    last_pk = 0
+    while True:
+        farmers = list(Farmer.objects.filter(pk__gt=last_pk).order_by('pk').only('farmer_name')[:1000])
+        if not farmers:
+            break
+        last_pk = farmers[-1].pk
+        for farmer in farmers:
+            farmer.search_name = farmer.farmer_name.lower()
+        Farmer.objects.bulk_update(farmers, ['search_name'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0013_status_transitions'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='farmer',
+            name='farmer_status_name_idx',
+        ),
+        migrations.AddField(
+            model_name='farmer',
+            name='search_name',
+            field=models.CharField(default='', editable=False, max_length=100),
+        ),
+        migrations.RunPython(backfill_search_name, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='farmer',
+            index=models.Index(fields=['status', 'search_name'], name='farmer_status_search_name_idx'),
+        ),
+    ]
@@ -1,8 +1,129 @@
-from django.db import models
+import math
+from collections import Counter
+from datetime import timedelta
+
+from django.db import models, transaction
+from django.core.serializers.json import DjangoJSONEncoder
 from django.core.validators import MinValueValidator, MaxValueValidator
+from django.db.models.functions import Lower
 from django.utils import timezone
 from django.contrib.auth.models import AbstractUser #extending the super user model for us to create our own user
+from . import usercache
+
+
+
+class TimestampedQuerySet(models.QuerySet):
+    """QuerySet that keeps updated_at current on bulk updates (e.g. admin actions)"""
+
+    def update(self, **kwargs):
+        kwargs.setdefault('updated_at', timezone.now())
+        return super().update(**kwargs)
+
+
+class ChangeLoggedQuerySet(TimestampedQuerySet):
+    """QuerySet that records bulk updates, deletes and inserts in the ChangeLog"""
+
+    def update(self, **kwargs):
+        with transaction.atomic():
+            pks = list(self.values_list('pk', flat=True))
+            updated = super().update(**kwargs)
+            ChangeLog.record(self.model, pks)
+        return updated
+
+    def delete(self):
+        with transaction.atomic():
+            pks = list(self.values_list('pk', flat=True))
+            ChangeLog.record_cascade(self.model, pks)
+            deleted = super().delete()
+            ChangeLog.record(self.model, pks, deleted=True)
+        return deleted
+
+    def bulk_create(self, objs, *args, **kwargs):
+        with transaction.atomic():
+            created = super().bulk_create(objs, *args, **kwargs)
+            ChangeLog.record(self.model, [obj.pk for obj in created if obj.pk is not None])
+        return created
+
+
+class ChangeLoggedModel(models.Model):
+    """Model whose saves and deletes are recorded in the ChangeLog for the /api/changes/ feed"""
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            ChangeLog.record(type(self), [self.pk])
+
+    def delete(self, *args, **kwargs):
+        pk = self.pk
+        with transaction.atomic():
+            ChangeLog.record_cascade(type(self), [pk])
+            deleted = super().delete(*args, **kwargs)
+            ChangeLog.record(type(self), [pk], deleted=True)
+        return deleted
+
+
+class FarmerQuerySet(ChangeLoggedQuerySet):
+    """QuerySet that keeps Farmer.search_name in step with bulk writes of farmer_name"""
+
+    def update(self, **kwargs):
+        name = kwargs.get('farmer_name')
+        if name is not None:
+            # Expressions fall back to the database's (ASCII-only) lower()
+            kwargs['search_name'] = Farmer.search_key(name) if isinstance(name, str) else Lower(name)
+        return super().update(**kwargs)
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        for obj in objs:
+            obj.search_name = Farmer.search_key(obj.farmer_name)
+        return super().bulk_create(objs, *args, **kwargs)
+
+
+class ChickRequestQuerySet(ChangeLoggedQuerySet):
+    """QuerySet that keeps the per-farmer request counters on Farmer in step with bulk writes"""
+
+    def update(self, **kwargs):
+        return self.update_by(None, **kwargs)
 
+    def update_by(self, user, **kwargs):
+        """update() that records the status transitions it makes as made by ``user``"""
+        if not {'status', 'farmer_name', 'farmer_name_id'} & kwargs.keys():
+            if not set(ChickRequest.FARMER_PAGE_FIELDS) & kwargs.keys():
+                return super().update(**kwargs)
+            with transaction.atomic():
+                farmer_ids = set(self.values_list('farmer_name', flat=True))
+                updated = super().update(**kwargs)
+                Farmer.touch(farmer_ids)
+            return updated
+        with transaction.atomic():
+            farmer_ids = set(self.values_list('farmer_name', flat=True))
+            changing = []
+            if 'status' in kwargs:
+                changing = list(self.exclude(status=kwargs['status']).values_list('pk', 'status', 'date_time'))
+            updated = super().update(**kwargs)
+            if changing:
+                StatusTransition.record(changing, kwargs['status'], user)
+            new_farmer = kwargs.get('farmer_name', kwargs.get('farmer_name_id'))
+            if new_farmer is not None:
+                farmer_ids.add(getattr(new_farmer, 'pk', new_farmer))
+            Farmer.refresh_request_stats(farmer_ids)
+        return updated
+
+    def delete(self):
+        with transaction.atomic():
+            farmer_ids = set(self.values_list('farmer_name', flat=True))
+            deleted = super().delete()
+            Farmer.refresh_request_stats(farmer_ids)
+        return deleted
+
+    def bulk_create(self, objs, *args, **kwargs):
+        with transaction.atomic():
+            created = super().bulk_create(objs, *args, **kwargs)
+            Farmer.refresh_request_stats(obj.farmer_name_id for obj in created)
+        return created
 
 
 # Create your models here.
@@ -15,13 +136,22 @@ class UserProfile(AbstractUser):
 
     def __str__(self):
         return str(self.username)
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        # Covers password changes too, which go through save()
+        usercache.forget_user(self.pk)
+
+    def delete(self, *args, **kwargs):
+        usercache.forget_user(self.pk)
+        return super().delete(*args, **kwargs)
     
     class Meta:
         db_table = "home_users"
         verbose_name = "User"
         verbose_name_plural = "Users"
 
-class Stock(models.Model):
+class Stock(ChangeLoggedModel):
     CHICK_TYPE_CHOICES = [
         ('Broilers', 'Broilers'),
         ('Layers', 'Layers'),
@@ -34,12 +164,15 @@ class Stock(models.Model):
     
     stock_name = models.CharField(max_length=100, help_text="Mixture of characters & numbers")
     quantity = models.IntegerField(validators=[MinValueValidator(0)])
-    date_added = models.DateTimeField(auto_now_add=True)
+    date_added = models.DateTimeField(auto_now_add=True, db_index=True)
     chick_type = models.CharField(max_length=10, choices=CHICK_TYPE_CHOICES)
     chick_breed = models.CharField(max_length=10, choices=CHICK_BREED_CHOICES)
     price = models.IntegerField(default=1650, help_text="Price in UGX")
     manager_name = models.CharField(max_length=100, help_text="Name of the manager who registered the stock")
     chicks_period = models.IntegerField(validators=[MinValueValidator(0)], help_text="Age in days")
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+    
+    objects = ChangeLoggedQuerySet.as_manager()
     
     def __str__(self):
         return f"{self.stock_name} - {self.chick_type}"
@@ -52,17 +185,20 @@ class Feedstock(models.Model):
     unit_cost = models.DecimalField(max_digits=10, decimal_places=2)
     type_of_feeds = models.CharField(max_length=50)
     brand_of_feeds = models.CharField(max_length=50)
-    date = models.DateTimeField(auto_now_add=True)
+    date = models.DateTimeField(auto_now_add=True, db_index=True)
     supplier_name = models.CharField(max_length=100)
     supplier_contact = models.CharField(max_length=20)
     selling_price = models.DecimalField(max_digits=10, decimal_places=2, help_text="Minimum price of a bag of feeds")
     buying_price = models.DecimalField(max_digits=10, decimal_places=2)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+    
+    objects = TimestampedQuerySet.as_manager()
     
     def __str__(self):
         return f"{self.name_of_feeds} - {self.brand_of_feeds}"
 
 
-class Farmer(models.Model):
+class Farmer(ChangeLoggedModel):
     GENDER_CHOICES = [
         ('M', 'Male'),
         ('F', 'Female'),
@@ -80,6 +216,9 @@ class Farmer(models.Model):
     ]
     
     farmer_name = models.CharField(max_length=100, help_text="All names")
+    # farmer_name lowercased in Python for the typeahead's prefix scans: SQLite's
+    # lower() only folds ASCII, so it would miss names like "Émile"
+    search_name = models.CharField(max_length=100, editable=False, default='')
     farmer_gender = models.CharField(max_length=1, choices=GENDER_CHOICES)
     nin = models.CharField(max_length=14, unique=True, help_text="National Identification Number")
     recommender_name = models.CharField(max_length=100)
@@ -91,13 +230,92 @@ class Farmer(models.Model):
     )
     type_of_farmer = models.CharField(max_length=10, choices=FARMER_TYPE_CHOICES)
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending', help_text="Approval status")
-    date_registered = models.DateTimeField(default=timezone.now)
+    date_registered = models.DateTimeField(default=timezone.now, db_index=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+    
+    # Request counters, maintained by ChickRequest writes (see refresh_request_stats)
+    total_requests = models.PositiveIntegerField(default=0, editable=False)
+    pending_requests = models.PositiveIntegerField(default=0, editable=False)
+    approved_requests = models.PositiveIntegerField(default=0, editable=False)
+    rejected_requests = models.PositiveIntegerField(default=0, editable=False)
+    sold_requests = models.PositiveIntegerField(default=0, editable=False)
+    REQUEST_COUNTER_FIELDS = ('total_requests', 'pending_requests', 'approved_requests', 'rejected_requests', 'sold_requests')
+    
+    objects = FarmerQuerySet.as_manager()
     
     def __str__(self):
         return f"{self.farmer_name} ({self.status})"
+    
+    @staticmethod
+    def search_key(name: str) -> str:
+        return name.lower()
+    
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or 'farmer_name' in update_fields:
+            self.search_name = self.search_key(self.farmer_name or '')
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'search_name'}
+        # Saving an existing farmer leaves the request counters alone, so the
+        # values loaded with it cannot overwrite a concurrent refresh_request_stats
+        if not self._state.adding and self.pk is not None and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.REQUEST_COUNTER_FIELDS
+            ]
+        super().save(*args, **kwargs)
+    
+    class Meta:
+        indexes = [
+            # Prefix (range) scans over approved farmers for the farmer typeahead
+            models.Index(fields=['status', 'search_name'], name='farmer_status_search_name_idx'),
+            models.Index(fields=['status', 'nin'], name='farmer_status_nin_idx'),
+            models.Index(fields=['status', 'phone_number'], name='farmer_status_phone_idx'),
+        ]
+    
+    @classmethod
+    def request_stats_for(cls, farmer_ids):
+        """Count each farmer's requests by status straight from ChickRequest"""
+        stats = {
+            farmer_id: {
+                'total_requests': 0,
+                'pending_requests': 0,
+                'approved_requests': 0,
+                'rejected_requests': 0,
+                'sold_requests': 0,
+            }
+            for farmer_id in farmer_ids
+        }
+        rows = (
+            ChickRequest.objects.filter(farmer_name__in=stats.keys())
+            .values_list('farmer_name', 'status')
+            .annotate(count=models.Count('pk'))
+            .order_by()
+        )
+        for farmer_id, status, count in rows:
+            stats[farmer_id]['total_requests'] += count
+            stats[farmer_id][f'{status}_requests'] += count
+        return stats
+    
+    @classmethod
+    def touch(cls, farmer_ids):
+        """Bump updated_at of the given farmers, whose detail page shows a changed request"""
+        cls.objects.filter(pk__in=farmer_ids).update()
+    
+    @classmethod
+    def refresh_request_stats(cls, farmer_ids):
+        """Recompute the request counters of the given farmers"""
+        farmer_ids = {farmer_id for farmer_id in farmer_ids if farmer_id is not None}
+        if not farmer_ids:
+            return
+        for farmer_id, counts in cls.request_stats_for(farmer_ids).items():
+            cls.objects.filter(pk=farmer_id).update(**counts)
+
+
+REQUEST_COOLDOWN_DAYS = 120  # Approximately 4 months between requests
 
 
-class ChickRequest(models.Model):
+class ChickRequest(ChangeLoggedModel):
     CHICK_TYPE_CHOICES = [
         ('Broilers', 'Broilers'),
         ('Layers', 'Layers'),
@@ -120,11 +338,14 @@ class ChickRequest(models.Model):
         ('N', 'No'),
     ]
     
+    # Shown in the farmer's request history, so changing them changes the farmer detail page
+    FARMER_PAGE_FIELDS = ('chicks_type', 'chicks_breed', 'quantity', 'feeds_needed')
+    
     farmer_name = models.ForeignKey(Farmer, on_delete=models.CASCADE)
     chicks_type = models.CharField(max_length=10, choices=CHICK_TYPE_CHOICES)
     chicks_breed = models.CharField(max_length=10, choices=CHICK_BREED_CHOICES)
     quantity = models.IntegerField(validators=[MinValueValidator(1)], help_text="Quantity of chicks")
-    date_time = models.DateTimeField(auto_now_add=True)
+    date_time = models.DateTimeField(auto_now_add=True, db_index=True)
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
     feeds_needed = models.CharField(max_length=1, choices=YES_NO_CHOICES, help_text="Took the feeds")
     chicks_period = models.IntegerField(validators=[MinValueValidator(0)], help_text="Age in days")
@@ -132,6 +353,236 @@ class ChickRequest(models.Model):
     sales_authorized = models.BooleanField(default=False, help_text="Sales agent authorized the sale")
     sales_authorized_by = models.ForeignKey(UserProfile, on_delete=models.SET_NULL, null=True, blank=True, help_text="Sales agent who authorized the sale")
     sales_authorized_date = models.DateTimeField(null=True, blank=True, help_text="Date when sale was authorized")
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+    
+    objects = ChickRequestQuerySet.as_manager()
+    
+    class Meta:
+        indexes = [
+            # Sales reports scan sold requests by authorization date, one month per partition
+            models.Index(fields=['status', 'sales_authorized_date'], name='request_status_sold_idx'),
+        ]
     
     def __str__(self):
         return f"Request by {self.farmer_name} - {self.chicks_type} ({self.status})"
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the loaded farmer so moving a request refreshes both farmers' counters
+        instance._loaded_farmer_id = instance.__dict__.get('farmer_name_id')
+        # and the loaded status so a change of status is recorded as a transition
+        instance._loaded_status = instance.__dict__.get('status')
+        instance._loaded_page_values = instance.farmer_page_values()
+        return instance
+    
+    def farmer_page_values(self):
+        return tuple(self.__dict__.get(field) for field in self.FARMER_PAGE_FIELDS)
+    
+    def save(self, *args, changed_by=None, **kwargs):
+        """Save, recording a status change as a transition made by ``changed_by``
+
+        The farmer's request counters are only recomputed when the request is
+        new or changes status or farmer; other edits shown on the farmer's page
+        just bump its updated_at, and the rest leave the farmer row alone.
+        """
+        adding = self._state.adding
+        previous_status = getattr(self, '_loaded_status', None)
+        previous_farmer_id = getattr(self, '_loaded_farmer_id', None)
+        previous_page_values = getattr(self, '_loaded_page_values', None)
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if adding or previous_status != self.status or previous_farmer_id != self.farmer_name_id:
+                Farmer.refresh_request_stats({self.farmer_name_id, previous_farmer_id})
+            elif previous_page_values != self.farmer_page_values():
+                Farmer.touch([self.farmer_name_id])
+            if previous_status is not None and previous_status != self.status:
+                StatusTransition.record([(self.pk, previous_status, self.date_time)], self.status, changed_by)
+        self._loaded_farmer_id = self.farmer_name_id
+        self._loaded_status = self.status
+        self._loaded_page_values = self.farmer_page_values()
+    
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            deleted = super().delete(*args, **kwargs)
+            Farmer.refresh_request_stats({self.farmer_name_id})
+        return deleted
+
+
+class StatusTransition(models.Model):
+    """One change of a ChickRequest's status, written by ChickRequest.save and ChickRequestQuerySet.update"""
+    request = models.ForeignKey(ChickRequest, on_delete=models.CASCADE, related_name='transitions')
+    from_status = models.CharField(max_length=10, choices=ChickRequest.STATUS_CHOICES)
+    to_status = models.CharField(max_length=10, choices=ChickRequest.STATUS_CHOICES)
+    changed_by = models.ForeignKey(UserProfile, on_delete=models.SET_NULL, null=True, blank=True)
+    changed_at = models.DateTimeField(default=timezone.now, db_index=True)
+    # Time spent in from_status, or None when it is unknown (entered before transitions were recorded)
+    seconds_in_state = models.FloatField(null=True, blank=True)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['request', 'changed_at'], name='transition_request_idx'),
+        ]
+    
+    def __str__(self):
+        return f"Request #{self.request_id}: {self.from_status} -> {self.to_status}"
+    
+    @classmethod
+    def record(cls, changes, to_status, user=None):
+        """Record the transitions of (request id, previous status, request date_time) rows to to_status"""
+        changed_at = timezone.now()
+        transitions = []
+        for start in range(0, len(changes), 500):
+            batch = changes[start:start + 500]
+            entered_at = dict(
+                cls.objects.filter(request_id__in=[request_id for request_id, _, _ in batch])
+                .values('request_id').annotate(last=models.Max('changed_at')).values_list('request_id', 'last')
+            )
+            for request_id, from_status, created_at in batch:
+                # Requests are created pending, so a first transition out of pending started at creation
+                entered = entered_at.get(request_id) or (created_at if from_status == 'pending' else None)
+                transitions.append(cls(
+                    request_id=request_id,
+                    from_status=from_status,
+                    to_status=to_status,
+                    changed_by=user,
+                    changed_at=changed_at,
+                    seconds_in_state=(changed_at - entered).total_seconds() if entered is not None else None,
+                ))
+        cls.objects.bulk_create(transitions, batch_size=500)
+        StateDurationBucket.add(transitions)
+
+
+class StateDurationBucket(models.Model):
+    """Histogram of time spent in a status per week and user who ended it, for the SLA panel (see home/sla.py)
+
+    Bucket b holds durations of 2**(b/4) up to 2**((b+1)/4) seconds. Rows are
+    only ever incremented and readers sum them, so a key created twice by
+    concurrent writers is harmless.
+    """
+    BUCKETS_PER_DOUBLING = 4
+    
+    week = models.DateField(help_text="Monday of the week the status was left")
+    state = models.CharField(max_length=10, choices=ChickRequest.STATUS_CHOICES)
+    changed_by = models.ForeignKey(UserProfile, on_delete=models.SET_NULL, null=True, blank=True)
+    bucket = models.SmallIntegerField()
+    count = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['week', 'state'], name='duration_bucket_week_idx'),
+        ]
+    
+    @classmethod
+    def bucket_for(cls, seconds: float) -> int:
+        return math.floor(math.log2(max(seconds, 1)) * cls.BUCKETS_PER_DOUBLING)
+    
+    @classmethod
+    def add(cls, transitions):
+        counts = Counter()
+        for transition in transitions:
+            if transition.seconds_in_state is None:
+                continue
+            day = timezone.localdate(transition.changed_at)
+            week = day - timedelta(days=day.weekday())
+            counts[week, transition.from_status, transition.changed_by_id, cls.bucket_for(transition.seconds_in_state)] += 1
+        for (week, state, user_id, bucket), count in counts.items():
+            key = {'week': week, 'state': state, 'changed_by_id': user_id, 'bucket': bucket}
+            if not cls.objects.filter(**key).update(count=models.F('count') + count):
+                cls.objects.create(count=count, **key)
+
+
+class ChangeLog(models.Model):
+    """One row per insert, update or delete of a synced model; the id is the change feed cursor"""
+    ACTION_CHOICES = [
+        ('upsert', 'Insert/Update'),
+        ('delete', 'Delete'),
+    ]
+    
+    # Models published on /api/changes/, by ChangeLog.model value
+    SYNCED_MODELS = {
+        'farmer': Farmer,
+        'chickrequest': ChickRequest,
+        'stock': Stock,
+    }
+    
+    model = models.CharField(max_length=20)
+    object_id = models.BigIntegerField()
+    action = models.CharField(max_length=6, choices=ACTION_CHOICES, default='upsert')
+    changed_at = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return f"#{self.pk} {self.action} {self.model} {self.object_id}"
+    
+    @classmethod
+    def record(cls, model, pks, deleted=False):
+        action = 'delete' if deleted else 'upsert'
+        cls.objects.bulk_create(
+            cls(model=model._meta.model_name, object_id=pk, action=action) for pk in pks
+        )
+    
+    @classmethod
+    def record_cascade(cls, model, pks):
+        """Record the synced rows a delete will cascade to, which Django removes without calling delete()"""
+        for relation in model._meta.related_objects:
+            related_model = relation.related_model
+            if relation.on_delete is models.CASCADE and issubclass(related_model, ChangeLoggedModel):
+                related_pks = related_model._base_manager.filter(**{f'{relation.field.name}__in': pks}).values_list('pk', flat=True)
+                cls.record(related_model, list(related_pks), deleted=True)
+
+
+class IngestionRecord(models.Model):
+    """Outcome of an item accepted by the batch upload API, keyed by the client's idempotency key"""
+    KIND_CHOICES = [
+        ('farmer', 'Farmer registration'),
+        ('request', 'Chick request'),
+    ]
+    
+    idempotency_key = models.CharField(max_length=64)
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    object_id = models.BigIntegerField()
+    created_by = models.ForeignKey(UserProfile, on_delete=models.CASCADE)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['created_by', 'idempotency_key'], name='unique_ingestion_key_per_user'),
+        ]
+    
+    def __str__(self):
+        return f"{self.kind} {self.object_id} ({self.idempotency_key})"
+
+
+class Job(models.Model):
+    """Background job run by the run_jobs workers (see home/jobs.py)"""
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+    
+    kind = models.CharField(max_length=30)
+    params = models.JSONField(default=dict)
+    # Hash of kind and params; finished jobs are reused for equal submissions
+    params_key = models.CharField(max_length=64, db_index=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='queued')
+    result = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)
+    error = models.TextField(blank=True)
+    # Last ChangeLog id when the job started; the result reflects all changes up to it
+    change_mark = models.BigIntegerField(default=0)
+    worker = models.CharField(max_length=50, blank=True)
+    created_by = models.ForeignKey(UserProfile, on_delete=models.SET_NULL, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    # Bumped by the running worker; a stale heartbeat means the worker died (see jobs.is_stalled)
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'id'], name='job_queue_idx'),
+        ]
+    
+    def __str__(self):
+        return f"#{self.pk} {self.kind} ({self.status})"
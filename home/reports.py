@@ -0,0 +1,294 @@
+"""
+Report builders.
+
+Builders return JSON-serializable results (dates as ISO strings) so the
+background jobs in home/jobs.py can store them; the *_context helpers turn a
+stored result back into template context.
+"""
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime, time, timedelta
+from typing import Optional
+
+from django.conf import settings
+from django.db import connection, connections
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .models import ChangeLog, ChickRequest
+
+CHICK_PRICE = 1650  # UGX per chick
+
+
+def sales_report_range(params) -> tuple:
+    """Start and end date from the start_date/end_date parameters, defaulting to the last 30 days"""
+    end_date = timezone.now().date()
+    start_date = end_date - timedelta(days=30)
+
+    start_date_str = params.get('start_date')
+    if start_date_str:
+        try:
+            start_date = datetime.strptime(start_date_str, '%Y-%m-%d').date()
+        except (TypeError, ValueError):
+            pass
+
+    end_date_str = params.get('end_date')
+    if end_date_str:
+        try:
+            end_date = datetime.strptime(end_date_str, '%Y-%m-%d').date()
+        except (TypeError, ValueError):
+            pass
+
+    # Ensure start_date is not after end_date
+    if start_date > end_date:
+        start_date, end_date = end_date, start_date
+    return start_date, end_date
+
+
+def sales_report_params(params) -> dict:
+    start_date, end_date = sales_report_range(params)
+    return {'start_date': start_date.isoformat(), 'end_date': end_date.isoformat()}
+
+
+def month_partitions(start_date: date, end_date: date) -> list:
+    """(start, end) date pairs covering the range, one per calendar month"""
+    partitions = []
+    while start_date <= end_date:
+        next_month = (start_date.replace(day=1) + timedelta(days=32)).replace(day=1)
+        partitions.append((start_date, min(end_date, next_month - timedelta(days=1))))
+        start_date = next_month
+    return partitions
+
+
+def day_start(day: date) -> datetime:
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def sales_partition(start_date: date, end_date: date) -> dict:
+    """Unfinished sales aggregates (per rep, per day, per type and breed) for part of a report's range"""
+    # Same days as sales_authorized_date__date__gte/lte, as a range the index can serve
+    sales_in_range = ChickRequest.objects.filter(
+        status='sold',
+        sales_authorized_date__gte=day_start(start_date),
+        sales_authorized_date__lt=day_start(end_date + timedelta(days=1)),
+    ).order_by('sales_authorized_date', 'pk').values_list(
+        'pk', 'sales_authorized_date', 'quantity', 'chicks_type', 'chicks_breed', 'farmer_name__farmer_name',
+        'sales_authorized_by__username', 'sales_authorized_by__first_name', 'sales_authorized_by__last_name',
+    )
+
+    sales_by_rep = {}
+    daily_sales = {}
+    sales_by_type = {}
+    for pk, authorized_date, quantity, chicks_type, chicks_breed, farmer, username, first_name, last_name in sales_in_range:
+        rep_name = username or 'Unknown'
+        rep_full_name = f"{first_name} {last_name}".strip() if first_name or last_name else rep_name
+
+        if rep_name not in sales_by_rep:
+            sales_by_rep[rep_name] = {
+                'rep_name': rep_full_name,
+                'username': rep_name,
+                'total_sales': 0,
+                'total_chicks': 0,
+                'total_value': 0,
+                'farmers_served': set(),
+                'sales_details': []
+            }
+
+        sale_value = quantity * CHICK_PRICE
+        sales_by_rep[rep_name]['total_sales'] += 1
+        sales_by_rep[rep_name]['total_chicks'] += quantity
+        sales_by_rep[rep_name]['total_value'] += sale_value
+        sales_by_rep[rep_name]['farmers_served'].add(farmer)
+        sales_by_rep[rep_name]['sales_details'].append({
+            'date': authorized_date,
+            'farmer': farmer,
+            'chick_type': chicks_type,
+            'chick_breed': chicks_breed,
+            'quantity': quantity,
+            'value': sale_value,
+            'request_id': pk
+        })
+
+        # Daily sales breakdown
+        date_str = authorized_date.strftime('%Y-%m-%d')
+        if date_str not in daily_sales:
+            daily_sales[date_str] = {
+                'date': authorized_date.date(),
+                'sales_count': 0,
+                'chicks_sold': 0,
+                'total_value': 0
+            }
+        daily_sales[date_str]['sales_count'] += 1
+        daily_sales[date_str]['chicks_sold'] += quantity
+        daily_sales[date_str]['total_value'] += sale_value
+
+        type_key = (chicks_type, chicks_breed)
+        if type_key not in sales_by_type:
+            sales_by_type[type_key] = {
+                'chick_type': chicks_type,
+                'chick_breed': chicks_breed,
+                'sales_count': 0,
+                'chicks_sold': 0,
+                'total_value': 0
+            }
+        sales_by_type[type_key]['sales_count'] += 1
+        sales_by_type[type_key]['chicks_sold'] += quantity
+        sales_by_type[type_key]['total_value'] += sale_value
+
+    return {'sales_by_rep': sales_by_rep, 'daily_sales': daily_sales, 'sales_by_type': sales_by_type}
+
+
+def merge_sales_partitions(partials) -> dict:
+    """Combine partition aggregates, given in date order, as if computed over the whole range at once"""
+    merged = {'sales_by_rep': {}, 'daily_sales': {}, 'sales_by_type': {}}
+    for partial in partials:
+        for rep_name, rep_data in partial['sales_by_rep'].items():
+            target = merged['sales_by_rep'].get(rep_name)
+            if target is None:
+                merged['sales_by_rep'][rep_name] = rep_data
+                continue
+            for field in ('total_sales', 'total_chicks', 'total_value'):
+                target[field] += rep_data[field]
+            target['farmers_served'] |= rep_data['farmers_served']
+            target['sales_details'].extend(rep_data['sales_details'])
+        for group in ('daily_sales', 'sales_by_type'):
+            for key, data in partial[group].items():
+                target = merged[group].get(key)
+                if target is None:
+                    merged[group][key] = data
+                    continue
+                for field in ('sales_count', 'chicks_sold', 'total_value'):
+                    target[field] += data[field]
+    return merged
+
+
+def finish_sales_report(merged: dict) -> dict:
+    """The JSON-serializable report from the merged aggregates"""
+    sales_by_rep = merged['sales_by_rep']
+    total_sales_count = sum(rep_data['total_sales'] for rep_data in sales_by_rep.values())
+    total_chicks_sold = sum(rep_data['total_chicks'] for rep_data in sales_by_rep.values())
+    total_sales_value = sum(rep_data['total_value'] for rep_data in sales_by_rep.values())
+
+    # Convert farmers_served sets to counts and calculate averages
+    for rep_data in sales_by_rep.values():
+        rep_data['unique_farmers'] = len(rep_data['farmers_served'])
+        rep_data['farmers_served'] = sorted(rep_data['farmers_served'])
+        rep_data['avg_per_sale'] = rep_data['total_value'] / rep_data['total_sales'] if rep_data['total_sales'] > 0 else 0
+        # Most recent first
+        rep_data['sales_details'].sort(key=lambda x: x['date'], reverse=True)
+        for detail in rep_data['sales_details']:
+            detail['date'] = detail['date'].isoformat()
+
+    # Top performing sales rep
+    top_rep = max(sales_by_rep.values(), key=lambda x: x['total_value'])['username'] if sales_by_rep else None
+
+    daily_sales_list = []
+    for day_data in sorted(merged['daily_sales'].values(), key=lambda x: x['date'], reverse=True):
+        day_data['avg_per_sale'] = day_data['total_value'] / day_data['sales_count'] if day_data['sales_count'] > 0 else 0
+        day_data['date'] = day_data['date'].isoformat()
+        daily_sales_list.append(day_data)
+
+    return {
+        'sales_by_rep': sales_by_rep,
+        'total_sales_count': total_sales_count,
+        'total_chicks_sold': total_chicks_sold,
+        'total_sales_value': total_sales_value,
+        'active_sales_reps': len(sales_by_rep),
+        'top_rep': top_rep,
+        'daily_sales': daily_sales_list,
+        'sales_by_type': [merged['sales_by_type'][key] for key in sorted(merged['sales_by_type'])],
+        'average_sale_value': total_sales_value / total_sales_count if total_sales_count > 0 else 0,
+        'average_chicks_per_sale': total_chicks_sold / total_sales_count if total_sales_count > 0 else 0,
+    }
+
+
+def open_read_only_connection():
+    """Process pool initializer: give the worker its own connection that refuses writes"""
+    connection.ensure_connection()
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute('PRAGMA query_only = ON')
+        elif connection.vendor == 'postgresql':
+            cursor.execute('SET default_transaction_read_only = on')
+
+
+def can_partition() -> bool:
+    # Worker processes cannot see an in-memory SQLite database (e.g. the test database)
+    return not (connection.vendor == 'sqlite' and connection.is_in_memory_db())
+
+
+def build_sales_report(start_date: date, end_date: date, workers: Optional[int] = None) -> dict:
+    """Sales per representative, per day and per type and breed for sales authorized between the two dates
+
+    Ranges of at least REPORT_PARALLEL_MIN_MONTHS months are computed one
+    month per task in a pool of ``workers`` processes (REPORT_PARALLEL_WORKERS
+    by default); the merged result is identical to computing the range at once.
+    """
+    partitions = month_partitions(start_date, end_date)
+    if workers is None:
+        workers = getattr(settings, 'REPORT_PARALLEL_WORKERS', None) or os.cpu_count() or 1
+    parallel = (
+        workers > 1
+        and len(partitions) >= getattr(settings, 'REPORT_PARALLEL_MIN_MONTHS', 3)
+        and can_partition()
+    )
+    if not parallel:
+        return finish_sales_report(sales_partition(start_date, end_date))
+
+    # Forked workers must not share the parent's connections
+    connections.close_all()
+    with ProcessPoolExecutor(
+        max_workers=min(workers, len(partitions)),
+        mp_context=multiprocessing.get_context('fork'),
+        initializer=open_read_only_connection,
+    ) as pool:
+        partials = pool.map(sales_partition, *zip(*partitions))
+        return finish_sales_report(merge_sales_partitions(partials))
+
+
+def run_sales_report(params) -> dict:
+    return build_sales_report(parse_date(params['start_date']), parse_date(params['end_date']))
+
+
+def sales_report_is_stale(job) -> bool:
+    """Whether changes since the report job started alter its result
+
+    The report is stale once a sale is authorized in its range, one of its
+    sales changes or is deleted, or the farmer of one of its sales is renamed.
+    """
+    start_date, end_date = parse_date(job.params['start_date']), parse_date(job.params['end_date'])
+    changes = ChangeLog.objects.filter(pk__gt=job.change_mark)
+    changed_requests = changes.filter(model='chickrequest').values('object_id')
+    changed_farmers = changes.filter(model='farmer').values('object_id')
+    sold_in_range = ChickRequest.objects.filter(
+        status='sold',
+        sales_authorized_date__gte=day_start(start_date),
+        sales_authorized_date__lt=day_start(end_date + timedelta(days=1)),
+    )
+    if sold_in_range.filter(pk__in=changed_requests).exists():
+        return True
+    reported = {
+        detail['request_id']: detail['farmer']
+        for rep_data in job.result['sales_by_rep'].values() for detail in rep_data['sales_details']
+    }
+    # Farmer rows also change with their request counters; only a new name shows in the report
+    renamed = sold_in_range.filter(farmer_name__in=changed_farmers).values_list('pk', 'farmer_name__farmer_name')
+    if any(reported.get(pk) != farmer for pk, farmer in renamed.iterator()):
+        return True
+    # Sales the report counted that are no longer sold, or were deleted
+    return bool(reported) and any(
+        object_id in reported for object_id in changed_requests.values_list('object_id', flat=True).iterator()
+    )
+
+
+def sales_report_context(result: dict) -> dict:
+    """Template context for a stored sales report, with its dates parsed back"""
+    context = dict(result)
+    for rep_data in context['sales_by_rep'].values():
+        for detail in rep_data['sales_details']:
+            detail['date'] = parse_datetime(detail['date'])
+    for day_data in context['daily_sales']:
+        day_data['date'] = parse_date(day_data['date'])
+    context['top_rep'] = context['sales_by_rep'].get(result['top_rep'])
+    return context
@@ -0,0 +1,166 @@
+"""
+Cached sessions with batched database writes.
+
+Sessions are read from and written to the cache on every request as with
+Django's cached_db engine, but the database copy of routine changes is
+written in batches: a save queues the session and the queue is flushed in
+one transaction once it holds SESSION_WRITE_BATCH_SIZE sessions, and at the
+latest SESSION_WRITE_BATCH_SECONDS after the first queued write, by the end
+of the next request or a timer, whichever comes first. Saves whose only
+change is to stored flash messages are kept in the cache alone.
+
+New sessions, rotated keys (login, logout) and changes to the authenticated
+user are written to the database at once, so a worker that misses the cache
+still sees who is logged in. Queued writes are lost if the worker is killed
+before they are flushed; the cache copy still has them. Use with a cache
+shared by all workers (see the "sessions" alias).
+"""
+import logging
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+from django.contrib.messages.storage.session import SessionStorage
+from django.contrib.sessions.backends.cached_db import SessionStore as CachedDBStore
+from django.contrib.sessions.models import Session
+from django.core.signals import request_finished
+from django.db import connection, transaction
+
+logger = logging.getLogger(__name__)
+
+# Session keys whose changes alone do not need to reach the database
+CACHE_ONLY_KEYS = {SessionStorage.session_key}
+# Session keys whose changes are written to the database at once
+AUTH_KEYS = (SESSION_KEY, BACKEND_SESSION_KEY, HASH_SESSION_KEY)
+
+_pending = {}  # session_key -> (encoded session data, expire date)
+_pending_lock = threading.Lock()
+_first_queued = None  # monotonic time of the oldest queued write
+_timer = None
+
+
+def flush_pending():
+    """Write all queued sessions to the database in one transaction"""
+    global _first_queued
+    with _pending_lock:
+        batch = dict(_pending)
+        _pending.clear()
+        _first_queued = None
+    if not batch:
+        return 0
+    try:
+        with transaction.atomic():
+            Session.objects.bulk_create(
+                [
+                    Session(session_key=key, session_data=data, expire_date=expire_date)
+                    for key, (data, expire_date) in batch.items()
+                ],
+                update_conflicts=True,
+                unique_fields=['session_key'],
+                update_fields=['session_data', 'expire_date'],
+            )
+    except Exception:
+        # Queue the batch again, behind any newer write of the same sessions
+        with _pending_lock:
+            for key, value in batch.items():
+                _pending.setdefault(key, value)
+            if _first_queued is None:
+                _first_queued = time.monotonic()
+        raise
+    return len(batch)
+
+
+def flush_due(**kwargs):
+    """Flush the queue if its oldest write has waited SESSION_WRITE_BATCH_SECONDS"""
+    queued_at = _first_queued
+    if queued_at is not None and time.monotonic() - queued_at >= getattr(settings, 'SESSION_WRITE_BATCH_SECONDS', 2):
+        flush_pending()
+
+
+request_finished.connect(flush_due, dispatch_uid='home.sessions.flush_due')
+
+
+def timed_flush():
+    global _timer
+    with _pending_lock:
+        _timer = None
+    try:
+        flush_pending()
+    except Exception:
+        logger.exception('Flushing queued sessions failed')
+        schedule_flush()
+    finally:
+        # The timer thread's own connection
+        connection.close()
+
+
+def schedule_flush():
+    """Flush from a timer thread in case no request ends in this worker before the queue is due"""
+    global _timer
+    with _pending_lock:
+        if _timer is not None:
+            return
+        _timer = threading.Timer(getattr(settings, 'SESSION_WRITE_BATCH_SECONDS', 2), timed_flush)
+        _timer.daemon = True
+        _timer.start()
+
+
+def durable_items(data):
+    return {key: value for key, value in data.items() if key not in CACHE_ONLY_KEYS}
+
+
+class SessionStore(CachedDBStore):
+    cache_key_prefix = 'home.sessions'
+
+    def load(self):
+        data = super().load()
+        self._loaded_durable = durable_items(data)
+        return data
+
+    def _get_session_from_db(self):
+        # A queued write is newer than the database row
+        pending = _pending.get(self.session_key)
+        if pending:
+            data, expire_date = pending
+            return Session(session_key=self.session_key, session_data=data, expire_date=expire_date)
+        return super()._get_session_from_db()
+
+    def save(self, must_create=False):
+        global _first_queued
+        data = self._get_session()
+        loaded = getattr(self, '_loaded_durable', None)
+        if (
+            must_create or self.session_key is None or loaded is None
+            or any(data.get(key) != loaded.get(key) for key in AUTH_KEYS)
+        ):
+            # New sessions reserve their key, and who is logged in must not wait in one worker's queue
+            with _pending_lock:
+                _pending.pop(self.session_key, None)
+            super().save(must_create)
+            self._loaded_durable = durable_items(data)
+            return
+
+        self._cache.set(self.cache_key, data, self.get_expiry_age())
+        if durable_items(data) == loaded:
+            return
+
+        with _pending_lock:
+            _pending[self.session_key] = (self.encode(data), self.get_expiry_date())
+            if _first_queued is None:
+                _first_queued = time.monotonic()
+            full = len(_pending) >= getattr(settings, 'SESSION_WRITE_BATCH_SIZE', 50)
+        self._loaded_durable = durable_items(data)
+        if full:
+            flush_pending()
+        else:
+            schedule_flush()
+
+    async def asave(self, must_create=False):
+        await sync_to_async(self.save)(must_create)
+
+    def delete(self, session_key=None):
+        with _pending_lock:
+            _pending.pop(session_key or self.session_key, None)
+        super().delete(session_key)
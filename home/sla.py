@@ -0,0 +1,135 @@
+"""
+Request lifecycle SLA metrics.
+
+Every change of a ChickRequest's status is stored as a StatusTransition, and
+the time the request spent in the status it left is counted at the same time
+in a StateDurationBucket: a histogram per week, status and user who ended the
+status, with four log-scale buckets per doubling of the duration. Reading the
+metrics therefore only sums a few histogram rows, never the transitions
+themselves; percentiles are read off the cumulative bucket counts and are
+accurate to the bucket width (about +/-9%).
+
+Transitions are only recorded from the moment this was deployed on, so time
+spent in a status entered earlier is unknown and not counted, except for the
+time pending, which starts when the request is made.
+"""
+from datetime import date, timedelta
+from typing import Optional
+
+from django.conf import settings
+from django.db.models import Sum
+from django.utils import timezone
+
+from .models import ChickRequest, StateDurationBucket
+
+STATES = [status for status, _ in ChickRequest.STATUS_CHOICES]
+
+
+def week_start(day: date) -> date:
+    return day - timedelta(days=day.weekday())
+
+
+def bucket_seconds(bucket: int) -> float:
+    """Geometric middle of a bucket's range"""
+    return 2 ** ((bucket + 0.5) / StateDurationBucket.BUCKETS_PER_DOUBLING)
+
+
+def percentile(histogram: dict, fraction: float) -> Optional[float]:
+    total = sum(histogram.values())
+    if not total:
+        return None
+    seen = 0
+    for bucket in sorted(histogram):
+        seen += histogram[bucket]
+        if seen >= fraction * total:
+            return round(bucket_seconds(bucket))
+    return None
+
+
+def format_duration(seconds: Optional[float]) -> str:
+    if seconds is None:
+        return '-'
+    minutes = int(seconds // 60)
+    if minutes < 60:
+        return f'{minutes}m' if minutes else f'{int(seconds)}s'
+    hours, minutes = divmod(minutes, 60)
+    if hours < 48:
+        return f'{hours}h {minutes}m'
+    return f'{hours // 24}d {hours % 24}h'
+
+
+def role(row) -> str:
+    if row['changed_by_id'] is None:
+        return 'system'
+    if row['changed_by__is_manager']:
+        return 'manager'
+    return 'agent' if row['changed_by__is_salesagent'] else 'user'
+
+
+def stats(histogram: dict) -> dict:
+    p50, p90 = percentile(histogram, 0.5), percentile(histogram, 0.9)
+    return {
+        'count': sum(histogram.values()),
+        'p50_seconds': p50,
+        'p90_seconds': p90,
+        'p50': format_duration(p50),
+        'p90': format_duration(p90),
+    }
+
+
+def sla_summary(weeks: Optional[int] = None, today: Optional[date] = None) -> dict:
+    """p50/p90 time in each status over the last ``weeks`` weeks (the current one included)
+
+    ``overall`` and ``users`` cover the whole range, per status and per status
+    and user who ended it; ``weekly`` breaks the same figures down per week.
+    """
+    weeks = weeks or getattr(settings, 'SLA_WEEKS', 8)
+    last = week_start(today or timezone.localdate())
+    first = last - timedelta(weeks=weeks - 1)
+    rows = (
+        StateDurationBucket.objects.filter(week__gte=first, week__lte=last)
+        .values(
+            'week', 'state', 'bucket', 'changed_by_id',
+            'changed_by__username', 'changed_by__is_manager', 'changed_by__is_salesagent',
+        )
+        .annotate(total=Sum('count'))
+    )
+
+    overall, users, weekly, people = {}, {}, {}, {}
+    for row in rows:
+        user_key = row['changed_by_id']
+        people[user_key] = {'user': row['changed_by__username'] or '', 'role': role(row)}
+        for histograms, key in (
+            (overall, row['state']),
+            (users, (row['state'], user_key)),
+            (weekly, (row['week'], row['state'])),
+            (weekly, (row['week'], row['state'], user_key)),
+        ):
+            histogram = histograms.setdefault(key, {})
+            histogram[row['bucket']] = histogram.get(row['bucket'], 0) + row['total']
+
+    def order(state):
+        return STATES.index(state) if state in STATES else len(STATES)
+
+    return {
+        'weeks': [(first + timedelta(weeks=offset)).isoformat() for offset in range(weeks)],
+        'overall': [
+            {'state': state, **stats(overall[state])} for state in sorted(overall, key=order)
+        ],
+        'users': sorted(
+            ({'state': state, **people[user_key], **stats(histogram)} for (state, user_key), histogram in users.items()),
+            key=lambda row: (order(row['state']), row['role'], row['user']),
+        ),
+        'weekly': sorted(
+            (
+                {
+                    'week': key[0].isoformat(),
+                    'state': key[1],
+                    **(people[key[2]] if len(key) == 3 else {'user': None, 'role': None}),
+                    **stats(histogram),
+                }
+                for key, histogram in weekly.items()
+            ),
+            key=lambda row: (row['week'], order(row['state']), row['user'] is not None, row['role'] or '', row['user'] or ''),
+        ),
+    }
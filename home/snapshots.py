@@ -0,0 +1,253 @@
+"""
+Memory-mapped analytics snapshots.
+
+build_snapshot() writes ChickRequest, Farmer, Stock and Feedstock as typed
+column files under ANALYTICS_SNAPSHOT_DIR: one .npy array per column, with
+strings dictionary-encoded into int32 codes plus a JSON list of the values.
+A manifest describes every column. Each build goes into a new directory and
+is published by replacing current.json with os.replace, so readers see
+either the old or the new snapshot, never a partial one.
+
+Readers open the arrays with mmap_mode='r': every worker process maps the
+same files and shares one copy in the page cache.
+"""
+import json
+import os
+import shutil
+import threading
+from datetime import timedelta, timezone as dt_timezone
+
+import numpy as np
+from django.conf import settings
+from django.db import models
+from django.db.models import Max
+from django.utils import timezone
+
+from .models import ChangeLog, ChickRequest, Farmer, Feedstock, Stock
+
+SNAPSHOT_TABLES = {
+    'chickrequest': ChickRequest,
+    'farmer': Farmer,
+    'stock': Stock,
+    'feedstock': Feedstock,
+}
+# Related columns copied into a table so analytics need no join: table -> {column: lookup}
+JOINED_COLUMNS = {
+    'chickrequest': {
+        'farmer_gender': 'farmer_name__farmer_gender',
+        'type_of_farmer': 'farmer_name__type_of_farmer',
+    },
+}
+POINTER = 'current.json'
+NULL_INT = np.iinfo(np.int64).min
+NULL_CODE = -1
+
+
+def snapshot_dir():
+    return os.fspath(getattr(settings, 'ANALYTICS_SNAPSHOT_DIR', os.path.join(settings.BASE_DIR, 'snapshots')))
+
+
+def column_kind(field) -> str:
+    if isinstance(field, (models.AutoField, models.IntegerField, models.ForeignKey)):
+        return 'int'
+    if isinstance(field, models.BooleanField):
+        return 'bool'
+    if isinstance(field, models.DecimalField):
+        return 'decimal'
+    if isinstance(field, models.FloatField):
+        return 'float'
+    if isinstance(field, models.DateTimeField):
+        return 'datetime'
+    if isinstance(field, models.DateField):
+        return 'date'
+    return 'category'
+
+
+def local_wall_times(values) -> np.ndarray:
+    """The values as naive datetimes in the current timezone, so astype('datetime64[D]') gives local dates"""
+    count = len(values)
+    present = np.fromiter((value is not None for value in values), dtype=bool, count=count)
+    utc = np.fromiter(
+        (round(value.timestamp() * 1_000_000) if value is not None else 0 for value in values), dtype=np.int64, count=count,
+    ).astype('datetime64[us]')
+    instants = utc[present]
+    zone = timezone.get_current_timezone()
+
+    def offset(value):
+        return value.replace(tzinfo=dt_timezone.utc).astimezone(zone).utcoffset()
+
+    # One offset lookup per distinct hour; the rare hours in which the offset changes are converted value by value
+    hours, inverse = np.unique(instants.astype('datetime64[h]'), return_inverse=True)
+    hour_starts = hours.tolist()
+    offsets = np.array([offset(hour) for hour in hour_starts], dtype='timedelta64[us]')
+    changing = np.array(
+        [offset(hour + timedelta(hours=1, microseconds=-1)) for hour in hour_starts], dtype='timedelta64[us]',
+    ) != offsets
+    local = instants + offsets[inverse]
+    for index in np.flatnonzero(changing[inverse]).tolist():
+        local[index] = instants[index] + offset(instants[index].item())
+    wall_times = np.full(count, np.datetime64('NaT', 'us'))
+    wall_times[present] = local
+    return wall_times
+
+
+def encode_column(kind, values, spec):
+    """The array for a column's values, filling in how to read it back in spec"""
+    if kind == 'int':
+        return np.array([NULL_INT if value is None else value for value in values], dtype=np.int64)
+    if kind == 'bool':
+        return np.array(values, dtype=bool)
+    if kind == 'decimal':
+        # Fixed point, so amounts stay exact
+        scale = 10 ** spec['decimal_places']
+        return np.array([NULL_INT if value is None else int(value * scale) for value in values], dtype=np.int64)
+    if kind == 'float':
+        return np.array([np.nan if value is None else value for value in values], dtype=np.float64)
+    if kind == 'datetime':
+        return local_wall_times(values)
+    if kind == 'date':
+        return np.array(values, dtype='datetime64[D]')
+    dictionary, codes = [], {}
+    for value in values:
+        if value is not None and value not in codes:
+            codes[value] = len(dictionary)
+            dictionary.append(value)
+    spec['values'] = dictionary
+    return np.fromiter(
+        (NULL_CODE if value is None else codes[value] for value in values), dtype=np.int32, count=len(values)
+    )
+
+
+def write_table(directory, name, model) -> dict:
+    fields = {field.attname: field for field in model._meta.concrete_fields}
+    lookups = {attname: attname for attname in fields}
+    lookups.update(JOINED_COLUMNS.get(name, {}))
+    # Fetched in full before anything is encoded or written
+    rows = list(model._base_manager.order_by('pk').values_list(*lookups.values()))
+    columns = dict(zip(lookups, zip(*rows))) if rows else {column: () for column in lookups}
+
+    specs = {}
+    for column, values in columns.items():
+        field = fields.get(column)
+        kind = column_kind(field) if field is not None else 'category'
+        spec = {'kind': kind, 'file': f'{name}.{column}.npy'}
+        if kind == 'decimal':
+            spec['decimal_places'] = field.decimal_places
+        array = encode_column(kind, values, spec)
+        np.save(os.path.join(directory, spec['file']), array, allow_pickle=False)
+        if 'values' in spec:
+            spec['dictionary'] = f'{name}.{column}.json'
+            with open(os.path.join(directory, spec['dictionary']), 'w') as f:
+                json.dump(spec.pop('values'), f)
+        specs[column] = spec
+    return {'rows': len(rows), 'columns': specs}
+
+
+def build_snapshot(keep: int = 2) -> dict:
+    """Write a new snapshot, publish it and delete all but the newest ``keep`` ones"""
+    root = snapshot_dir()
+    os.makedirs(root, exist_ok=True)
+    created_at = timezone.now()
+    version = f"{created_at.astimezone(dt_timezone.utc):%Y%m%dT%H%M%S%f}-{os.getpid()}"
+    directory = os.path.join(root, version)
+    os.makedirs(directory)
+
+    # No transaction spans the build: it would hold SQLite's shared lock, blocking
+    # every writer's commit, through all the reads, encoding and file writes.
+    # Each table is read by one query instead, after the cursor is taken, so a
+    # change made meanwhile is in the ChangeLog past the cursor and readers
+    # apply it again on their first refresh.
+    change_cursor = ChangeLog.objects.aggregate(Max('pk'))['pk__max'] or 0
+    manifest = {
+        'version': version,
+        'created_at': created_at.isoformat(),
+        'timezone': timezone.get_current_timezone_name(),
+        'change_cursor': change_cursor,
+        'tables': {name: write_table(directory, name, model) for name, model in SNAPSHOT_TABLES.items()},
+    }
+    with open(os.path.join(directory, 'manifest.json'), 'w') as f:
+        json.dump(manifest, f, indent=1)
+
+    pointer_tmp = os.path.join(root, f'.{POINTER}.{version}')
+    try:
+        with open(pointer_tmp, 'w') as f:
+            json.dump({'directory': version}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(pointer_tmp, os.path.join(root, POINTER))
+    except OSError:
+        if os.path.exists(pointer_tmp):
+            os.remove(pointer_tmp)
+        raise
+
+    # Readers still mapping a removed snapshot keep their pages until they unmap
+    versions = sorted(entry for entry in os.listdir(root) if os.path.isdir(os.path.join(root, entry)))
+    for old in versions[:-max(keep, 1)]:
+        shutil.rmtree(os.path.join(root, old), ignore_errors=True)
+    return manifest
+
+
+def snapshot_params(params) -> dict:
+    return {}
+
+
+def run_snapshot(params) -> dict:
+    """Background job: build and publish a snapshot, returning its version and row counts"""
+    manifest = build_snapshot()
+    return {'version': manifest['version'], 'rows': {name: table['rows'] for name, table in manifest['tables'].items()}}
+
+
+def snapshot_is_stale(job) -> bool:
+    # The job is only submitted while there is no snapshot, to warm the analytics
+    return current_snapshot() is None
+
+
+class Snapshot:
+    """Read-only view of one published snapshot"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        with open(os.path.join(directory, 'manifest.json')) as f:
+            self.manifest = json.load(f)
+        self.version = self.manifest['version']
+        self.change_cursor = self.manifest['change_cursor']
+        self._arrays = {}
+        self._dictionaries = {}
+
+    def spec(self, table, column) -> dict:
+        return self.manifest['tables'][table]['columns'][column]
+
+    def column(self, table, column) -> np.ndarray:
+        """The column's array, mapped read-only from its file"""
+        key = (table, column)
+        if key not in self._arrays:
+            path = os.path.join(self.directory, self.spec(table, column)['file'])
+            self._arrays[key] = np.load(path, mmap_mode='r', allow_pickle=False)
+        return self._arrays[key]
+
+    def dictionary(self, table, column) -> list:
+        """Values of a category column, indexed by code"""
+        key = (table, column)
+        if key not in self._dictionaries:
+            with open(os.path.join(self.directory, self.spec(table, column)['dictionary'])) as f:
+                self._dictionaries[key] = json.load(f)
+        return self._dictionaries[key]
+
+
+_current = None
+_current_lock = threading.Lock()
+
+
+def current_snapshot():
+    """The most recently published snapshot, or None if none has been built"""
+    global _current
+    root = snapshot_dir()
+    try:
+        with open(os.path.join(root, POINTER)) as f:
+            directory = json.load(f)['directory']
+    except FileNotFoundError:
+        return None
+    with _current_lock:
+        if _current is None or _current.version != directory:
+            _current = Snapshot(os.path.join(root, directory))
+        return _current
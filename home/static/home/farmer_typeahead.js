@@ -0,0 +1,126 @@
+// Farmer typeahead: turns each hidden <input data-farmer-search="<api url>"> into a search box.
+// Picking a match stores its id in the hidden input, copies the farmer's details onto the
+// input's data-* attributes and fires "change" so the page can react to the selection.
+(function () {
+    function label(farmer) {
+        const type = farmer.type_of_farmer.charAt(0).toUpperCase() + farmer.type_of_farmer.slice(1);
+        return `${farmer.farmer_name} (${type}) - ${farmer.phone_number}`;
+    }
+
+    function attach(hidden) {
+        const wrapper = document.createElement('div');
+        wrapper.className = 'position-relative';
+        const input = document.createElement('input');
+        input.type = 'search';
+        input.className = 'form-control';
+        input.placeholder = 'Type a name, NIN or phone number';
+        input.autocomplete = 'off';
+        input.required = hidden.required;
+        input.value = hidden.dataset.label || '';
+        const list = document.createElement('div');
+        list.className = 'list-group position-absolute w-100 shadow-sm';
+        list.style.zIndex = 1000;
+        wrapper.append(input, list);
+        hidden.before(wrapper);
+
+        let timer = null;
+        let controller = null;
+        let results = [];
+        let active = -1;
+
+        function close() {
+            list.replaceChildren();
+            results = [];
+            active = -1;
+        }
+
+        function choose(farmer) {
+            hidden.value = farmer.id;
+            hidden.dataset.type = farmer.type_of_farmer;
+            hidden.dataset.age = farmer.farmer_age;
+            hidden.dataset.phone = farmer.phone_number;
+            input.value = label(farmer);
+            close();
+            hidden.dispatchEvent(new Event('change', {bubbles: true}));
+        }
+
+        function highlight(index) {
+            active = index;
+            list.querySelectorAll('.list-group-item').forEach((item, i) => item.classList.toggle('active', i === active));
+        }
+
+        function render() {
+            list.replaceChildren(...results.map(farmer => {
+                const item = document.createElement('button');
+                item.type = 'button';
+                item.className = 'list-group-item list-group-item-action';
+                item.textContent = label(farmer);
+                const nin = document.createElement('small');
+                nin.className = 'd-block text-muted';
+                nin.textContent = farmer.nin;
+                item.append(nin);
+                // mousedown fires before the input loses focus
+                item.addEventListener('mousedown', e => {
+                    e.preventDefault();
+                    choose(farmer);
+                });
+                return item;
+            }));
+            if (!results.length) {
+                const empty = document.createElement('div');
+                empty.className = 'list-group-item text-muted';
+                empty.textContent = 'No approved farmer matches';
+                list.append(empty);
+            }
+        }
+
+        function search() {
+            const query = input.value.trim();
+            if (controller) {
+                controller.abort();
+            }
+            if (!query) {
+                close();
+                return;
+            }
+            controller = new AbortController();
+            fetch(`${hidden.dataset.farmerSearch}?q=${encodeURIComponent(query)}`, {signal: controller.signal})
+                .then(response => response.ok ? response.json() : Promise.reject(response.status))
+                .then(data => {
+                    results = data.results;
+                    active = -1;
+                    render();
+                })
+                .catch(() => {});
+        }
+
+        input.addEventListener('input', () => {
+            // Editing the text invalidates the previous pick
+            if (hidden.value) {
+                hidden.value = '';
+                hidden.dispatchEvent(new Event('change', {bubbles: true}));
+            }
+            clearTimeout(timer);
+            timer = setTimeout(search, 150);
+        });
+        input.addEventListener('keydown', e => {
+            if (e.key === 'ArrowDown' && results.length) {
+                e.preventDefault();
+                highlight((active + 1) % results.length);
+            } else if (e.key === 'ArrowUp' && results.length) {
+                e.preventDefault();
+                highlight((active - 1 + results.length) % results.length);
+            } else if (e.key === 'Enter' && active >= 0) {
+                e.preventDefault();
+                choose(results[active]);
+            } else if (e.key === 'Escape') {
+                close();
+            }
+        });
+        input.addEventListener('blur', close);
+    }
+
+    document.addEventListener('DOMContentLoaded', () => {
+        document.querySelectorAll('input[data-farmer-search]').forEach(attach);
+    });
+})();
@@ -0,0 +1,88 @@
+// Swap only the list table on search, filter and pagination instead of reloading the whole page.
+// The list views return just the table fragment when the X-Fragment header is sent.
+(function () {
+    const target = document.querySelector('[data-list-fragment]');
+    if (!target) {
+        return;
+    }
+
+    let controller = null;
+    let searchTimer = null;
+
+    function loadFragment(url, pushState) {
+        if (controller) {
+            controller.abort();
+        }
+        controller = new AbortController();
+
+        fetch(url, {
+            headers: { 'X-Fragment': 'table' },
+            credentials: 'same-origin',
+            signal: controller.signal,
+        })
+            .then(response => {
+                if (!response.ok) {
+                    throw new Error('Fragment request failed: ' + response.status);
+                }
+                return response.text();
+            })
+            .then(html => {
+                target.innerHTML = html;
+                if (pushState) {
+                    history.pushState({ listFragment: true }, '', url);
+                }
+            })
+            .catch(error => {
+                // Fall back to a full page load if the fragment cannot be fetched
+                if (error.name !== 'AbortError') {
+                    window.location.href = url;
+                }
+            });
+    }
+
+    function urlForForm(form) {
+        // Keep the other active filters, replace the ones this form owns and restart at page 1
+        const url = new URL(window.location.href);
+        const params = url.searchParams;
+        params.delete('page');
+        // Hidden inputs only carry state for non-JS submissions; the current URL is authoritative here
+        Array.from(form.elements).forEach(field => {
+            if (!field.name || field.type === 'hidden' || field.type === 'submit') {
+                return;
+            }
+            if (field.value) {
+                params.set(field.name, field.value);
+            } else {
+                params.delete(field.name);
+            }
+        });
+        return url.toString();
+    }
+
+    document.querySelectorAll('form[method="get"]').forEach(form => {
+        form.addEventListener('submit', event => {
+            event.preventDefault();
+            loadFragment(urlForForm(form), true);
+        });
+
+        const searchInput = form.querySelector('input[name="search"]');
+        if (searchInput) {
+            searchInput.addEventListener('input', () => {
+                clearTimeout(searchTimer);
+                searchTimer = setTimeout(() => loadFragment(urlForForm(form), true), 300);
+            });
+        }
+    });
+
+    // Pagination links inside the fragment are plain query-string links
+    target.addEventListener('click', event => {
+        const link = event.target.closest('a[href^="?"]');
+        if (!link) {
+            return;
+        }
+        event.preventDefault();
+        loadFragment(link.href, true);
+    });
+
+    window.addEventListener('popstate', () => loadFragment(window.location.href, false));
+})();
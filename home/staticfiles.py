@@ -0,0 +1,81 @@
+import gzip
+import mimetypes
+import re
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import StaticFilesStorage
+from django.core.files.base import ContentFile
+from django.http import FileResponse, Http404, HttpRequest, HttpResponseNotModified
+from django.utils._os import safe_join
+from django.utils.cache import patch_vary_headers
+from django.utils.http import http_date
+from django.views.static import was_modified_since
+
+# File types that are already compressed and gain nothing from gzip
+PRECOMPRESSED_EXTENSIONS = ('.gz', '.br', '.zip', '.png', '.jpg', '.jpeg', '.gif', '.webp', '.woff', '.woff2')
+
+accepts_gzip = re.compile(r'\bgzip\b')
+
+
+class GzipStaticFilesStorage(StaticFilesStorage):
+    """Static files storage that writes a .gz copy of every asset on collectstatic"""
+
+    def post_process(self, paths, dry_run=False, **options):
+        if dry_run:
+            return
+
+        for name in paths:
+            if name.endswith(PRECOMPRESSED_EXTENSIONS):
+                continue
+
+            with self.open(name) as original:
+                content = original.read()
+            compressed = gzip.compress(content, compresslevel=9, mtime=0)
+
+            # Only keep the variant when it is actually smaller; a copy left
+            # by an earlier collectstatic would be served in its place
+            gz_name = f'{name}.gz'
+            if self.exists(gz_name):
+                self.delete(gz_name)
+            if len(compressed) < len(content):
+                self._save(gz_name, ContentFile(compressed))
+            yield name, name, True
+
+
+def serve_precompressed(request: HttpRequest, path: str) -> FileResponse:
+    """Serve a collected static file, sending its .gz copy when the client accepts gzip
+
+    Only mounted when DEBUG is on (see hens/urls.py); in production the web
+    server serves STATIC_ROOT and its .gz copies (e.g. nginx gzip_static).
+    """
+    try:
+        fullpath = Path(safe_join(settings.STATIC_ROOT, path))
+    except ValueError:
+        raise Http404('Invalid static file path')
+    if not fullpath.is_file():
+        raise Http404(f'"{path}" does not exist')
+
+    serve_path = fullpath
+    gz_path = fullpath.with_name(f'{fullpath.name}.gz')
+    use_gzip = accepts_gzip.search(request.headers.get('Accept-Encoding', '')) and gz_path.is_file()
+    if use_gzip:
+        serve_path = gz_path
+
+    stat = serve_path.stat()
+    if not was_modified_since(request.headers.get('If-Modified-Since'), stat.st_mtime):
+        response = HttpResponseNotModified()
+        patch_vary_headers(response, ('Accept-Encoding',))
+        return response
+
+    content_type, _ = mimetypes.guess_type(fullpath.name)
+    response = FileResponse(
+        serve_path.open('rb'),
+        content_type=content_type or 'application/octet-stream',
+        filename=fullpath.name,
+    )
+    response.headers['Last-Modified'] = http_date(stat.st_mtime)
+    if use_gzip:
+        response.headers['Content-Encoding'] = 'gzip'
+    patch_vary_headers(response, ('Accept-Encoding',))
+    return response
@@ -1,3 +1,1135 @@
-from django.test import TestCase
+import csv
+import gzip
+import json
+import os
+import tempfile
+from io import StringIO
+from datetime import date, datetime, timedelta
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+
+from django.contrib.sessions.models import Session
+from django.core.cache import caches
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.db import IntegrityError, connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from . import analytics, cohorts, exports, forecast, jobs, reports, sessions, sla, snapshots, views
+from .models import (
+    REQUEST_COOLDOWN_DAYS, UserProfile, Stock, Feedstock, Farmer, ChickRequest, ChangeLog, IngestionRecord, Job,
+    StateDurationBucket, StatusTransition,
+)
+from .staticfiles import GzipStaticFilesStorage
+
+
+class AdminChangelistQueryCountTests(TestCase):
+    """Changelist query counts must not grow with the number of rows"""
+
+    changelists = ['userprofile', 'stock', 'feedstock', 'farmer', 'chickrequest']
+
+    def setUp(self):
+        self.admin_user = UserProfile.objects.create_superuser('admin', 'admin@example.com', 'pw', is_manager=True)
+        self.client.force_login(self.admin_user)
+        self.rows = 0
+
+    def add_rows(self, count):
+        for i in range(self.rows, self.rows + count):
+            UserProfile.objects.create_user(f'agent{i}', is_salesagent=True)
+            Stock.objects.create(
+                stock_name=f'Batch {i}', quantity=100, chick_type='Broilers', chick_breed='local',
+                manager_name='Manager', chicks_period=3,
+            )
+            Feedstock.objects.create(
+                name_of_feeds=f'Feed {i}', quantity_of_feeds=10, unit_price=1, unit_cost=1, type_of_feeds='Starter',
+                brand_of_feeds='Brand', supplier_name='Supplier', supplier_contact='0700000000',
+                selling_price=2, buying_price=1,
+            )
+            farmer = Farmer.objects.create(
+                farmer_name=f'Farmer {i}', farmer_gender='F', nin=f'CF{i:012d}', recommender_name='Recommender',
+                recommender_nin='CM000000000000', phone_number=f'07{i:08d}', farmer_age=20 + i % 10,
+                type_of_farmer='starter', status='approved',
+            )
+            ChickRequest.objects.create(
+                farmer_name=farmer, chicks_type='Layers', chicks_breed='exotic', quantity=50,
+                feeds_needed='Y', chicks_period=2,
+            )
+        self.rows += count
+
+    def changelist_queries(self, model_name, **params):
+        url = reverse(f'admin:home_{model_name}_changelist')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_query_count_is_independent_of_row_count(self):
+        self.add_rows(3)
+        few = {name: self.changelist_queries(name) for name in self.changelists}
+        self.add_rows(30)
+        many = {name: self.changelist_queries(name) for name in self.changelists}
+        self.assertEqual(few, many)
+
+    def test_filtered_query_count_is_independent_of_row_count(self):
+        self.add_rows(3)
+        few = self.changelist_queries('chickrequest', status__exact='pending', q='Farmer')
+        self.add_rows(30)
+        many = self.changelist_queries('chickrequest', status__exact='pending', q='Farmer')
+        self.assertEqual(few, many)
+
+    def test_no_full_count_query(self):
+        self.add_rows(5)
+        for name in self.changelists:
+            url = reverse(f'admin:home_{name}_changelist')
+            with CaptureQueriesContext(connection) as queries:
+                self.client.get(url)
+            full_counts = [
+                query['sql'] for query in queries
+                if query['sql'].startswith('SELECT COUNT(*)') and 'LIMIT' not in query['sql']
+            ]
+            self.assertEqual(full_counts, [], name)
+
+
+def create_farmer(i, **fields):
+    return Farmer.objects.create(**{
+        'farmer_name': f'Farmer {i}', 'farmer_gender': 'F', 'nin': f'CF{i:012d}', 'recommender_name': 'Recommender',
+        'recommender_nin': 'CM000000000000', 'phone_number': f'07{i:08d}', 'farmer_age': 20 + i % 10,
+        'type_of_farmer': 'starter', 'status': 'approved', **fields,
+    })
+
+
+def create_request(farmer, **fields):
+    return ChickRequest.objects.create(**{
+        'farmer_name': farmer, 'chicks_type': 'Layers', 'chicks_breed': 'exotic', 'quantity': 50,
+        'feeds_needed': 'Y', 'chicks_period': 2, **fields,
+    })
+
+
+class FarmerRequestCounterTests(TestCase):
+    """The request counters on Farmer must match the farmer's requests after every kind of write"""
+
+    def setUp(self):
+        self.farmer = create_farmer(1)
+        self.other = create_farmer(2)
+
+    def assertCounters(self, farmer, **expected):
+        farmer.refresh_from_db()
+        actual = {field: getattr(farmer, field) for field in Farmer.REQUEST_COUNTER_FIELDS}
+        self.assertEqual(actual, Farmer.request_stats_for([farmer.pk])[farmer.pk])
+        for field, value in expected.items():
+            self.assertEqual(actual[field], value, field)
+
+    def test_saves_updates_and_deletes(self):
+        first = create_request(self.farmer)
+        second = create_request(self.farmer, status='approved')
+        self.assertCounters(self.farmer, total_requests=2, pending_requests=1, approved_requests=1)
+
+        first.status = 'rejected'
+        first.save()
+        self.assertCounters(self.farmer, pending_requests=0, rejected_requests=1)
+
+        ChickRequest.objects.filter(pk=second.pk).update(status='sold')
+        self.assertCounters(self.farmer, approved_requests=0, sold_requests=1)
+
+        ChickRequest.objects.filter(pk=second.pk).update(farmer_name=self.other)
+        self.assertCounters(self.farmer, total_requests=1, sold_requests=0)
+        self.assertCounters(self.other, total_requests=1, sold_requests=1)
+
+        first.delete()
+        ChickRequest.objects.filter(farmer_name=self.other).delete()
+        self.assertCounters(self.farmer, total_requests=0)
+        self.assertCounters(self.other, total_requests=0)
+
+    def test_edits_leave_the_farmer_alone_unless_its_page_changes(self):
+        request = create_request(self.farmer)
+        request = ChickRequest.objects.get(pk=request.pk)
+        updated_at = Farmer.objects.get(pk=self.farmer.pk).updated_at
+
+        request.delivered = 'Y'
+        with CaptureQueriesContext(connection) as queries:
+            request.save()
+        self.assertEqual([query['sql'] for query in queries if 'home_farmer' in query['sql']], [])
+        self.assertEqual(Farmer.objects.get(pk=self.farmer.pk).updated_at, updated_at)
+
+        request.quantity = 80
+        request.save()
+        self.assertGreater(Farmer.objects.get(pk=self.farmer.pk).updated_at, updated_at)
+        self.assertCounters(self.farmer, total_requests=1, pending_requests=1)
+
+    def test_saving_a_loaded_farmer_keeps_newer_counters(self):
+        stale = Farmer.objects.get(pk=self.farmer.pk)
+        create_request(self.farmer)
+        stale.status = 'rejected'
+        stale.save()
+        self.assertCounters(self.farmer, total_requests=1, pending_requests=1)
+        self.assertEqual(self.farmer.status, 'rejected')
+
+
+class FarmerDetailConditionalTests(TestCase):
+    """A repeated farmer detail request is answered 304 from the farmer row alone until the page changes"""
+
+    def setUp(self):
+        self.client.force_login(UserProfile.objects.create_user('manager', password='pw', is_manager=True))
+        self.farmer = create_farmer(1)
+        self.request = create_request(self.farmer)
+        self.url = reverse('farmer_detail', args=[self.farmer.pk])
+
+    def revalidate(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        with CaptureQueriesContext(connection) as queries:
+            repeat = self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag'])
+        return repeat, queries
+
+    def test_repeat_request_is_not_modified(self):
+        repeat, queries = self.revalidate()
+        self.assertEqual(repeat.status_code, 304)
+        farmer_queries = [query['sql'] for query in queries if 'home_farmer' in query['sql']]
+        self.assertEqual(len(farmer_queries), 1)
+        self.assertNotIn('JOIN', farmer_queries[0])
+
+    def test_request_changes_invalidate_the_page(self):
+        edits = [
+            lambda: create_request(self.farmer),
+            lambda: ChickRequest.objects.filter(pk=self.request.pk).update(quantity=75),
+            lambda: ChickRequest.objects.filter(pk=self.request.pk).update(status='approved'),
+            lambda: ChickRequest.objects.filter(pk=self.request.pk).delete(),
+        ]
+        for edit in edits:
+            response = self.client.get(self.url)
+            edit()
+            self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 200)
+
+
+class FarmerSearchTests(TestCase):
+    """The typeahead finds approved farmers by name, NIN or phone prefix, non-ASCII names included"""
+
+    def setUp(self):
+        self.client.force_login(UserProfile.objects.create_user('agent', password='pw', is_salesagent=True))
+        self.emile = create_farmer(1, farmer_name='Émile Okello')
+        self.ruth = create_farmer(2, farmer_name='Ruth Nakato')
+        create_farmer(3, farmer_name='Ruth Pending', status='pending')
+
+    def search(self, query):
+        response = self.client.get(reverse('api_farmer_search'), {'q': query})
+        self.assertEqual(response.status_code, 200)
+        return [result['id'] for result in response.json()['results']]
+
+    def test_prefixes(self):
+        self.assertEqual(self.search('ruth'), [self.ruth.pk])
+        self.assertEqual(self.search('émile'), [self.emile.pk])
+        self.assertEqual(self.search('ÉMI'), [self.emile.pk])
+        self.assertCountEqual(self.search('cf0000000000'), [self.emile.pk, self.ruth.pk])
+        self.assertEqual(self.search('0700000002'), [self.ruth.pk])
+        self.assertEqual(self.search('Okello'), [])
+
+    def test_renames_update_the_search_name(self):
+        self.emile.farmer_name = 'Ábel Okello'
+        self.emile.save(update_fields=['farmer_name'])
+        Farmer.objects.filter(pk=self.ruth.pk).update(farmer_name='Ölga Nakato')
+        self.assertEqual(self.search('ábel'), [self.emile.pk])
+        self.assertEqual(self.search('ölga'), [self.ruth.pk])
+        self.assertEqual(self.search('émile'), [])
+
+
+class ChangeFeedTests(TestCase):
+    """/api/changes/ returns each changed row once with its current values, and tombstones for deletes"""
+
+    def setUp(self):
+        self.client.force_login(UserProfile.objects.create_user('agent', password='pw', is_salesagent=True))
+
+    def changes(self, since, **params):
+        response = self.client.get(reverse('api_changes'), {'since': since, **params})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_sync_from_cursor(self):
+        start = self.changes(0)['cursor']
+        farmer = create_farmer(1)
+        request = create_request(farmer)
+        farmer.farmer_name = 'Renamed'
+        farmer.save()
+
+        feed = self.changes(start)
+        self.assertFalse(feed['more'])
+        by_key = {(change['model'], change['id']): change for change in feed['changes']}
+        self.assertEqual(len(by_key), len(feed['changes']))
+        self.assertEqual(by_key['farmer', farmer.pk]['data']['farmer_name'], 'Renamed')
+        self.assertEqual(by_key['chickrequest', request.pk]['data']['farmer_name_id'], farmer.pk)
+
+        request_id = request.pk
+        request.delete()
+        feed = self.changes(feed['cursor'])
+        self.assertIn({'model': 'chickrequest', 'id': request_id, 'deleted': True}, feed['changes'])
+        self.assertEqual(self.changes(feed['cursor'])['changes'], [])
+
+    def test_paging(self):
+        start = self.changes(0)['cursor']
+        farmers = [create_farmer(i) for i in range(5)]
+        seen, cursor, more = [], start, True
+        while more:
+            feed = self.changes(cursor, limit=2)
+            seen += [change['id'] for change in feed['changes']]
+            cursor, more = feed['cursor'], feed['more']
+        self.assertEqual(sorted(seen), sorted(farmer.pk for farmer in farmers))
+
+
+class BatchIngestTests(TestCase):
+    """/api/ingest/ creates each item at most once per idempotency key"""
+
+    def setUp(self):
+        self.agent = UserProfile.objects.create_user('agent', password='pw', is_salesagent=True)
+        self.client.force_login(self.agent)
+
+    def farmer_item(self, key, nin='CF000000000100'):
+        return {'key': key, 'type': 'farmer', 'data': {
+            'farmer_name': 'Offline Farmer', 'farmer_gender': 'M', 'nin': nin, 'recommender_name': 'Recommender',
+            'recommender_nin': 'CM000000000000', 'phone_number': '0700000100', 'farmer_age': 22,
+            'type_of_farmer': 'starter',
+        }}
+
+    def ingest(self, *items):
+        response = self.client.post(reverse('api_batch_ingest'), json.dumps({'items': list(items)}), content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_replay_returns_the_original_outcome(self):
+        first = self.ingest(self.farmer_item('a'), {'key': 'b', 'type': 'unknown'})
+        self.assertEqual((first['created'], first['rejected']), (1, 1))
+        replay = self.ingest(self.farmer_item('a'))
+        self.assertEqual(replay['results'], [
+            {'key': 'a', 'type': 'farmer', 'status': 'replayed', 'id': first['results'][0]['id']},
+        ])
+        self.assertEqual(Farmer.objects.count(), 1)
+
+    def test_concurrent_replay_returns_the_winner(self):
+        winner = create_farmer(1)
+        IngestionRecord.objects.create(idempotency_key='a', kind='farmer', object_id=winner.pk, created_by=self.agent)
+        filter_records = IngestionRecord.objects.filter
+
+        def committed_after_lookup(**lookups):
+            # The other upload of key "a" commits between the lookup and the insert
+            if 'idempotency_key__in' in lookups:
+                return IngestionRecord.objects.none()
+            return filter_records(**lookups)
+
+        with mock.patch.object(IngestionRecord.objects, 'filter', side_effect=committed_after_lookup):
+            result = self.ingest(self.farmer_item('a'), self.farmer_item('c', nin='CF000000000101'))
+        self.assertEqual(result['results'][0], {'key': 'a', 'type': 'farmer', 'status': 'replayed', 'id': winner.pk})
+        self.assertEqual(result['results'][1]['status'], 'created')
+        # The losing insert was rolled back with its savepoint
+        self.assertFalse(Farmer.objects.filter(nin='CF000000000100').exists())
+
+    def test_conflict_under_another_key_rejects_only_that_item(self):
+        ingest_farmer = views.INGESTERS['farmer']
+
+        def registered_concurrently(user, data):
+            # Another upload registered the same NIN under a different key after validation
+            if data['nin'] == 'CF000000000100':
+                raise IntegrityError('UNIQUE constraint failed: home_farmer.nin')
+            return ingest_farmer(user, data)
+
+        with mock.patch.dict(views.INGESTERS, {'farmer': registered_concurrently}):
+            result = self.ingest(self.farmer_item('c', nin='CF000000000101'), self.farmer_item('a'))
+        self.assertEqual([item['status'] for item in result['results']], ['created', 'rejected'])
+        self.assertTrue(Farmer.objects.filter(nin='CF000000000101').exists())
+        self.assertFalse(IngestionRecord.objects.filter(idempotency_key='a').exists())
+
+
+class ApiTokenTests(TestCase):
+    """Bearer tokens from /api/token/ authenticate /api/ calls until the user can no longer use them"""
+
+    def setUp(self):
+        caches['throttle'].clear()
+        self.manager = UserProfile.objects.create_user('manager', password='pw', is_manager=True)
+        response = self.client.post(
+            reverse('api_token'), json.dumps({'username': 'manager', 'password': 'pw'}), content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 200)
+        self.auth = {'HTTP_AUTHORIZATION': f"Bearer {response.json()['token']}"}
+
+    def stats_status(self):
+        return self.client.get(reverse('api_dashboard_stats'), **self.auth).status_code
+
+    def test_token_authenticates_without_a_session(self):
+        response = self.client.get(reverse('api_dashboard_stats'), **self.auth)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('sessionid', response.cookies)
+        self.assertEqual(self.client.get(reverse('api_dashboard_stats'), HTTP_AUTHORIZATION='Bearer forged').status_code, 401)
+
+    def test_deactivation_revokes_tokens(self):
+        self.manager.is_active = False
+        self.manager.save()
+        self.assertEqual(self.stats_status(), 401)
+
+    def test_password_change_revokes_tokens(self):
+        self.manager.set_password('changed')
+        self.manager.save()
+        self.assertEqual(self.stats_status(), 401)
+
+    def test_bodies_that_are_not_objects_are_bad_requests(self):
+        self.client.force_login(self.manager)
+        for name in ('api_token', 'api_check_farmer_status', 'api_job_submit'):
+            for body in ('[]', '"x"', '{"kind": ["x"], "username": 1, "nin": 5, "phone": 7}', b'\xff'):
+                response = self.client.post(reverse(name), body, content_type='application/json')
+                self.assertEqual(response.status_code, 400, (name, body))
+
+    def test_token_is_ignored_outside_the_api(self):
+        response = self.client.get(reverse('manager_dashboard'), **self.auth)
+        self.assertEqual(response.status_code, 302)
+
+
+class SessionWriteTests(TestCase):
+    """Logins reach the database at once; other session changes are queued and flushed by the end of a request"""
+
+    def setUp(self):
+        self.manager = UserProfile.objects.create_user('manager', password='pw', is_manager=True)
+
+    def test_login_is_written_at_once(self):
+        self.assertTrue(self.client.login(username='manager', password='pw'))
+        session_key = self.client.cookies['sessionid'].value
+        stored = Session.objects.get(session_key=session_key).get_decoded()
+        self.assertEqual(stored['_auth_user_id'], str(self.manager.pk))
+
+        # A worker without the cached copy still sees the login
+        caches['sessions'].clear()
+        self.assertEqual(self.client.get(reverse('manager_dashboard')).status_code, 200)
+
+    def test_queued_changes_are_flushed_after_a_request(self):
+        self.client.login(username='manager', password='pw')
+        store = sessions.SessionStore(self.client.cookies['sessionid'].value)
+        store['theme'] = 'dark'
+        store.save()
+        self.assertNotIn('theme', Session.objects.get(session_key=store.session_key).get_decoded())
+
+        with self.settings(SESSION_WRITE_BATCH_SECONDS=0):
+            self.client.get(reverse('manager_dashboard'))
+        self.assertEqual(Session.objects.get(session_key=store.session_key).get_decoded()['theme'], 'dark')
+
+
+class SalesReportJobTests(TestCase):
+    """A finished sales report is reused until a change alters its range"""
+
+    def setUp(self):
+        self.agent = UserProfile.objects.create_user('agent', password='pw', is_salesagent=True)
+        self.farmer = create_farmer(1)
+
+    def sell(self, days_ago=0):
+        request = create_request(self.farmer, status='sold', sales_authorized=True, sales_authorized_by=self.agent)
+        ChickRequest.objects.filter(pk=request.pk).update(sales_authorized_date=timezone.now() - timedelta(days=days_ago))
+        return request
+
+    def report(self, start_date, end_date):
+        job = jobs.submit('sales_report', {'start_date': start_date.isoformat(), 'end_date': end_date.isoformat()})
+        if job.status == 'queued':
+            jobs.claim(job, 'test')
+            jobs.run(job)
+            job.refresh_from_db()
+        return job
+
+    def test_past_ranges_go_stale_on_changes_in_range(self):
+        today = timezone.localdate()
+        start, end = today - timedelta(days=60), today - timedelta(days=30)
+        counted = self.sell(days_ago=40)
+        job = self.report(start, end)
+        self.assertEqual(job.result['total_sales_count'], 1)
+
+        create_request(create_farmer(2))
+        self.assertEqual(self.report(start, end).pk, job.pk)
+
+        self.sell(days_ago=40)
+        job = self.report(start, end)
+        self.assertEqual(job.result['total_sales_count'], 2)
+
+        counted.delete()
+        self.assertEqual(self.report(start, end).result['total_sales_count'], 1)
+
+    def test_ranges_go_stale_only_on_changes_in_range(self):
+        today = timezone.localdate()
+        start = today - timedelta(days=7)
+        counted = self.sell()
+        job = self.report(start, today)
+        self.assertEqual(job.result['total_sales_count'], 1)
+
+        # A pending request and a sale outside the range leave the report current
+        create_request(create_farmer(2))
+        self.sell(days_ago=30)
+        self.assertEqual(self.report(start, today).pk, job.pk)
+
+        self.sell()
+        job = self.report(start, today)
+        self.assertEqual(job.result['total_sales_count'], 2)
+
+        # A counted sale that is no longer sold
+        ChickRequest.objects.filter(pk=counted.pk).update(status='approved')
+        job = self.report(start, today)
+        self.assertEqual(job.result['total_sales_count'], 1)
+
+    def test_renaming_a_farmer_with_sales_in_range(self):
+        today = timezone.localdate()
+        self.sell()
+        job = self.report(today, today)
+        self.farmer.farmer_name = 'Renamed'
+        self.farmer.save()
+        job = self.report(today, today)
+        self.assertEqual(job.result['sales_by_rep']['agent']['sales_details'][0]['farmer'], 'Renamed')
+
+
+class JobRecoveryTests(TestCase):
+    """Jobs left running by a dead worker are queued again, and unclaimed ones run inline"""
+
+    params = {'start_date': '2026-01-01', 'end_date': '2026-01-31'}
+
+    def age(self, job, **fields):
+        long_ago = timezone.now() - timedelta(hours=1)
+        Job.objects.filter(pk=job.pk).update(**{field: long_ago for field in fields})
+        job.refresh_from_db()
+        return job
+
+    def test_stalled_job_is_requeued(self):
+        job = jobs.submit('sales_report', self.params)
+        jobs.claim(job, 'dead-worker')
+        self.assertEqual(jobs.submit('sales_report', self.params).status, 'running')
+        self.assertEqual(jobs.requeue_stalled(), 0)
+
+        self.age(job, heartbeat_at=True, started_at=True)
+        resubmitted = jobs.submit('sales_report', self.params)
+        self.assertEqual((resubmitted.pk, resubmitted.status, resubmitted.worker), (job.pk, 'queued', ''))
+
+        jobs.claim(job, 'dead-worker')
+        self.age(job, heartbeat_at=True)
+        self.assertEqual(jobs.requeue_stalled(), 1)
+
+    def test_unclaimed_job_runs_inline(self):
+        self.client.force_login(UserProfile.objects.create_user('manager', password='pw', is_manager=True))
+        url = reverse('sales_report')
+        response = self.client.get(url, self.params)
+        self.assertTemplateUsed(response, 'reports/report_pending.html')
+
+        self.age(Job.objects.get(), created_at=True)
+        response = self.client.get(url, self.params)
+        self.assertTemplateUsed(response, 'reports/sales_report.html')
+        self.assertEqual(Job.objects.get().status, 'done')
+
+
+class SerialExecutor:
+    """Stands in for the process pool: the test database is in memory, so forked workers could not read it"""
+
+    def __init__(self, max_workers=None, mp_context=None, initializer=None):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def map(self, function, *iterables):
+        return map(function, *iterables)
+
+
+class PartitionedSalesReportTests(TestCase):
+    """Merging month partitions gives exactly the report computed over the whole range at once"""
+
+    def test_partitioned_report_matches_serial(self):
+        agents = [UserProfile.objects.create_user(f'agent{i}', is_salesagent=True, first_name=f'Agent {i}') for i in range(2)]
+        farmers = [create_farmer(i) for i in range(3)]
+        start = timezone.make_aware(datetime(2026, 3, 1))
+        # Sales on either side of every month boundary, shared by both agents and farmers
+        moments = [start + timedelta(days=day, hours=hour) for day in range(0, 122, 3) for hour in (0, 23)]
+        moments += [timezone.make_aware(datetime(2026, month, 1)) - timedelta(seconds=1) for month in (4, 5, 6)]
+        for i, moment in enumerate(moments):
+            request = create_request(
+                farmers[i % 3], status='sold', sales_authorized=True, sales_authorized_by=agents[i % 2],
+                quantity=10 + i, chicks_breed='local' if i % 2 else 'exotic',
+            )
+            ChickRequest.objects.filter(pk=request.pk).update(sales_authorized_date=moment)
+
+        start_date, end_date = start.date(), start.date() + timedelta(days=121)
+        self.assertGreaterEqual(len(reports.month_partitions(start_date, end_date)), 4)
+        serial = reports.build_sales_report(start_date, end_date, workers=1)
+        with mock.patch.object(reports, 'can_partition', return_value=True), \
+                mock.patch.object(reports, 'ProcessPoolExecutor', SerialExecutor), \
+                mock.patch.object(reports, 'sales_partition', wraps=reports.sales_partition) as partition:
+            parallel = reports.build_sales_report(start_date, end_date, workers=4)
+        self.assertGreaterEqual(partition.call_count, 4)
+
+        self.assertEqual(serial['total_sales_count'], len(moments))
+        for field in ('total_sales_count', 'total_chicks_sold', 'total_sales_value', 'daily_sales', 'sales_by_type', 'top_rep'):
+            self.assertEqual(parallel[field], serial[field], field)
+        for username, rep in serial['sales_by_rep'].items():
+            self.assertEqual(parallel['sales_by_rep'][username]['sales_details'], rep['sales_details'], username)
+        self.assertEqual(parallel, serial)
+
+
+class TemplateParityTests(TestCase):
+    """benchmark_templates renders every hot page with both engines and finds the same output"""
+
+    def test_benchmark_templates_reports_parity(self):
+        output = StringIO()
+        call_command('benchmark_templates', rows=[5], repeat=1, stdout=output)
+        rows = output.getvalue().splitlines()[1:]
+        self.assertEqual(len(rows), 5)
+        for row in rows:
+            self.assertTrue(row.endswith('yes'), row)
+
+
+class GzipStaticFilesTests(TestCase):
+    """collectstatic keeps a .gz copy only while it is smaller than the asset"""
+
+    def test_stale_gzip_copy_is_removed(self):
+        with tempfile.TemporaryDirectory() as location:
+            storage = GzipStaticFilesStorage(location=location)
+            storage.save('app.js', ContentFile(b'var x = 1;\n' * 200))
+            list(storage.post_process(['app.js']))
+            self.assertTrue(storage.exists('app.js.gz'))
+
+            # Rewritten so that gzip no longer pays off
+            storage.delete('app.js')
+            storage.save('app.js', ContentFile(b'x'))
+            list(storage.post_process(['app.js']))
+            self.assertFalse(storage.exists('app.js.gz'))
+
+
+@override_settings(API_THROTTLES={
+    'check_farmer_status': {'ip': (2, 1), 'nin': (3, 0.1), 'global': (5, 1)},
+    'dashboard_stats_api': {'user': (2, 1)},
+})
+class ThrottleTests(TestCase):
+    """Token buckets answer 429 per client and 503 for the endpoint as a whole, and refill over time"""
+
+    def setUp(self):
+        caches['throttle'].clear()
+        self.now = 1000.0
+        clock = mock.patch('home.throttling.time.time', side_effect=lambda: self.now)
+        clock.start()
+        self.addCleanup(clock.stop)
+
+    def check_status(self, nin='CF000000000001', ip='10.0.0.1', **headers):
+        return self.client.post(
+            reverse('api_check_farmer_status'), json.dumps({'nin': nin, 'phone': '0700000001'}),
+            content_type='application/json', REMOTE_ADDR=ip, **headers,
+        )
+
+    def test_ip_bucket_refills(self):
+        self.assertEqual([self.check_status(nin=f'N{i}').status_code for i in range(3)], [200, 200, 429])
+        response = self.check_status(nin='N3')
+        self.assertEqual(response['Retry-After'], '1')
+        self.assertEqual(self.check_status(nin='N3', ip='10.0.0.2').status_code, 200)
+        self.now += 1
+        self.assertEqual(self.check_status(nin='N3').status_code, 200)
+
+    def test_nin_bucket_ignores_case_and_spacing(self):
+        statuses = [self.check_status(nin=nin, ip=f'10.0.0.{i}').status_code
+                    for i, nin in enumerate(['cf1', 'CF1', ' cf1 ', 'Cf1'])]
+        self.assertEqual(statuses, [200, 200, 200, 429])
+
+    def test_global_bucket_sheds_load(self):
+        statuses = [self.check_status(nin=f'N{i}', ip=f'10.0.0.{i}').status_code for i in range(6)]
+        self.assertEqual(statuses, [200] * 5 + [503])
+
+    def test_user_bucket(self):
+        for username in ('one', 'two'):
+            self.client.force_login(UserProfile.objects.create_user(username, password='pw', is_manager=True))
+            statuses = [self.client.get(reverse('api_dashboard_stats')).status_code for _ in range(3)]
+            self.assertEqual(statuses, [200, 200, 429], username)
+
+    def test_client_ip_from_the_proxy_header(self):
+        with self.settings(THROTTLE_CLIENT_IP_HEADER='HTTP_X_FORWARDED_FOR'):
+            # Behind the proxy every request comes from the same REMOTE_ADDR
+            for i in range(2):
+                self.assertEqual(self.check_status(nin=f'N{i}', HTTP_X_FORWARDED_FOR='10.1.1.1').status_code, 200)
+            # A spoofed first entry does not move the client to another bucket
+            self.assertEqual(self.check_status(nin='N2', HTTP_X_FORWARDED_FOR='9.9.9.9, 10.1.1.1').status_code, 429)
+            self.assertEqual(self.check_status(nin='N3', HTTP_X_FORWARDED_FOR='10.1.1.2').status_code, 200)
+
+
+class SnapshotTests(TestCase):
+    """Snapshots read back the rows they were built from and are published whole"""
+
+    def setUp(self):
+        snapshot_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(snapshot_dir.cleanup)
+        self.root = snapshot_dir.name
+        override = override_settings(ANALYTICS_SNAPSHOT_DIR=self.root, TIME_ZONE='Africa/Kampala')
+        override.enable()
+        self.addCleanup(override.disable)
+        self.farmer = create_farmer(1, farmer_gender='M', type_of_farmer='returning')
+        self.pending = create_request(self.farmer, quantity=30, chicks_breed='local')
+        self.sold = create_request(self.farmer, quantity=40, status='sold', sales_authorized_date=timezone.now())
+        self.feeds = Feedstock.objects.create(
+            name_of_feeds='Layers mash', quantity_of_feeds=10, unit_price='85000.50', unit_cost='80000.00',
+            type_of_feeds='mash', brand_of_feeds='Ugachick', supplier_name='Supplier', supplier_contact='0700000000',
+            selling_price='90000.00', buying_price='80000.25',
+        )
+
+    def test_round_trip(self):
+        snapshot = snapshots.current_snapshot()
+        self.assertIsNone(snapshot)
+        manifest = snapshots.build_snapshot()
+        snapshot = snapshots.current_snapshot()
+        self.assertEqual(snapshot.version, manifest['version'])
+        self.assertEqual(manifest['tables']['chickrequest']['rows'], 2)
+
+        column = lambda name: snapshot.column('chickrequest', name)
+        decoded = lambda name: [snapshot.dictionary('chickrequest', name)[code] for code in column(name)]
+        self.assertEqual(column('id').tolist(), [self.pending.pk, self.sold.pk])
+        self.assertEqual(column('quantity').tolist(), [30, 40])
+        self.assertEqual(decoded('chicks_breed'), ['local', 'exotic'])
+        self.assertEqual(decoded('status'), ['pending', 'sold'])
+        self.assertEqual(decoded('farmer_gender'), ['M', 'M'])
+        self.assertEqual(decoded('type_of_farmer'), ['returning', 'returning'])
+        # Datetimes are local wall times, so their dates are local dates
+        self.assertEqual(
+            column('date_time').astype('datetime64[D]').tolist(),
+            [timezone.localdate(self.pending.date_time), timezone.localdate(self.sold.date_time)],
+        )
+        sale_days = column('sales_authorized_date').astype('datetime64[D]')
+        self.assertTrue(str(sale_days[0]) == 'NaT')
+        self.assertEqual(sale_days[1].item(), timezone.localdate(self.sold.sales_authorized_date))
+        self.assertFalse(column('id').flags.writeable)
+
+        feeds = lambda name: snapshot.column('feedstock', name).tolist()
+        self.assertEqual(snapshot.spec('feedstock', 'unit_price')['decimal_places'], 2)
+        self.assertEqual(feeds('unit_price'), [8500050])
+        self.assertEqual(feeds('buying_price'), [8000025])
+
+    def test_published_by_replacing_the_pointer(self):
+        first = snapshots.build_snapshot()
+        create_request(self.farmer, quantity=5)
+        with mock.patch.object(snapshots.os, 'replace', side_effect=OSError('disk full')):
+            with self.assertRaises(OSError):
+                snapshots.build_snapshot()
+        # The failed build is not visible: readers still get the previous snapshot, complete
+        snapshot = snapshots.current_snapshot()
+        self.assertEqual(snapshot.version, first['version'])
+        self.assertEqual(len(snapshot.column('chickrequest', 'id')), 2)
+
+        second = snapshots.build_snapshot(keep=1)
+        snapshot = snapshots.current_snapshot()
+        self.assertEqual(snapshot.version, second['version'])
+        self.assertEqual(len(snapshot.column('chickrequest', 'id')), 3)
+        with open(f'{self.root}/{snapshots.POINTER}') as f:
+            self.assertEqual(json.load(f), {'directory': second['version']})
+        self.assertEqual(sorted(os.listdir(self.root)), [second['version'], snapshots.POINTER])
+
+    def test_changes_during_a_build_are_caught_up(self):
+        write_table = snapshots.write_table
+
+        def write_table_during_changes(directory, name, model):
+            # Written after the cursor was taken but before the requests are read
+            if name == 'chickrequest':
+                ChickRequest.objects.filter(pk=self.pending.pk).update(status='approved')
+                Farmer.objects.filter(pk=self.farmer.pk).update(farmer_gender='F')
+            return write_table(directory, name, model)
+
+        with mock.patch.object(snapshots, 'write_table', write_table_during_changes):
+            manifest = snapshots.build_snapshot()
+        self.assertLess(manifest['change_cursor'], ChangeLog.objects.latest('pk').pk)
+
+        cube = analytics.RequestCube()
+        cube.rebuild()
+        cube.refresh()
+        self.assertEqual(cube.query(['status', 'farmer_gender'], {}), [
+            {'status': 'approved', 'farmer_gender': 'F', 'requests': 1, 'quantity': 30},
+            {'status': 'sold', 'farmer_gender': 'F', 'requests': 1, 'quantity': 40},
+        ])
+
+
+class ExportTests(TestCase):
+    """Each export run rewrites exactly the months whose rows changed"""
+
+    def setUp(self):
+        export_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(export_dir.cleanup)
+        self.root = export_dir.name
+        # No lag, so rows saved just before a run are not exported again by the next one
+        override = override_settings(DATA_EXPORT_DIR=self.root, DATA_EXPORT_WATERMARK_LAG=0)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.farmer = create_farmer(1)
+        self.agent = UserProfile.objects.create_user('agent', password='pw', is_salesagent=True)
+        self.requests = []
+        for month in (1, 1, 2, 3):
+            request = create_request(self.farmer, status='sold', sales_authorized_by=self.agent)
+            moment = self.month(month)
+            ChickRequest.objects.filter(pk=request.pk).update(date_time=moment, sales_authorized_date=moment)
+            self.requests.append(request)
+        self.old = timezone.now() - timedelta(days=1)
+        # Rows last written well before the first export
+        ChickRequest.objects.update(updated_at=self.old)
+        Farmer.objects.update(updated_at=self.old)
+
+    def month(self, month):
+        return datetime(2026, month, 10, 12, tzinfo=timezone.get_current_timezone())
+
+    def rows(self, table, month, export_format='csv'):
+        path = os.path.join(self.root, table, f'month=2026-{month:02d}', exports.FORMATS[export_format])
+        with gzip.open(path, 'rt', newline='') as f:
+            if export_format == 'csv':
+                return list(csv.DictReader(f))
+            return [json.loads(line) for line in f]
+
+    def export(self, export_format='csv'):
+        return exports.export_tables(['chickrequest', 'sales'], export_format=export_format)
+
+    def test_only_months_changed_since_the_watermark_are_rewritten(self):
+        self.assertEqual(self.export(), {'chickrequest': ['2026-01', '2026-02', '2026-03'], 'sales': ['2026-01', '2026-02', '2026-03']})
+        self.assertEqual(self.export(), {'chickrequest': [], 'sales': []})
+
+        request = ChickRequest.objects.get(pk=self.requests[2].pk)
+        request.delivered = 'Y'
+        request.save()
+        self.assertEqual(self.export(), {'chickrequest': ['2026-02'], 'sales': ['2026-02']})
+        self.assertEqual([row['delivered'] for row in self.rows('sales', 2)], ['Y'])
+
+    def test_deleted_and_moved_rows(self):
+        self.export()
+        ChickRequest.objects.filter(pk=self.requests[3].pk).delete()
+        # A move whose updated_at was not bumped is still caught by the month counts
+        ChickRequest.objects.filter(pk=self.requests[0].pk).update(date_time=self.month(2), updated_at=self.old)
+        self.assertEqual(self.export()['chickrequest'], ['2026-01', '2026-02', '2026-03'])
+        self.assertEqual(len(self.rows('chickrequest', 1)), 1)
+        self.assertEqual(len(self.rows('chickrequest', 2)), 2)
+        self.assertFalse(os.path.exists(os.path.join(self.root, 'chickrequest', 'month=2026-03')))
+        self.assertNotIn('2026-03', exports.read_manifest(self.root)['tables']['chickrequest']['partitions'])
+
+    def test_farmer_changes_rewrite_their_sales(self):
+        self.export()
+        self.farmer.farmer_name = 'Renamed Farmer'
+        self.farmer.save()
+        self.assertEqual(self.export()['sales'], ['2026-01', '2026-02', '2026-03'])
+        self.assertEqual({row['farmer_name'] for row in self.rows('sales', 1)}, {'Renamed Farmer'})
+        self.assertEqual(self.rows('sales', 1)[0]['sales_agent_id'], str(self.agent.pk))
+        # The farmer's updated_at is part of the watermark, so the next run has nothing to do
+        self.assertEqual(self.export()['sales'], [])
+
+    def test_switching_format_replaces_every_partition(self):
+        self.export()
+        self.assertEqual(self.export('ndjson')['sales'], ['2026-01', '2026-02', '2026-03'])
+        self.assertEqual(os.listdir(os.path.join(self.root, 'sales', 'month=2026-01')), ['part.ndjson.gz'])
+        rows = self.rows('sales', 1, 'ndjson')
+        self.assertEqual([row['request_id'] for row in rows], [self.requests[0].pk, self.requests[1].pk])
+        self.assertEqual(exports.read_manifest(self.root)['tables']['sales']['format'], 'ndjson')
+
+
+class FarmerCohortsTests(TestCase):
+    """Incrementally refreshed cohort counters equal a full recompute"""
+
+    def setUp(self):
+        snapshot_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(snapshot_dir.cleanup)
+        override = override_settings(ANALYTICS_SNAPSHOT_DIR=snapshot_dir.name)
+        override.enable()
+        self.addCleanup(override.disable)
+        zone = timezone.get_current_timezone()
+        self.farmers = [
+            create_farmer(i, date_registered=datetime(2025, 1 + i % 3, 5, tzinfo=zone)) for i in range(6)
+        ]
+        self.requests = []
+        for i in range(12):
+            farmer = self.farmers[i % 6]
+            request = create_request(farmer, status='rejected' if i == 5 else 'approved')
+            moment = farmer.date_registered + timedelta(days=10 + 40 * (i // 6) + i)
+            ChickRequest.objects.filter(pk=request.pk).update(date_time=moment)
+            self.requests.append(request)
+
+    def recomputed(self):
+        counters = cohorts.FarmerCohorts()
+        counters.rebuild(use_snapshot=False)
+        return counters
+
+    def change_everything(self):
+        zone = timezone.get_current_timezone()
+        newcomer = create_farmer(10, date_registered=datetime(2025, 3, 1, tzinfo=zone))
+        create_request(newcomer)
+        create_request(self.farmers[0])
+        self.requests[1].delete()
+        ChickRequest.objects.filter(pk=self.requests[2].pk).update(farmer_name=self.farmers[3])
+        ChickRequest.objects.filter(pk=self.requests[5].pk).update(status='approved')
+        ChickRequest.objects.filter(pk=self.requests[10].pk).update(status='rejected')
+        Farmer.objects.filter(pk=self.farmers[4].pk).update(date_registered=datetime(2024, 12, 1, tzinfo=zone))
+        self.farmers[0].delete()
+
+    def assertMatchesRecompute(self, counters):
+        recomputed = self.recomputed()
+        self.assertEqual(
+            (counters.sizes, counters.active, counters.returns), (recomputed.sizes, recomputed.active, recomputed.returns),
+        )
+        self.assertEqual(counters.matrix(), recomputed.matrix())
+
+    def test_refresh_over_a_snapshot(self):
+        snapshots.build_snapshot()
+        counters = cohorts.FarmerCohorts()
+        counters.rebuild()
+        self.assertMatchesRecompute(counters)
+        self.change_everything()
+        counters.refresh()
+        self.assertMatchesRecompute(counters)
+
+    def test_refresh_over_a_database_load(self):
+        counters = self.recomputed()
+        self.assertEqual(sum(counters.sizes.values()), 6)
+        self.change_everything()
+        counters.refresh()
+        self.assertMatchesRecompute(counters)
+        self.assertEqual(sum(counters.sizes.values()), 6)
+
+    def test_first_request_waits_for_a_snapshot_job(self):
+        self.client.force_login(UserProfile.objects.create_user('manager', password='pw', is_manager=True))
+        url = reverse('api_farmer_cohorts')
+        with mock.patch.object(cohorts, '_cohorts', None):
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 503)
+            job = Job.objects.get(kind='analytics_snapshot')
+            Job.objects.filter(pk=job.pk).update(created_at=timezone.now() - timedelta(hours=1))
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual([row['farmers'] for row in response.json()['cohorts']], [2, 2, 2])
+
+
+class ForecastTests(TestCase):
+    """Forecast pieces computed for a fixed today"""
+
+    today = date(2026, 3, 4)  # a Wednesday
+
+    def test_seasonal_ratio(self):
+        history, base_weeks = 70, 4
+        series = np.zeros((2, history))
+        series[0] = 10
+        series[0, 19] = 40  # one week a year before the first projected one
+        ratio = forecast.seasonal_ratio(series, 2, base_weeks, -history)
+        np.testing.assert_allclose(ratio, [[2, 2], [1, 1]])
+        # Without a full year before the base weeks there is no seasonality
+        np.testing.assert_allclose(forecast.seasonal_ratio(series, 2, base_weeks, -50), np.ones((2, 2)))
+        np.testing.assert_allclose(forecast.seasonal_ratio(series[:, -56:], 2, base_weeks, -56), np.ones((2, 2)))
+
+    def test_return_rates(self):
+        today = self.today.toordinal()
+        window = REQUEST_COOLDOWN_DAYS + 7
+        start = today - window - 1
+        data = {
+            # farmer 1 came back within the window, farmer 2 never did and farmer 3 too late
+            'farmer': np.array([1, 1, 2, 3, 3]),
+            'day': np.array([start, start + REQUEST_COOLDOWN_DAYS, start, start, start + window + 5]),
+            'code': np.array([0, 0, 0, 1, 1]),
+            'active': np.array([True, True, True, True, True]),
+            'groups': [('Layers', 'exotic'), ('Layers', 'local'), ('Broilers', 'local')],
+        }
+        rates = forecast.return_rates(data, today, 7)
+        # Group 2 has no eligible requests and gets the overall rate
+        np.testing.assert_allclose(rates, [0.5, 0, 1 / 3])
+
+    def test_build_forecast_projects_new_demand(self):
+        farmer = create_farmer(1)
+        request = create_request(farmer, quantity=80, status='approved')
+        moment = datetime(2026, 2, 18, 9, tzinfo=timezone.get_current_timezone())  # two weeks before today
+        ChickRequest.objects.filter(pk=request.pk).update(date_time=moment)
+        with override_settings(FORECAST_BASE_WEEKS=8):
+            result = forecast.build_forecast(weeks=4, today=self.today)
+        self.assertEqual(result['week_starts'], ['2026-03-09', '2026-03-16', '2026-03-23', '2026-03-30'])
+        [group] = result['groups']
+        self.assertEqual((group['chicks_type'], group['chicks_breed']), ('Layers', 'exotic'))
+        self.assertEqual(group['history'], [0, 0, 0, 0, 0, 0, 80, 0])
+        # 80 chicks over 8 base weeks; nobody is due back within 4 weeks
+        self.assertEqual(group['projected'], [10, 10, 10, 10])
+        self.assertEqual(group['returning'], [0, 0, 0, 0])
+
+    def test_stock_outlook(self):
+        Stock.objects.create(
+            stock_name='Batch 1', quantity=100, chick_type='Layers', chick_breed='exotic', manager_name='Manager', chicks_period=3,
+        )
+        Stock.objects.create(
+            stock_name='Batch 2', quantity=500, chick_type='Layers', chick_breed='local', manager_name='Manager', chicks_period=3,
+        )
+        farmer = create_farmer(1)
+        create_request(farmer, quantity=50)
+        create_request(farmer, quantity=30, status='approved')
+        create_request(farmer, quantity=99, status='sold')
+        result = {
+            'week_starts': ['2026-03-09', '2026-03-16', '2026-03-23'],
+            'groups': [
+                {'chicks_type': 'Layers', 'chicks_breed': 'exotic', 'projected': [10, 20, 30]},
+                {'chicks_type': 'Broilers', 'chicks_breed': 'local', 'projected': [0, 0, 5]},
+            ],
+        }
+        self.assertEqual(forecast.stock_outlook(result), [
+            {'chicks_type': 'Layers', 'chicks_breed': 'exotic', 'in_stock': 100, 'open_requests': 80, 'projected': 60,
+             'shortfall': 40, 'short_from': date(2026, 3, 16)},
+            {'chicks_type': 'Broilers', 'chicks_breed': 'local', 'in_stock': 0, 'open_requests': 0, 'projected': 5,
+             'shortfall': 5, 'short_from': date(2026, 3, 23)},
+            {'chicks_type': 'Layers', 'chicks_breed': 'local', 'in_stock': 500, 'open_requests': 0, 'projected': 0,
+             'shortfall': 0, 'short_from': None},
+        ])
+
+    def test_pages_do_not_queue_a_forecast(self):
+        self.client.force_login(UserProfile.objects.create_user('manager', password='pw', is_manager=True))
+        response = self.client.get(reverse('manager_dashboard'))
+        self.assertContains(response, 'No forecast yet')
+        self.client.get(reverse('stock_list'))
+        self.assertFalse(Job.objects.filter(kind='demand_forecast').exists())
+
+
+class SlaTests(TestCase):
+    """Status changes are recorded with their durations and summed into percentile histograms"""
+
+    def setUp(self):
+        self.manager = UserProfile.objects.create_superuser('manager', 'manager@example.com', 'pw', is_manager=True)
+        self.agent = UserProfile.objects.create_user('agent', password='pw', is_salesagent=True)
+        self.farmer = create_farmer(1)
+        self.requests = [create_request(self.farmer) for _ in range(2)]
+        # Made two hours ago
+        ChickRequest.objects.update(date_time=timezone.now() - timedelta(hours=2))
+
+    def assertBuckets(self, state, user, transitions):
+        expected = {}
+        for transition in transitions:
+            bucket = StateDurationBucket.bucket_for(transition.seconds_in_state)
+            expected[bucket] = expected.get(bucket, 0) + 1
+        rows = StateDurationBucket.objects.filter(state=state, changed_by=user)
+        self.assertEqual({row.bucket: row.count for row in rows}, expected)
+
+    def test_views_record_transitions(self):
+        request = self.requests[0]
+        self.client.force_login(self.manager)
+        self.client.post(reverse('request_update_status', args=[request.pk]), {'status': 'approved'})
+        self.client.force_login(self.agent)
+        self.assertTrue(self.client.post(reverse('authorize_sale', args=[request.pk])).json()['success'])
+
+        approved, sold = request.transitions.order_by('pk')
+        self.assertEqual((approved.from_status, approved.to_status, approved.changed_by), ('pending', 'approved', self.manager))
+        self.assertAlmostEqual(approved.seconds_in_state, 2 * 3600, delta=60)
+        self.assertEqual((sold.from_status, sold.to_status, sold.changed_by), ('approved', 'sold', self.agent))
+        self.assertEqual(sold.seconds_in_state, (sold.changed_at - approved.changed_at).total_seconds())
+        self.assertBuckets('pending', self.manager, [approved])
+        self.assertBuckets('approved', self.agent, [sold])
+
+    def test_admin_actions_record_transitions(self):
+        self.client.force_login(self.manager)
+        url = reverse('admin:home_chickrequest_changelist')
+        selected = [request.pk for request in self.requests]
+        self.client.post(url, {'action': 'approve_requests', '_selected_action': selected})
+        self.client.post(url, {'action': 'authorize_sales', '_selected_action': selected})
+        # Already sold: no transition
+        self.client.post(url, {'action': 'authorize_sales', '_selected_action': selected})
+
+        transitions = StatusTransition.objects.order_by('pk')
+        self.assertEqual(
+            [(transition.from_status, transition.to_status, transition.changed_by) for transition in transitions],
+            [('pending', 'approved', self.manager)] * 2 + [('approved', 'sold', self.manager)] * 2,
+        )
+        self.assertBuckets('pending', self.manager, transitions[:2])
+        self.assertBuckets('approved', self.manager, transitions[2:])
+
+    def test_percentiles(self):
+        today = date(2026, 3, 4)
+        changed_at = datetime(2026, 3, 2, 12, tzinfo=timezone.get_current_timezone())
+        durations = [60] * 8 + [3600] * 2
+        StateDurationBucket.add([
+            StatusTransition(from_status='pending', to_status='approved', changed_by=self.manager, changed_at=changed_at,
+                             seconds_in_state=seconds)
+            for seconds in durations
+        ] + [
+            # Before the summarised weeks
+            StatusTransition(from_status='pending', to_status='approved', changed_by=self.manager,
+                             changed_at=changed_at - timedelta(weeks=2), seconds_in_state=10 ** 6),
+            # Unknown duration
+            StatusTransition(from_status='approved', to_status='sold', changed_by=self.agent, changed_at=changed_at,
+                             seconds_in_state=None),
+        ])
+        summary = sla.sla_summary(weeks=2, today=today)
+        self.assertEqual(summary['weeks'], ['2026-02-23', '2026-03-02'])
+        [pending] = summary['overall']
+        self.assertEqual((pending['state'], pending['count']), ('pending', 10))
+        # Read off the buckets, so within a bucket's width of the durations
+        self.assertEqual(pending['p50_seconds'], round(sla.bucket_seconds(StateDurationBucket.bucket_for(60))))
+        self.assertEqual(pending['p90_seconds'], round(sla.bucket_seconds(StateDurationBucket.bucket_for(3600))))
+        self.assertAlmostEqual(pending['p50_seconds'], 60, delta=60 * 0.1)
+        self.assertAlmostEqual(pending['p90_seconds'], 3600, delta=3600 * 0.1)
+        self.assertEqual((pending['p50'], pending['p90']), ('59s', '1h 2m'))
+        self.assertEqual(summary['users'], [{'state': 'pending', 'user': 'manager', 'role': 'manager', **sla.stats({
+            StateDurationBucket.bucket_for(60): 8, StateDurationBucket.bucket_for(3600): 2,
+        })}])
+        self.assertIsNone(sla.percentile({}, 0.5))
+
+
+class RequestAnalyticsTests(TestCase):
+    """The incrementally refreshed cube answers exactly like one rebuilt from the database"""
+
+    queries = [
+        (['status'], {}),
+        (['chicks_type', 'farmer_gender'], {}),
+        (['type_of_farmer', 'status'], {'chicks_breed': ['local']}),
+        (['month', 'status'], {}),
+        (['sale_month'], {'status': ['sold']}),
+        ([], {}),
+    ]
+
+    def setUp(self):
+        snapshot_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(snapshot_dir.cleanup)
+        override = override_settings(ANALYTICS_SNAPSHOT_DIR=snapshot_dir.name)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.farmers = [create_farmer(i, farmer_gender='MF'[i % 2]) for i in range(4)]
+        self.requests = [
+            create_request(self.farmers[i % 4], quantity=10 + i, chicks_breed=('local', 'exotic')[i % 2]) for i in range(12)
+        ]
+
+    def rebuilt(self):
+        with mock.patch.object(snapshots, 'current_snapshot', return_value=None):
+            cube = analytics.RequestCube()
+            cube.rebuild()
+        return cube
+
+    def change_everything(self):
+        create_request(self.farmers[0], chicks_type='Broilers', quantity=7)
+        self.requests[0].status = 'approved'
+        self.requests[0].save()
+        ChickRequest.objects.filter(pk__in=[self.requests[1].pk, self.requests[2].pk]).update(
+            status='sold', sales_authorized_date=timezone.now(),
+        )
+        self.requests[3].delete()
+        ChickRequest.objects.filter(pk=self.requests[4].pk).update(farmer_name=self.farmers[1])
+        Farmer.objects.filter(pk=self.farmers[2].pk).update(type_of_farmer='returning', farmer_gender='M')
+
+    def assertMatchesRebuild(self, cube):
+        rebuilt = self.rebuilt()
+        for group_by, filters in self.queries:
+            self.assertEqual(cube.query(group_by, filters), rebuilt.query(group_by, filters), group_by)
+
+    def test_refresh_over_a_snapshot(self):
+        snapshots.build_snapshot()
+        cube = analytics.RequestCube()
+        cube.rebuild()
+        self.assertIsNotNone(cube.snapshot_version)
+        self.assertMatchesRebuild(cube)
+        self.change_everything()
+        cube.refresh()
+        self.assertMatchesRebuild(cube)
+        self.assertEqual(sum(row['requests'] for row in cube.query([], {})), 12)
+
+    def test_refresh_over_a_database_load(self):
+        cube = self.rebuilt()
+        self.change_everything()
+        cube.refresh()
+        self.assertMatchesRebuild(cube)
+
+    def test_first_request_waits_for_a_snapshot_job(self):
+        self.client.force_login(UserProfile.objects.create_user('manager', password='pw', is_manager=True))
+        url = reverse('api_request_analytics')
+        with mock.patch.object(analytics, '_cube', None):
+            response = self.client.get(url, {'group_by': 'status'})
+            self.assertEqual(response.status_code, 503)
+            job = Job.objects.get(kind='analytics_snapshot')
+            self.assertEqual(response.json()['job']['id'], job.pk)
+
+            # No worker claimed it in time, so the next request builds the snapshot itself
+            Job.objects.filter(pk=job.pk).update(created_at=timezone.now() - timedelta(hours=1))
+            response = self.client.get(url, {'group_by': 'status'})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json()['rows'], [{'status': 'pending', 'requests': 12, 'quantity': 186}])
@@ -0,0 +1,163 @@
+import inspect
+import json
+import math
+import threading
+import time
+from functools import wraps
+
+from asgiref.sync import async_to_sync, iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.cache.backends.redis import RedisCache
+from django.http import HttpRequest, JsonResponse
+
+
+def client_ip(request: HttpRequest):
+    """The client address: REMOTE_ADDR, or the address the reverse proxy put in THROTTLE_CLIENT_IP_HEADER
+
+    Of a comma-separated list (X-Forwarded-For) the last address is used, the
+    one appended by the proxy itself; earlier ones are sent by the client.
+    """
+    header = getattr(settings, 'THROTTLE_CLIENT_IP_HEADER', None)
+    if header:
+        forwarded = request.META.get(header, '').split(',')[-1].strip()
+        if forwarded:
+            return forwarded
+    return request.META.get('REMOTE_ADDR') or None
+
+
+def client_nin(request: HttpRequest):
+    """NIN from the JSON body of a farmer lookup, normalised so case/spacing can't dodge the bucket"""
+    try:
+        nin = json.loads(request.body).get('nin', '')
+    except (ValueError, AttributeError):
+        return None
+    if not isinstance(nin, str):
+        return None
+    return nin.strip().upper() or None
+
+
+async def client_user(request: HttpRequest):
+    # auser() avoids a synchronous lazy user lookup inside async views
+    user = await request.auser()
+    return user.pk if user.is_authenticated else None
+
+
+# Bucket key name -> function returning the client identity for that bucket (None skips it)
+KEY_FUNCTIONS = {
+    'ip': client_ip,
+    'nin': client_nin,
+    'user': client_user,
+    'global': lambda request: 'all',
+}
+
+
+def throttle_cache():
+    return caches[getattr(settings, 'THROTTLE_CACHE_ALIAS', 'default')]
+
+
+# Refills and takes a token in one step on the Redis server, so concurrent
+# requests from any worker cannot both take the last token
+REDIS_TAKE_TOKEN = """
+local capacity, refill_rate, now, timeout = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3]), tonumber(ARGV[4])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = capacity
+if state[1] then
+    tokens = math.min(capacity, tonumber(state[1]) + (now - tonumber(state[2])) * refill_rate)
+end
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    wait = (1 - tokens) / refill_rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated', tostring(now))
+redis.call('EXPIRE', KEYS[1], timeout)
+return tostring(wait)
+"""
+
+_bucket_lock = threading.Lock()
+
+
+def take_token(key: str, capacity: int, refill_rate: float) -> float:
+    """Take one token from a bucket, returning 0 when allowed or the seconds until a token is free
+
+    The bucket is stored as (tokens, timestamp) and refilled lazily on each
+    call, so idle buckets cost nothing and simply expire from the cache. On
+    RedisCache the update is a single atomic script shared by all workers. On
+    LocMemCache (the default) each worker has its own buckets, updated under a
+    lock that only guards memory. Other backends are read and written without
+    a lock, so concurrent requests may both take the last token.
+    """
+    cache = throttle_cache()
+    now = time.time()
+    timeout = math.ceil(capacity / refill_rate) + 1
+    if isinstance(cache, RedisCache):
+        key = cache.make_and_validate_key(key)
+        client = cache._cache.get_client(key, write=True)
+        return float(client.eval(REDIS_TAKE_TOKEN, 1, key, capacity, refill_rate, now, timeout))
+
+    if isinstance(cache, LocMemCache):
+        with _bucket_lock:
+            return refill_and_take(cache, key, capacity, refill_rate, now, timeout)
+    return refill_and_take(cache, key, capacity, refill_rate, now, timeout)
+
+
+def refill_and_take(cache, key, capacity, refill_rate, now, timeout) -> float:
+    state = cache.get(key)
+    if state is None:
+        tokens = capacity
+    else:
+        tokens, updated = state
+        tokens = min(capacity, tokens + (now - updated) * refill_rate)
+
+    if tokens >= 1:
+        tokens -= 1
+        wait = 0.0
+    else:
+        wait = (1 - tokens) / refill_rate
+    cache.set(key, (tokens, now), timeout=timeout)
+    return wait
+
+
+def throttled_response(bucket: str, wait: float) -> JsonResponse:
+    """429 for a single noisy client, 503 when the endpoint as a whole is shedding load"""
+    if bucket == 'global':
+        response = JsonResponse({'success': False, 'error': 'Service is busy, please try again shortly'}, status=503)
+    else:
+        response = JsonResponse({'success': False, 'error': 'Too many requests, please slow down'}, status=429)
+    response.headers['Retry-After'] = str(max(1, math.ceil(wait)))
+    return response
+
+
+def throttle(scope: str):
+    """Rate limit a view with the token buckets configured in settings.API_THROTTLES[scope]
+
+    Each configured bucket (``ip``, ``nin``, ``user`` or ``global``) is checked
+    in order and the first empty one rejects the request with Retry-After.
+    """
+    def decorator(view):
+        async def check(request):
+            buckets = getattr(settings, 'API_THROTTLES', {}).get(scope, {})
+            for bucket, (capacity, refill_rate) in buckets.items():
+                identity = KEY_FUNCTIONS[bucket](request)
+                if inspect.isawaitable(identity):
+                    identity = await identity
+                if identity is None:
+                    continue
+                wait = await sync_to_async(take_token)(f'throttle:{scope}:{bucket}:{identity}', capacity, refill_rate)
+                if wait:
+                    return throttled_response(bucket, wait)
+            return None
+
+        if iscoroutinefunction(view):
+            @wraps(view)
+            async def throttled_view(request, *args, **kwargs):
+                return await check(request) or await view(request, *args, **kwargs)
+        else:
+            @wraps(view)
+            def throttled_view(request, *args, **kwargs):
+                return async_to_sync(check)(request) or view(request, *args, **kwargs)
+        return throttled_view
+    return decorator
@@ -0,0 +1,70 @@
+from typing import Optional
+
+from django.conf import settings
+from django.contrib.sessions.backends.base import SessionBase
+from django.core import signing
+from django.utils.crypto import constant_time_compare
+
+from . import usercache
+from .models import UserProfile
+
+TOKEN_SALT = 'home.api-token'
+
+
+def password_fingerprint(auth_hash: str) -> str:
+    return auth_hash[:16]
+
+
+def issue_token(user: UserProfile) -> str:
+    """Signed, timestamped bearer token carrying the user's id and a fingerprint of their password"""
+    payload = {
+        'id': user.pk,
+        'h': password_fingerprint(user.get_session_auth_hash()),
+    }
+    return signing.dumps(payload, salt=TOKEN_SALT, compress=True)
+
+
+def user_from_token(token: str) -> Optional[UserProfile]:
+    """The token's user, or None if the token is invalid or expired or the user can no longer use it
+
+    The user comes from the per-user snapshot in home.usercache, so role
+    flags are current and deactivating the user or changing their password
+    revokes their tokens: at once in the worker that saved the user, within
+    USER_SNAPSHOT_TTL seconds in the others.
+    """
+    try:
+        payload = signing.loads(token, salt=TOKEN_SALT, max_age=settings.API_TOKEN_MAX_AGE)
+    except signing.BadSignature:  # includes SignatureExpired
+        return None
+    user, auth_hash = usercache.user_by_id(payload.get('id'))
+    if user is None or not user.is_active:
+        return None
+    if not constant_time_compare(payload.get('h', ''), password_fingerprint(auth_hash)):
+        return None
+    return user
+
+
+def bearer_token(request) -> Optional[str]:
+    scheme, _, token = request.headers.get('Authorization', '').partition(' ')
+    if scheme.lower() == 'bearer' and token:
+        return token.strip()
+    return None
+
+
+class NullSession(SessionBase):
+    """Session for token-authenticated API requests: starts empty and is never loaded or stored"""
+
+    def load(self):
+        return {}
+
+    def exists(self, session_key):
+        return False
+
+    def create(self):
+        pass
+
+    def save(self, must_create=False):
+        pass
+
+    def delete(self, session_key=None):
+        pass
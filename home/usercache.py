@@ -0,0 +1,133 @@
+"""
+Per-session user snapshots for AuthenticationMiddleware.
+
+Loading request.user normally costs one query on home_users per request.
+Instead, each session's user is kept in a bounded in-process LRU as a
+compact snapshot (pk, username, names, role and active flags, and the
+session auth hash as a password fingerprint). A request is served from the
+snapshot only when its session still names the same user, backend and
+password fingerprint; anything else goes through django.contrib.auth's
+get_user and refreshes the snapshot.
+
+The snapshot is a UserProfile built with every other field deferred, so
+reading e.g. user.email or user.password loads it on demand, and save()
+only writes the loaded fields. Bearer tokens (home/tokens.py) use the same
+kind of snapshot, kept per user id. Saving or deleting a user evicts their
+snapshots in this process; other processes see the change after at most
+USER_SNAPSHOT_TTL seconds.
+"""
+import threading
+import time
+from collections import OrderedDict
+from functools import cache
+
+from django.conf import settings
+from django.contrib import auth
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+from django.db import DEFAULT_DB_ALIAS
+
+SNAPSHOT_FIELDS = (
+    'id', 'username', 'first_name', 'last_name',
+    'is_manager', 'is_salesagent', 'is_staff', 'is_superuser', 'is_active',
+)
+
+
+@cache
+def snapshot_fields():
+    # Model.from_db expects the values of a partial load in model field order
+    return [f.attname for f in auth.get_user_model()._meta.concrete_fields if f.attname in SNAPSHOT_FIELDS]
+
+
+_snapshots = OrderedDict()  # session_key -> (user_id, backend, auth hash, field values, expires at)
+_users = OrderedDict()  # user_id -> (field values, auth hash, expires at), for bearer tokens
+_snapshots_lock = threading.Lock()
+
+
+def remember(session_key, backend, user):
+    max_size = getattr(settings, 'USER_SNAPSHOT_CACHE_SIZE', 1024)
+    expires = time.monotonic() + getattr(settings, 'USER_SNAPSHOT_TTL', 60)
+    values = tuple(getattr(user, field) for field in snapshot_fields())
+    with _snapshots_lock:
+        _snapshots[session_key] = (str(user.pk), backend, user.get_session_auth_hash(), values, expires)
+        _snapshots.move_to_end(session_key)
+        while len(_snapshots) > max_size:
+            _snapshots.popitem(last=False)
+
+
+def forget_session(session_key):
+    with _snapshots_lock:
+        _snapshots.pop(session_key, None)
+
+
+def forget_user(user_id):
+    """Drop every session's snapshot of the user, e.g. after it was saved"""
+    user_id = str(user_id)
+    with _snapshots_lock:
+        for session_key in [key for key, entry in _snapshots.items() if entry[0] == user_id]:
+            del _snapshots[session_key]
+        _users.pop(user_id, None)
+
+
+def user_by_id(user_id):
+    """(snapshot, session auth hash) of the user with this pk, reloaded at most every USER_SNAPSHOT_TTL seconds
+
+    Returns (None, None) when there is no such user.
+    """
+    key = str(user_id)
+    with _snapshots_lock:
+        entry = _users.get(key)
+        if entry is not None and entry[2] > time.monotonic():
+            _users.move_to_end(key)
+            values, auth_hash = entry[0], entry[1]
+        else:
+            entry = None
+    if entry is None:
+        user = auth.get_user_model()._default_manager.filter(pk=user_id).first()
+        if user is None:
+            return None, None
+        values = tuple(getattr(user, field) for field in snapshot_fields())
+        auth_hash = user.get_session_auth_hash()
+        expires = time.monotonic() + getattr(settings, 'USER_SNAPSHOT_TTL', 60)
+        with _snapshots_lock:
+            _users[key] = (values, auth_hash, expires)
+            _users.move_to_end(key)
+            while len(_users) > getattr(settings, 'USER_SNAPSHOT_CACHE_SIZE', 1024):
+                _users.popitem(last=False)
+    return auth.get_user_model().from_db(DEFAULT_DB_ALIAS, snapshot_fields(), values), auth_hash
+
+
+def cached_snapshot(session_key, session):
+    with _snapshots_lock:
+        entry = _snapshots.get(session_key)
+        if entry is None:
+            return None
+        user_id, backend, auth_hash, values, expires = entry
+        current = (
+            user_id == str(session.get(SESSION_KEY))
+            and backend == session.get(BACKEND_SESSION_KEY)
+            and auth_hash == session.get(HASH_SESSION_KEY)
+            and expires > time.monotonic()
+        )
+        if not current:
+            del _snapshots[session_key]
+            return None
+        _snapshots.move_to_end(session_key)
+    return auth.get_user_model().from_db(DEFAULT_DB_ALIAS, snapshot_fields(), values)
+
+
+def get_user(request):
+    """request.user from the session's snapshot, or loaded by django.contrib.auth and remembered"""
+    session_key = request.session.session_key
+    if session_key is None:
+        return auth.get_user(request)
+
+    user = cached_snapshot(session_key, request.session)
+    if user is not None:
+        return user
+
+    user = auth.get_user(request)
+    # get_user may have rotated the session key (flush on a failed hash check)
+    backend = request.session.get(BACKEND_SESSION_KEY)
+    if user.is_authenticated and user.is_active and request.session.session_key == session_key and backend:
+        remember(session_key, backend, user)
+    return user
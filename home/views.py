@@ -2,19 +2,245 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
+from django.conf import settings
 from django.http import JsonResponse, HttpRequest, HttpResponse
 from django.core.paginator import Paginator
-from django.db.models import Q, Count, Sum
+from django.db import IntegrityError, transaction
+from django.db.models import Q, Count, Sum, Max, Min
 from django.views.generic import ListView, CreateView, UpdateView, DeleteView
-from django.urls import reverse_lazy
+from django.urls import reverse, reverse_lazy
 from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.dateparse import parse_datetime
+from django.utils.http import quote_etag
+from django.views.decorators.cache import cache_control
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import condition
 from datetime import timedelta
 from decimal import Decimal
-from .models import UserProfile, Stock, Feedstock, Farmer, ChickRequest
+from .models import UserProfile, Stock, Feedstock, Farmer, ChickRequest, ChangeLog, IngestionRecord, Job, REQUEST_COOLDOWN_DAYS
 from .forms import UserCreation, StockForm, FeedstockForm, FarmerForm, ChickRequestForm
+from . import analytics, cohorts, forecast, jobs, sla
+from .reports import sales_report_context, sales_report_range
+from .throttling import throttle, throttle_cache
+from .tokens import issue_token
+from .usercache import forget_session
 from django.contrib.auth.forms import AuthenticationForm
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from collections import Counter, defaultdict
+from functools import wraps
 from typing import Optional
+import base64
+import hashlib
 import json
+import time
+
+# List fragment helpers
+def is_fragment_request(request: HttpRequest) -> bool:
+    """Check whether the client asked for only the list table (header or ?fragment=table)"""
+    return request.headers.get('X-Fragment') == 'table' or request.GET.get('fragment') == 'table'
+
+def render_list(request: HttpRequest, template_name: str, fragment_name: str, context: dict, using: Optional[str] = None) -> HttpResponse:
+    """Render a list page, or just its table fragment for search, filter and page changes"""
+    if is_fragment_request(request):
+        response = render(request, fragment_name, context, using=using)
+    else:
+        response = render(request, template_name, context, using=using)
+    patch_vary_headers(response, ('X-Fragment',))
+    return response
+
+def hot_page_engine() -> str:
+    """Template engine for the high-traffic pages (Jinja2 ports when JINJA2_HOT_PAGES is on)"""
+    return 'jinja2' if getattr(settings, 'JINJA2_HOT_PAGES', False) else 'django'
+
+# List filters, shared by the list pages and the JSON read API
+def filter_stocks(params):
+    stocks = Stock.objects.all()
+    search_query = params.get('search')
+    if search_query:
+        stocks = stocks.filter(
+            Q(stock_name__icontains=search_query) |
+            Q(chick_type__icontains=search_query) |
+            Q(chick_breed__icontains=search_query) |
+            Q(manager_name__icontains=search_query)
+        )
+    return stocks
+
+def filter_feedstocks(params):
+    feedstocks = Feedstock.objects.all()
+    search_query = params.get('search')
+    if search_query:
+        feedstocks = feedstocks.filter(
+            Q(name_of_feeds__icontains=search_query) |
+            Q(brand_of_feeds__icontains=search_query) |
+            Q(type_of_feeds__icontains=search_query) |
+            Q(supplier_name__icontains=search_query)
+        )
+    return feedstocks
+
+def filter_farmers(params):
+    farmers = Farmer.objects.all()
+    search_query = params.get('search')
+    if search_query:
+        farmers = farmers.filter(
+            Q(farmer_name__icontains=search_query) |
+            Q(nin__icontains=search_query) |
+            Q(phone_number__icontains=search_query) |
+            Q(recommender_name__icontains=search_query)
+        )
+    
+    # Filter by type
+    farmer_type = params.get('type')
+    if farmer_type:
+        farmers = farmers.filter(type_of_farmer=farmer_type)
+    return farmers
+
+def filter_requests(params):
+    requests = ChickRequest.objects.all()
+    
+    # Filter by status
+    status = params.get('status')
+    if status:
+        requests = requests.filter(status=status)
+    
+    search_query = params.get('search')
+    if search_query:
+        requests = requests.filter(
+            Q(farmer_name__farmer_name__icontains=search_query) |
+            Q(chicks_type__icontains=search_query) |
+            Q(chicks_breed__icontains=search_query)
+        )
+    return requests
+
+# Conditional GET helpers
+def conditional_detail(queryset, *fields, per_user=True):
+    """Return 304 for unchanged detail pages/APIs using ETag and Last-Modified validators
+
+    The validators come from one primary-key lookup of ``fields`` on ``queryset``
+    (the row's updated_at plus any related timestamps or counts the page shows).
+    Pages rendered with the user's name and role also key the ETag on the user.
+    """
+    def validators(request, **kwargs):
+        if not hasattr(request, '_conditional_validators'):
+            pk = next(iter(kwargs.values()))
+            row = queryset.filter(pk=pk).values_list(*fields).first()
+            # Pending flash messages have to be rendered, so skip validation
+            if row is None or (per_user and len(messages.get_messages(request))):
+                request._conditional_validators = None
+            else:
+                key = [queryset.model._meta.label, str(pk)] + [str(value) for value in row]
+                if per_user:
+                    key.append(f'user-{request.user.pk}')
+                last_modified = max(value for value in row if hasattr(value, 'tzinfo'))
+                etag = hashlib.md5('|'.join(key).encode(), usedforsecurity=False).hexdigest()
+                request._conditional_validators = (etag, last_modified)
+        return request._conditional_validators
+
+    def etag(request, *args, **kwargs):
+        result = validators(request, **kwargs)
+        return result[0] if result else None
+
+    def last_modified(request, *args, **kwargs):
+        result = validators(request, **kwargs)
+        return result[1] if result else None
+
+    def decorator(view):
+        conditional_view = condition(etag_func=etag, last_modified_func=last_modified)(view)
+        if iscoroutinefunction(view):
+            # Look the validators up off the event loop; condition() then reads the cached result
+            @wraps(view)
+            async def async_conditional_view(request, *args, **kwargs):
+                await sync_to_async(validators)(request, **kwargs)
+                return await conditional_view(request, *args, **kwargs)
+            # no-cache makes browsers revalidate every time instead of guessing freshness
+            return cache_control(private=True, no_cache=True)(async_conditional_view)
+        return cache_control(private=True, no_cache=True)(conditional_view)
+    return decorator
+
+# Farmer detail helpers
+FARMER_HISTORY_PAGE_SIZE = 10
+
+def request_summary(farmer: Farmer) -> Optional[dict]:
+    """Counts and quantities per status and per type/breed plus first/last dates, from one grouped query"""
+    # Not skipped on a zero total_requests: the query is the source of truth should the counters lag
+    groups = list(
+        ChickRequest.objects.filter(farmer_name=farmer)
+        .values('status', 'chicks_type', 'chicks_breed')
+        .annotate(count=Count('pk'), quantity=Sum('quantity'), first=Min('date_time'), last=Max('date_time'))
+        .order_by()
+    )
+    if not groups:
+        return None
+    by_status, by_type = {}, {}
+    first_request = last_request = None
+    for group in groups:
+        for totals, key in ((by_status, group['status']), (by_type, (group['chicks_type'], group['chicks_breed']))):
+            entry = totals.setdefault(key, {'count': 0, 'quantity': 0})
+            entry['count'] += group['count']
+            entry['quantity'] += group['quantity']
+        first_request = min(filter(None, (first_request, group['first'])))
+        last_request = max(filter(None, (last_request, group['last'])))
+    
+    return {
+        'by_status': [
+            {'status': status, 'label': label, **by_status[status]}
+            for status, label in ChickRequest.STATUS_CHOICES if status in by_status
+        ],
+        'by_type': [
+            {'chicks_type': chicks_type, 'chicks_breed': chicks_breed, **totals}
+            for (chicks_type, chicks_breed), totals in sorted(by_type.items())
+        ],
+        'total_count': sum(entry['count'] for entry in by_status.values()),
+        'total_quantity': sum(entry['quantity'] for entry in by_status.values()),
+        'first_request': first_request,
+        'last_request': last_request,
+    }
+
+def request_history_page(farmer: Farmer, before: Optional[str]) -> dict:
+    """One keyset page of a farmer's requests, newest first
+
+    Paging on the primary key (which follows date_time, set on creation) keeps
+    every page a bounded index range scan however long the history gets.
+    """
+    requests = ChickRequest.objects.filter(farmer_name=farmer).order_by('-pk')
+    if before and before.isdigit():
+        requests = requests.filter(pk__lt=int(before))
+    page = list(requests[:FARMER_HISTORY_PAGE_SIZE + 1])
+    has_more = len(page) > FARMER_HISTORY_PAGE_SIZE
+    page = page[:FARMER_HISTORY_PAGE_SIZE]
+    return {
+        'farmer': farmer,
+        'requests': page,
+        'next_cursor': page[-1].pk if has_more else None,
+    }
+
+# Request rules
+def request_cooldown_error(farmer: Farmer) -> Optional[str]:
+    """Explain why the farmer must still wait before a new request, or None if they may request"""
+    recent_request = ChickRequest.objects.filter(
+        farmer_name=farmer,
+        date_time__gt=timezone.now() - timedelta(days=REQUEST_COOLDOWN_DAYS)
+    ).order_by('-date_time').first()
+    
+    if recent_request:
+        time_since_last_request = timezone.now() - recent_request.date_time
+        days_to_wait = REQUEST_COOLDOWN_DAYS - time_since_last_request.days
+        
+        if days_to_wait > 0:
+            return (
+                f'Farmer "{farmer.farmer_name}" must wait {days_to_wait} more days. '
+                f'Last request was made on {recent_request.date_time.strftime("%B %d, %Y")}. '
+                f'Next request allowed after {(recent_request.date_time + timedelta(days=REQUEST_COOLDOWN_DAYS)).strftime("%B %d, %Y")}.'
+            )
+    return None
+
+# Forecast helpers
+def demand_outlook() -> tuple:
+    """The latest demand forecast and its stock outlook, or (None, []) before the nightly forecast_demand first ran"""
+    latest = forecast.latest_forecast()
+    if latest is None:
+        return None, []
+    return latest, forecast.stock_outlook(latest)
 
 # Authentication Views
 def index(request: HttpRequest) -> HttpResponse:
@@ -86,6 +312,7 @@ def loginpage(request: HttpRequest) -> HttpResponse:
 
 def logout_view(request: HttpRequest) -> HttpResponse:
     """User logout view"""
+    forget_session(request.session.session_key)
     logout(request)
     messages.success(request, 'You have been successfully logged out.')
     return redirect('/login')
@@ -112,6 +339,12 @@ def manager_dashboard(request: HttpRequest) -> HttpResponse:
         total_quantity=Sum('quantity')
     ).order_by('chick_type')
     
+    # Projected demand against current stock
+    demand_forecast, stock_outlook = demand_outlook()
+    
+    # Time requests spend in each status
+    request_sla = sla.sla_summary()
+    
     context = {
         'total_stock': total_stock,
         'total_feedstock': total_feedstock,
@@ -124,8 +357,12 @@ def manager_dashboard(request: HttpRequest) -> HttpResponse:
         'stock_count': total_stock,
         'feedstock_count': total_feedstock,
         'farmer_count': total_farmers,
+        'demand_forecast': demand_forecast,
+        'forecast_generated_at': parse_datetime(demand_forecast['generated_at']) if demand_forecast else None,
+        'stock_outlook': stock_outlook,
+        'request_sla': request_sla,
     }
-    return render(request, 'managerdashbord.html', context)
+    return render(request, 'managerdashbord.html', context, using=hot_page_engine())
 
 @login_required
 def sales_dashboard(request: HttpRequest) -> HttpResponse:
@@ -162,33 +399,29 @@ def sales_dashboard(request: HttpRequest) -> HttpResponse:
         'recent_farmers': recent_farmers,
         'recent_requests': recent_requests,
     }
-    return render(request, 'salesdashbord.html', context)
+    return render(request, 'salesdashbord.html', context, using=hot_page_engine())
 
 # Stock Management Views
 @login_required
 def stock_list(request):
     """List all stocks with search and pagination"""
-    stocks = Stock.objects.all().order_by('-date_added')
-    
-    # Search functionality
+    stocks = filter_stocks(request.GET).order_by('-date_added')
     search_query = request.GET.get('search')
-    if search_query:
-        stocks = stocks.filter(
-            Q(stock_name__icontains=search_query) |
-            Q(chick_type__icontains=search_query) |
-            Q(chick_breed__icontains=search_query) |
-            Q(manager_name__icontains=search_query)
-        )
     
     # Pagination
     paginator = Paginator(stocks, 10)
     page_number = request.GET.get('page')
     page_obj = paginator.get_page(page_number)
     
-    return render(request, 'stock/stock_list.html', {
+    context = {
         'page_obj': page_obj,
         'search_query': search_query
-    })
+    }
+    if not is_fragment_request(request):
+        # Types and breeds projected to run short, for the full page only
+        _, stock_outlook = demand_outlook()
+        context['shortfalls'] = [row for row in stock_outlook if row['shortfall'] > 0]
+    return render_list(request, 'stock/stock_list.html', 'stock/_stock_table.html', context)
 
 @login_required
 def stock_create(request):
@@ -224,6 +457,7 @@ def stock_create(request):
     })
 
 @login_required
+@conditional_detail(Stock.objects.all(), 'updated_at')
 def stock_detail(request, pk):
     """Stock detail view"""
     stock = get_object_or_404(Stock, pk=pk)
@@ -280,24 +514,15 @@ def stock_delete(request, pk):
 @login_required
 def feedstock_list(request):
     """List all feedstocks"""
-    feedstocks = Feedstock.objects.all().order_by('-date')
-    
-    # Search functionality
+    feedstocks = filter_feedstocks(request.GET).order_by('-date')
     search_query = request.GET.get('search')
-    if search_query:
-        feedstocks = feedstocks.filter(
-            Q(name_of_feeds__icontains=search_query) |
-            Q(brand_of_feeds__icontains=search_query) |
-            Q(type_of_feeds__icontains=search_query) |
-            Q(supplier_name__icontains=search_query)
-        )
     
     # Pagination
     paginator = Paginator(feedstocks, 10)
     page_number = request.GET.get('page')
     page_obj = paginator.get_page(page_number)
     
-    return render(request, 'feedstock/feedstock_list.html', {
+    return render_list(request, 'feedstock/feedstock_list.html', 'feedstock/_feedstock_table.html', {
         'page_obj': page_obj,
         'search_query': search_query
     })
@@ -327,6 +552,7 @@ def feedstock_create(request):
     return render(request, 'feedstock/feedstock_form.html', {'title': 'Add New Feedstock'})
 
 @login_required
+@conditional_detail(Feedstock.objects.all(), 'updated_at')
 def feedstock_detail(request, pk):
     """Feedstock detail view"""
     feedstock = get_object_or_404(Feedstock, pk=pk)
@@ -389,34 +615,21 @@ def feedstock_delete(request, pk):
 @login_required
 def farmer_list(request):
     """List all farmers"""
-    farmers = Farmer.objects.all().order_by('farmer_name')
-    
-    # Search functionality
+    farmers = filter_farmers(request.GET).order_by('farmer_name')
     search_query = request.GET.get('search')
-    if search_query:
-        farmers = farmers.filter(
-            Q(farmer_name__icontains=search_query) |
-            Q(nin__icontains=search_query) |
-            Q(phone_number__icontains=search_query) |
-            Q(recommender_name__icontains=search_query)
-        )
-    
-    # Filter by type
     farmer_type = request.GET.get('type')
-    if farmer_type:
-        farmers = farmers.filter(type_of_farmer=farmer_type)
     
     # Pagination
     paginator = Paginator(farmers, 10)
     page_number = request.GET.get('page')
     page_obj = paginator.get_page(page_number)
     
-    return render(request, 'farmer/farmer_list.html', {
+    return render_list(request, 'farmer/farmer_list.html', 'farmer/_farmer_table.html', {
         'page_obj': page_obj,
         'search_query': search_query,
         'farmer_type': farmer_type,
         'farmer_types': Farmer.FARMER_TYPE_CHOICES
-    })
+    }, using=hot_page_engine())
 
 @login_required
 def farmer_create(request):
@@ -451,14 +664,18 @@ def farmer_create(request):
     })
 
 @login_required
+# Request writes that change the page bump the farmer's updated_at and counters (see ChickRequest.save)
+@conditional_detail(Farmer.objects.all(), 'updated_at', *Farmer.REQUEST_COUNTER_FIELDS)
 def farmer_detail(request, pk):
-    """Farmer detail view with their requests"""
+    """Farmer detail view with a request summary; the history is fetched page by page"""
     farmer = get_object_or_404(Farmer, pk=pk)
-    requests = ChickRequest.objects.filter(farmer_name=farmer).order_by('-date_time')
+    
+    if request.GET.get('fragment') == 'history':
+        return render(request, 'farmer/_request_history_rows.html', request_history_page(farmer, request.GET.get('before')))
     
     return render(request, 'farmer/farmer_detail.html', {
         'farmer': farmer,
-        'requests': requests
+        'summary': request_summary(farmer),
     })
 
 @login_required
@@ -516,7 +733,7 @@ def authorize_sale(request, pk):
             chick_request.sales_authorized = True
             chick_request.sales_authorized_by = request.user
             chick_request.sales_authorized_date = timezone.now()
-            chick_request.save()
+            chick_request.save(changed_by=request.user)
             
             messages.success(request, f'Sale authorized for request #{chick_request.pk} - {chick_request.farmer_name.farmer_name}')
             return JsonResponse({'success': True})
@@ -529,33 +746,21 @@ def authorize_sale(request, pk):
 @login_required
 def request_list(request):
     """List all chick requests"""
-    requests = ChickRequest.objects.all().order_by('-date_time')
-    
-    # Filter by status
+    requests = filter_requests(request.GET).order_by('-date_time')
     status = request.GET.get('status')
-    if status:
-        requests = requests.filter(status=status)
-    
-    # Search functionality
     search_query = request.GET.get('search')
-    if search_query:
-        requests = requests.filter(
-            Q(farmer_name__farmer_name__icontains=search_query) |
-            Q(chicks_type__icontains=search_query) |
-            Q(chicks_breed__icontains=search_query)
-        )
     
     # Pagination
     paginator = Paginator(requests, 10)
     page_number = request.GET.get('page')
     page_obj = paginator.get_page(page_number)
     
-    return render(request, 'request/request_list.html', {
+    return render_list(request, 'request/request_list.html', 'request/_request_table.html', {
         'page_obj': page_obj,
         'search_query': search_query,
         'status': status,
         'status_choices': ChickRequest.STATUS_CHOICES
-    })
+    }, using=hot_page_engine())
 
 @login_required
 def request_create(request):
@@ -570,24 +775,10 @@ def request_create(request):
                 return redirect('request_create')
             
             # Check for 4-month waiting period between requests
-            four_months_ago = timezone.now() - timedelta(days=120)  # Approximately 4 months
-            recent_request = ChickRequest.objects.filter(
-                farmer_name=farmer,
-                date_time__gt=four_months_ago
-            ).order_by('-date_time').first()
-            
-            if recent_request:
-                time_since_last_request = timezone.now() - recent_request.date_time
-                days_to_wait = 120 - time_since_last_request.days
-                
-                if days_to_wait > 0:
-                    messages.error(
-                        request, 
-                        f'Cannot create request: Farmer "{farmer.farmer_name}" must wait {days_to_wait} more days. '
-                        f'Last request was made on {recent_request.date_time.strftime("%B %d, %Y")}. '
-                        f'Next request allowed after {(recent_request.date_time + timedelta(days=120)).strftime("%B %d, %Y")}.'
-                    )
-                    return redirect('request_create')
+            cooldown_error = request_cooldown_error(farmer)
+            if cooldown_error:
+                messages.error(request, f'Cannot create request: {cooldown_error}')
+                return redirect('request_create')
             
             chick_request = ChickRequest.objects.create(
                 farmer_name=farmer,
@@ -602,17 +793,21 @@ def request_create(request):
         except Exception as e:
             messages.error(request, f'Error creating request: {str(e)}')
     
-    # Only show approved farmers
-    farmers = Farmer.objects.filter(status='approved').order_by('farmer_name')
+    # Only approved farmers can be picked; they are looked up through the typeahead
+    farmers = Farmer.objects.filter(status='approved')
     
     # Check if there are any approved farmers
     if not farmers.exists():
         messages.warning(request, 'No approved farmers available. Please wait for farmers to be approved by a manager.')
         return redirect('farmer_list')
     
+    # Preselect the farmer when coming from a farmer's page
+    farmer_id = request.GET.get('farmer_id', '')
+    selected_farmer = farmers.filter(pk=farmer_id).first() if farmer_id.isdigit() else None
+    
     return render(request, 'request/request_form.html', {
         'title': 'Create New Request',
-        'farmers': farmers,
+        'selected_farmer': selected_farmer,
         'chick_types': ChickRequest.CHICK_TYPE_CHOICES,
         'chick_breeds': ChickRequest.CHICK_BREED_CHOICES,
         'yes_no_choices': ChickRequest.YES_NO_CHOICES
@@ -628,7 +823,7 @@ def request_update_status(request, pk):
         if new_status in ['approved', 'rejected']:
             old_status = chick_request.status
             chick_request.status = new_status
-            chick_request.save()
+            chick_request.save(changed_by=request.user)
             
             # Update farmer status to "returning" if this is their first approved request
             if new_status == 'approved' and chick_request.farmer_name.type_of_farmer == 'starter':
@@ -656,6 +851,7 @@ def request_update_status(request, pk):
     return redirect('request_list')
 
 @login_required
+@conditional_detail(ChickRequest.objects.all(), 'updated_at', 'farmer_name__updated_at')
 def request_detail(request, pk):
     """Request detail view"""
     chick_request = get_object_or_404(ChickRequest, pk=pk)
@@ -671,11 +867,36 @@ def request_detail(request, pk):
     })
 
 # API Views for AJAX requests
+@csrf_exempt
+@throttle('api_token')
+def api_token(request: HttpRequest) -> JsonResponse:
+    """Exchange a username and password for a signed bearer token for the JSON endpoints"""
+    if request.method != 'POST':
+        return JsonResponse({'success': False, 'error': 'Invalid request method'}, status=405)
+    try:
+        data = json.loads(request.body)
+    except ValueError:
+        return JsonResponse({'success': False, 'error': 'Invalid request format'}, status=400)
+    if not isinstance(data, dict) or not all(isinstance(data.get(field), str) for field in ('username', 'password')):
+        return JsonResponse({'success': False, 'error': 'Expected a JSON object with "username" and "password"'}, status=400)
+    
+    user = authenticate(request, username=data['username'], password=data['password'])
+    if user is None:
+        return JsonResponse({'success': False, 'error': 'Invalid username or password'}, status=401)
+    return JsonResponse({
+        'success': True,
+        'token': issue_token(user),
+        'token_type': 'Bearer',
+        'expires_in': settings.API_TOKEN_MAX_AGE,
+    })
+
 @login_required
-def get_farmer_data(request: HttpRequest, farmer_id: int) -> JsonResponse:
+@throttle('get_farmer_data')
+@conditional_detail(Farmer.objects.all(), 'updated_at', per_user=False)
+async def get_farmer_data(request: HttpRequest, farmer_id: int) -> JsonResponse:
     """Get farmer data for AJAX requests"""
     try:
-        farmer = get_object_or_404(Farmer, pk=farmer_id)
+        farmer = await Farmer.objects.aget(pk=farmer_id)
         data = {
             'farmer_name': farmer.farmer_name,
             'phone_number': farmer.phone_number,
@@ -686,13 +907,68 @@ def get_farmer_data(request: HttpRequest, farmer_id: int) -> JsonResponse:
     except Exception:
         return JsonResponse({'error': 'Farmer not found'}, status=404)
 
-def check_farmer_status(request: HttpRequest) -> JsonResponse:
+FARMER_SEARCH_LIMIT = 10
+
+def prefix_range(prefix: str) -> tuple:
+    """Bounds [prefix, next) such that a range scan matches exactly the strings starting with prefix"""
+    return prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+@login_required
+@throttle('farmer_search')
+async def farmer_search(request: HttpRequest) -> JsonResponse:
+    """Typeahead search over approved farmers by name, NIN or phone prefix"""
+    query = request.GET.get('q', '').strip()
+    try:
+        limit = min(max(int(request.GET.get('limit', FARMER_SEARCH_LIMIT)), 1), 25)
+    except ValueError:
+        limit = FARMER_SEARCH_LIMIT
+    if not query:
+        return JsonResponse({'results': []})
+    
+    # One bounded range scan per index; LIKE prefix matches cannot use these indexes on SQLite
+    approved = Farmer.objects.filter(status='approved').only(
+        'farmer_name', 'nin', 'phone_number', 'type_of_farmer', 'farmer_age'
+    )
+    name_low, name_high = prefix_range(Farmer.search_key(query))
+    nin_low, nin_high = prefix_range(query.upper())
+    phone_low, phone_high = prefix_range(query)
+    searches = [
+        approved.filter(search_name__gte=name_low, search_name__lt=name_high).order_by('search_name'),
+        approved.filter(nin__gte=nin_low, nin__lt=nin_high).order_by('nin'),
+        approved.filter(phone_number__gte=phone_low, phone_number__lt=phone_high).order_by('phone_number'),
+    ]
+    
+    matches = {}
+    for search in searches:
+        async for farmer in search[:limit]:
+            matches.setdefault(farmer.pk, farmer)
+    results = sorted(matches.values(), key=lambda farmer: farmer.farmer_name.lower())[:limit]
+    
+    return JsonResponse({
+        'results': [
+            {
+                'id': farmer.pk,
+                'farmer_name': farmer.farmer_name,
+                'nin': farmer.nin,
+                'phone_number': farmer.phone_number,
+                'type_of_farmer': farmer.type_of_farmer,
+                'farmer_age': farmer.farmer_age,
+            }
+            for farmer in results
+        ]
+    })
+
+@throttle('check_farmer_status')
+async def check_farmer_status(request: HttpRequest) -> JsonResponse:
     """Check farmer registration status by NIN and phone number"""
     if request.method == 'POST':
         try:
             data = json.loads(request.body)
-            nin = data.get('nin', '').strip()
-            phone = data.get('phone', '').strip()
+            if not isinstance(data, dict):
+                return JsonResponse({'success': False, 'error': 'Invalid request format'}, status=400)
+            nin, phone = data.get('nin'), data.get('phone')
+            nin = nin.strip() if isinstance(nin, str) else ''
+            phone = phone.strip() if isinstance(phone, str) else ''
             
             if not nin or not phone:
                 return JsonResponse({
@@ -700,15 +976,24 @@ def check_farmer_status(request: HttpRequest) -> JsonResponse:
                     'error': 'Both NIN and phone number are required'
                 }, status=400)
             
+            # Repeated lookups of unknown details are answered from a short negative cache
+            miss_key = 'farmer_status_miss:' + hashlib.sha256(f'{nin}|{phone}'.encode()).hexdigest()
+            not_found = {
+                'success': False,
+                'error': 'No farmer found with the provided NIN and phone number combination. Please verify your details or contact our office for registration.'
+            }
+            if await throttle_cache().aget(miss_key):
+                return JsonResponse(not_found)
+            
             # Search for farmer by NIN and phone
             try:
-                farmer = Farmer.objects.get(nin=nin, phone_number=phone)
+                farmer = await Farmer.objects.aget(nin=nin, phone_number=phone)
                 
-                # Get farmer's request count
-                total_requests = ChickRequest.objects.filter(farmer_name=farmer).count()
-                approved_requests = ChickRequest.objects.filter(farmer_name=farmer, status='approved').count()
-                pending_requests = ChickRequest.objects.filter(farmer_name=farmer, status='pending').count()
-                sold_requests = ChickRequest.objects.filter(farmer_name=farmer, status='sold').count()
+                # Request counts are denormalized onto the farmer row
+                total_requests = farmer.total_requests
+                approved_requests = farmer.approved_requests
+                pending_requests = farmer.pending_requests
+                sold_requests = farmer.sold_requests
                 
                 # Calculate status badge color
                 status_colors = {
@@ -744,12 +1029,10 @@ def check_farmer_status(request: HttpRequest) -> JsonResponse:
                 })
                 
             except Farmer.DoesNotExist:
-                return JsonResponse({
-                    'success': False,
-                    'error': 'No farmer found with the provided NIN and phone number combination. Please verify your details or contact our office for registration.'
-                })
+                await throttle_cache().aset(miss_key, True, timeout=getattr(settings, 'FARMER_STATUS_MISS_CACHE_SECONDS', 30))
+                return JsonResponse(not_found)
                 
-        except json.JSONDecodeError:
+        except ValueError:
             return JsonResponse({
                 'success': False,
                 'error': 'Invalid request format'
@@ -763,160 +1046,447 @@ def check_farmer_status(request: HttpRequest) -> JsonResponse:
     return JsonResponse({'success': False, 'error': 'Invalid request method'}, status=405)
 
 # Dashboard Statistics API
-@login_required
-def dashboard_stats_api(request: HttpRequest) -> JsonResponse:
-    """API endpoint for dashboard statistics"""
-    stats = {
-        'total_stock': Stock.objects.aggregate(total=Sum('quantity'))['total'] or 0,
-        'total_feedstock': Feedstock.objects.aggregate(total=Sum('quantity_of_feeds'))['total'] or 0,
+def dashboard_stats() -> dict:
+    stock = Stock.objects.aggregate(total=Sum('quantity'))
+    feedstock = Feedstock.objects.aggregate(total=Sum('quantity_of_feeds'))
+    requests_by_status = ChickRequest.objects.aggregate(
+        pending=Count('pk', filter=Q(status='pending')),
+        approved=Count('pk', filter=Q(status='approved')),
+        rejected=Count('pk', filter=Q(status='rejected')),
+    )
+    return {
+        'total_stock': stock['total'] or 0,
+        'total_feedstock': feedstock['total'] or 0,
         'total_farmers': Farmer.objects.count(),
-        'pending_requests': ChickRequest.objects.filter(status='pending').count(),
-        'approved_requests': ChickRequest.objects.filter(status='approved').count(),
-        'rejected_requests': ChickRequest.objects.filter(status='rejected').count(),
+        'pending_requests': requests_by_status['pending'],
+        'approved_requests': requests_by_status['approved'],
+        'rejected_requests': requests_by_status['rejected'],
     }
+
+@login_required
+@throttle('dashboard_stats_api')
+async def dashboard_stats_api(request: HttpRequest) -> JsonResponse:
+    """API endpoint for dashboard statistics"""
+    # The ORM's async calls each hop to the same sync thread one after another,
+    # so the four aggregates run in a single hop instead
+    stats = await sync_to_async(dashboard_stats)()
     return JsonResponse(stats)
 
+# Analytics API
+def analytics_snapshot_job(request: HttpRequest) -> Job:
+    """Queue the first analytics snapshot; it is built here when no worker claims it in time"""
+    return jobs.run_unclaimed(jobs.submit('analytics_snapshot', {}, request.user))
+
+def analytics_pending(job: Job) -> JsonResponse:
+    response = JsonResponse({
+        'success': False,
+        'error': 'Analytics are being prepared, please try again shortly',
+        'job': job_status(job),
+    }, status=503)
+    response.headers['Retry-After'] = '5'
+    return response
+
 @login_required
-def sales_report(request: HttpRequest) -> HttpResponse:
-    """Generate comprehensive sales report (Manager only)"""
-    if not getattr(request.user, 'is_manager', False):
-        messages.error(request, 'Only Managers can access sales reports.')
-        return redirect('manager_dashboard')
+@throttle('request_analytics')
+def request_analytics(request: HttpRequest) -> JsonResponse:
+    """Request counts and chick quantities grouped by any of the analytics dimensions (Manager only)
     
-    # Get date range from request (default to last 30 days)
-    from datetime import datetime, timedelta
+    e.g. ``?group_by=sale_month,chicks_type,chicks_breed&status=sold``; see
+    home/analytics.py for the dimensions and filters.
+    """
+    if not getattr(request.user, 'is_manager', False):
+        return JsonResponse({'success': False, 'error': 'Permission denied'}, status=403)
+    try:
+        group_by, filters = analytics.parse_query(request.GET)
+    except ValueError as exc:
+        return JsonResponse({'success': False, 'error': str(exc)}, status=400)
+    
+    cube = analytics.request_cube()
+    if cube is None:
+        job = analytics_snapshot_job(request)
+        cube = analytics.request_cube()
+        if cube is None:
+            return analytics_pending(job)
+    start = time.perf_counter()
+    rows = cube.query(group_by, filters)
+    return JsonResponse({
+        'success': True,
+        'group_by': group_by,
+        'rows': rows,
+        'refreshed_at': cube.refreshed_at,
+        'query_ms': round((time.perf_counter() - start) * 1000, 2),
+    })
+
+@login_required
+@throttle('farmer_cohorts')
+def farmer_cohorts(request: HttpRequest) -> JsonResponse:
+    """Retention of farmers by registration month and months since registration (Manager only)
     
-    end_date = timezone.now().date()
-    start_date = end_date - timedelta(days=30)
+    ``?cohort_from=YYYY-MM&cohort_to=YYYY-MM`` limits the cohorts and
+    ``?months=N`` the months since registration; see home/cohorts.py.
+    """
+    if not getattr(request.user, 'is_manager', False):
+        return JsonResponse({'success': False, 'error': 'Permission denied'}, status=403)
+    try:
+        first = analytics.month_number(request.GET['cohort_from']) if request.GET.get('cohort_from') else None
+        last = analytics.month_number(request.GET['cohort_to']) if request.GET.get('cohort_to') else None
+    except ValueError:
+        return JsonResponse({'success': False, 'error': 'cohort_from and cohort_to must be YYYY-MM'}, status=400)
+    try:
+        max_months = int(request.GET['months']) if request.GET.get('months') else None
+    except ValueError:
+        max_months = None
+    if max_months is not None and max_months < 1:
+        return JsonResponse({'success': False, 'error': 'months must be at least 1'}, status=400)
+    
+    farmer_cohorts = cohorts.farmer_cohorts()
+    if farmer_cohorts is None:
+        job = analytics_snapshot_job(request)
+        farmer_cohorts = cohorts.farmer_cohorts()
+        if farmer_cohorts is None:
+            return analytics_pending(job)
+    start = time.perf_counter()
+    rows = farmer_cohorts.matrix(first, last, max_months)
+    return JsonResponse({
+        'success': True,
+        'cohorts': rows,
+        'refreshed_at': farmer_cohorts.refreshed_at,
+        'query_ms': round((time.perf_counter() - start) * 1000, 2),
+    })
+
+@login_required
+@throttle('request_sla')
+def request_sla(request: HttpRequest) -> JsonResponse:
+    """p50/p90 time requests spend in each status, per week and per user (Manager only)
     
-    start_date_str = request.GET.get('start_date')
-    if start_date_str:
-        try:
-            start_date = datetime.strptime(start_date_str, '%Y-%m-%d').date()
-        except ValueError:
-            pass
+    ``?weeks=N`` sets how many weeks back to cover; see home/sla.py.
+    """
+    if not getattr(request.user, 'is_manager', False):
+        return JsonResponse({'success': False, 'error': 'Permission denied'}, status=403)
+    try:
+        weeks = int(request.GET['weeks']) if request.GET.get('weeks') else None
+    except ValueError:
+        weeks = None
+    if weeks is not None and not 1 <= weeks <= 104:
+        return JsonResponse({'success': False, 'error': 'weeks must be between 1 and 104'}, status=400)
+    return JsonResponse({'success': True, **sla.sla_summary(weeks)})
+
+# Read API: resource -> (list filter, ordering field, newest first)
+READ_API_RESOURCES = {
+    'stock': (filter_stocks, 'date_added', True),
+    'feedstock': (filter_feedstocks, 'date', True),
+    'farmers': (filter_farmers, 'farmer_name', False),
+    'requests': (filter_requests, 'date_time', True),
+}
+READ_API_PAGE_SIZE = 50
+
+def encode_cursor(value, pk) -> str:
+    # isoformat keeps microseconds, which the keyset comparison needs
+    payload = json.dumps([value, pk], default=lambda value: value.isoformat())
+    return base64.urlsafe_b64encode(payload.encode()).decode()
+
+def decode_cursor(cursor: str) -> tuple:
+    value, pk = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    return value, int(pk)
+
+@login_required
+@throttle('read_api')
+async def read_api(request: HttpRequest, resource: str) -> JsonResponse:
+    """Cursor-paginated JSON list of stock, feedstock, farmers or requests
+    
+    Accepts the list pages' filters (search, type, status), ``fields=`` to pick
+    columns, ``limit=`` and the ``cursor`` from the previous page. Rows are
+    serialized straight from values() and answered with 304 when the client's
+    ETag still matches.
+    """
+    filter_list, order_field, newest_first = READ_API_RESOURCES[resource]
+    queryset = filter_list(request.GET)
+    allowed = [field.name for field in queryset.model._meta.concrete_fields]
+    
+    fields = [field for field in request.GET.get('fields', '').split(',') if field] or allowed
+    unknown = [field for field in fields if field not in allowed]
+    if unknown:
+        return JsonResponse({'error': f'Unknown fields: {", ".join(unknown)}', 'fields': allowed}, status=400)
+    try:
+        limit = min(max(int(request.GET.get('limit', READ_API_PAGE_SIZE)), 1), 500)
+    except ValueError:
+        return JsonResponse({'error': 'limit must be an integer'}, status=400)
     
-    end_date_str = request.GET.get('end_date')
-    if end_date_str:
+    # Keyset on (ordering field, pk) so every page is an index range, however deep
+    cursor = request.GET.get('cursor')
+    if cursor:
         try:
-            end_date = datetime.strptime(end_date_str, '%Y-%m-%d').date()
-        except ValueError:
-            pass
-    
-    # Ensure start_date is not after end_date
-    if start_date > end_date:
-        start_date, end_date = end_date, start_date
-    
-    # Get all sales within date range
-    sales_in_range = ChickRequest.objects.filter(
-        status='sold',
-        sales_authorized_date__date__gte=start_date,
-        sales_authorized_date__date__lte=end_date,
-        sales_authorized_date__isnull=False
-    )
-    
-    # Sales by representative
-    sales_by_rep = {}
-    total_sales_value = 0
-    total_chicks_sold = 0
-    
-    for sale in sales_in_range:
-        if not sale.sales_authorized_date:
-            continue
-            
-        rep_name = sale.sales_authorized_by.username if sale.sales_authorized_by else 'Unknown'
-        rep_full_name = f"{sale.sales_authorized_by.first_name} {sale.sales_authorized_by.last_name}".strip() if sale.sales_authorized_by and (sale.sales_authorized_by.first_name or sale.sales_authorized_by.last_name) else rep_name
-        
-        if rep_name not in sales_by_rep:
-            sales_by_rep[rep_name] = {
-                'rep_name': rep_full_name,
-                'username': rep_name,
-                'total_sales': 0,
-                'total_chicks': 0,
-                'total_value': 0,
-                'farmers_served': set(),
-                'sales_details': []
-            }
-        
-        sale_value = sale.quantity * 1650  # UGX 1650 per chick
-        sales_by_rep[rep_name]['total_sales'] += 1
-        sales_by_rep[rep_name]['total_chicks'] += sale.quantity
-        sales_by_rep[rep_name]['total_value'] += sale_value
-        sales_by_rep[rep_name]['farmers_served'].add(sale.farmer_name.farmer_name)
-        sales_by_rep[rep_name]['sales_details'].append({
-            'date': sale.sales_authorized_date,
-            'farmer': sale.farmer_name.farmer_name,
-            'chick_type': sale.chicks_type,
-            'chick_breed': sale.chicks_breed,
-            'quantity': sale.quantity,
-            'value': sale_value,
-            'request_id': sale.pk
-        })
-        
-        total_sales_value += sale_value
-        total_chicks_sold += sale.quantity
-    
-    # Convert farmers_served sets to counts and calculate averages
-    for rep_data in sales_by_rep.values():
-        rep_data['unique_farmers'] = len(rep_data['farmers_served'])
-        rep_data['farmers_served'] = list(rep_data['farmers_served'])
-        # Calculate average per sale
-        rep_data['avg_per_sale'] = rep_data['total_value'] / rep_data['total_sales'] if rep_data['total_sales'] > 0 else 0
-    
-    # Sort sales details by date (most recent first)
-    for rep_data in sales_by_rep.values():
-        rep_data['sales_details'].sort(key=lambda x: x['date'], reverse=True)
-    
-    # Overall statistics
-    total_sales_count = sales_in_range.count()
-    active_sales_reps = len(sales_by_rep)
-    
-    # Top performing sales rep
-    top_rep = None
-    if sales_by_rep:
-        top_rep = max(sales_by_rep.values(), key=lambda x: x['total_value'])
-        # Add avg_per_sale to top_rep if not already present
-        if 'avg_per_sale' not in top_rep:
-            top_rep['avg_per_sale'] = top_rep['total_value'] / top_rep['total_sales'] if top_rep['total_sales'] > 0 else 0
-    
-    # Daily sales breakdown
-    daily_sales = {}
-    for sale in sales_in_range:
-        if not sale.sales_authorized_date:
-            continue
+            value, pk = decode_cursor(cursor)
+        except (ValueError, TypeError):
+            return JsonResponse({'error': 'Invalid cursor'}, status=400)
+        after = 'lt' if newest_first else 'gt'
+        queryset = queryset.filter(
+            Q(**{f'{order_field}__{after}': value}) | Q(**{order_field: value, f'pk__{after}': pk})
+        )
+    ordering = (f'-{order_field}', '-pk') if newest_first else (order_field, 'pk')
+    
+    selected = list(dict.fromkeys(['id', order_field, *fields]))
+    rows = [row async for row in queryset.order_by(*ordering).values(*selected)[:limit + 1]]
+    next_cursor = encode_cursor(rows[limit - 1][order_field], rows[limit - 1]['id']) if len(rows) > limit else None
+    rows = rows[:limit]
+    
+    # Drop the columns only fetched for the cursor
+    extra = set(selected) - set(fields)
+    if extra:
+        rows = [{key: value for key, value in row.items() if key not in extra} for row in rows]
+    
+    response = JsonResponse({'results': rows, 'next_cursor': next_cursor}, json_dumps_params={'separators': (',', ':')})
+    etag = quote_etag(hashlib.md5(response.content, usedforsecurity=False).hexdigest())
+    response.headers['ETag'] = etag
+    patch_cache_control(response, private=True, no_cache=True)
+    return get_conditional_response(request, etag=etag, response=response)
+
+INGEST_BATCH_LIMIT = 500
+
+def form_errors(form) -> dict:
+    return {field: list(errors) for field, errors in form.errors.items()}
+
+def ingest_farmer(user: UserProfile, data: dict) -> tuple:
+    """Register one farmer with the farmer_create rules; returns (farmer, None) or (None, errors)"""
+    if not getattr(user, 'is_salesagent', False):
+        return None, {'__all__': ['Only Sales Agents can register farmers.']}
+    form = FarmerForm(data)
+    if not form.is_valid():
+        return None, form_errors(form)
+    farmer = form.save(commit=False)
+    farmer.status = 'pending'  # Ensure status is pending
+    farmer.save()
+    return farmer, None
+
+def ingest_request(user: UserProfile, data: dict) -> tuple:
+    """Create one chick request with the request_create rules; returns (request, None) or (None, errors)"""
+    farmer = Farmer.objects.filter(nin=str(data.get('farmer_nin', '')).strip()).first()
+    if farmer is None:
+        return None, {'farmer_nin': ['No farmer is registered with this NIN.']}
+    # ChickRequestForm only accepts approved farmers
+    form = ChickRequestForm({**data, 'farmer_name': farmer.pk})
+    if not form.is_valid():
+        if 'farmer_name' in form.errors:
+            return None, {'farmer_nin': [f'Farmer "{farmer.farmer_name}" is not approved yet.']}
+        return None, form_errors(form)
+    cooldown_error = request_cooldown_error(farmer)
+    if cooldown_error:
+        return None, {'__all__': [cooldown_error]}
+    return form.save(), None
+
+INGESTERS = {
+    'farmer': ingest_farmer,
+    'request': ingest_request,
+}
+
+@login_required
+@throttle('batch_ingest')
+def batch_ingest(request: HttpRequest) -> JsonResponse:
+    """Create farmers and chick requests captured offline, at most once per client idempotency key
+    
+    Items are validated and saved in order inside one transaction, so later
+    items see earlier ones (a NIN registered twice, a second request inside
+    the cooldown). Accepted keys are remembered; replaying them returns the
+    original outcome without validating again.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'success': False, 'error': 'Invalid request method'}, status=405)
+    try:
+        items = json.loads(request.body)['items']
+    except (ValueError, KeyError, TypeError):
+        return JsonResponse({'success': False, 'error': 'Expected a JSON object with an "items" list'}, status=400)
+    if not isinstance(items, list) or len(items) > INGEST_BATCH_LIMIT:
+        return JsonResponse({'success': False, 'error': f'"items" must be a list of at most {INGEST_BATCH_LIMIT} entries'}, status=400)
+    
+    keys = [item.get('key') for item in items if isinstance(item, dict)]
+    results = []
+    with transaction.atomic():
+        accepted = {
+            record.idempotency_key: record
+            for record in IngestionRecord.objects.filter(created_by=request.user, idempotency_key__in=keys)
+        }
+        for item in items:
+            key = item.get('key') if isinstance(item, dict) else None
+            kind = item.get('type') if isinstance(item, dict) else None
+            if not isinstance(key, str) or not 0 < len(key) <= 64 or kind not in INGESTERS:
+                results.append({'key': key, 'type': kind, 'status': 'rejected',
+                                'errors': {'__all__': ['Each item needs a "key" (1-64 characters) and a "type" of "farmer" or "request".']}})
+                continue
+            if key in accepted:
+                record = accepted[key]
+                results.append({'key': key, 'type': record.kind, 'status': 'replayed', 'id': record.object_id})
+                continue
             
-        date_str = sale.sales_authorized_date.strftime('%Y-%m-%d')
-        if date_str not in daily_sales:
-            daily_sales[date_str] = {
-                'date': sale.sales_authorized_date.date(),
-                'sales_count': 0,
-                'chicks_sold': 0,
-                'total_value': 0
-            }
-        daily_sales[date_str]['sales_count'] += 1
-        daily_sales[date_str]['chicks_sold'] += sale.quantity
-        daily_sales[date_str]['total_value'] += sale.quantity * 1650
+            data = item.get('data') if isinstance(item.get('data'), dict) else {}
+            try:
+                # A savepoint per item, so losing the race below undoes only this item
+                with transaction.atomic():
+                    obj, errors = INGESTERS[kind](request.user, data)
+                    if not errors:
+                        accepted[key] = IngestionRecord.objects.create(
+                            idempotency_key=key, kind=kind, object_id=obj.pk, created_by=request.user
+                        )
+            except IntegrityError:
+                # A concurrent upload of the same key committed first; its outcome stands
+                record = IngestionRecord.objects.filter(created_by=request.user, idempotency_key=key).first()
+                if record is None:
+                    # Another upload saved a conflicting row (e.g. the same NIN) under a different key
+                    results.append({'key': key, 'type': kind, 'status': 'rejected',
+                                    'errors': {'__all__': ['Conflicts with a record saved at the same time; resend to validate it again.']}})
+                    continue
+                accepted[key] = record
+                results.append({'key': key, 'type': record.kind, 'status': 'replayed', 'id': record.object_id})
+                continue
+            if errors:
+                results.append({'key': key, 'type': kind, 'status': 'rejected', 'errors': errors})
+                continue
+            results.append({'key': key, 'type': kind, 'status': 'created', 'id': obj.pk})
+    
+    outcomes = Counter(result['status'] for result in results)
+    return JsonResponse({
+        'success': True,
+        'created': outcomes['created'],
+        'replayed': outcomes['replayed'],
+        'rejected': outcomes['rejected'],
+        'results': results,
+    })
+
+CHANGE_FEED_LIMIT = 500
+
+@login_required
+@throttle('change_feed')
+async def change_feed(request: HttpRequest) -> JsonResponse:
+    """Farmer, ChickRequest and Stock changes after ?since=<cursor>, for clients syncing deltas
     
-    # Convert to sorted list and add average per sale
-    daily_sales_list = []
-    for day_data in daily_sales.values():
-        day_data['avg_per_sale'] = day_data['total_value'] / day_data['sales_count'] if day_data['sales_count'] > 0 else 0
-        daily_sales_list.append(day_data)
+    Each change carries the row's current values, or ``"deleted": true`` as a
+    tombstone. Clients store the returned cursor and ask again while ``more``.
+    """
+    try:
+        since = int(request.GET.get('since', 0))
+        limit = min(max(int(request.GET.get('limit', CHANGE_FEED_LIMIT)), 1), 2000)
+    except ValueError:
+        return JsonResponse({'error': 'since and limit must be integers'}, status=400)
+    
+    entries = [
+        entry async for entry in ChangeLog.objects.filter(pk__gt=since).order_by('pk')
+        .values_list('pk', 'model', 'object_id', 'action')[:limit]
+    ]
+    
+    # Only the last change per object matters, placed where that change happened
+    latest = {}
+    for _, model, object_id, action in entries:
+        latest.pop((model, object_id), None)
+        latest[(model, object_id)] = action
+    
+    upserted = defaultdict(list)
+    for (model, object_id), action in latest.items():
+        if action == 'upsert':
+            upserted[model].append(object_id)
+    rows = {}
+    for model, object_ids in upserted.items():
+        async for row in ChangeLog.SYNCED_MODELS[model].objects.filter(pk__in=object_ids).values():
+            rows[(model, row.pop('id'))] = row
+    
+    changes = []
+    for key, action in latest.items():
+        model, object_id = key
+        # A row missing here was deleted after this batch; its delete entry follows later
+        if key in rows:
+            changes.append({'model': model, 'id': object_id, 'data': rows[key]})
+        else:
+            changes.append({'model': model, 'id': object_id, 'deleted': True})
+    
+    return JsonResponse(
+        {
+            'cursor': entries[-1][0] if entries else since,
+            'more': len(entries) == limit,
+            'changes': changes,
+        },
+        json_dumps_params={'separators': (',', ':')},
+    )
+
+# Background jobs API
+def job_status(job: Job) -> dict:
+    return {
+        'id': job.pk,
+        'kind': job.kind,
+        'params': job.params,
+        'status': job.status,
+        'error': job.error,
+        'created_at': job.created_at,
+        'started_at': job.started_at,
+        'finished_at': job.finished_at,
+        'status_url': reverse('api_job_status', args=[job.pk]),
+        'result_url': reverse('api_job_result', args=[job.pk]),
+    }
+
+@login_required
+@throttle('jobs')
+def job_submit(request: HttpRequest) -> JsonResponse:
+    """Queue a background job, or return the current one computing the same kind and params"""
+    if request.method != 'POST':
+        return JsonResponse({'success': False, 'error': 'Invalid request method'}, status=405)
+    try:
+        data = json.loads(request.body)
+    except ValueError:
+        data = None
+    if not isinstance(data, dict) or 'kind' not in data:
+        return JsonResponse({'success': False, 'error': 'Expected a JSON object with "kind" and "params"'}, status=400)
+    kind, params = data['kind'], data.get('params') or {}
+    if not isinstance(params, dict) or not isinstance(kind, str) or kind not in jobs.JOB_KINDS:
+        return JsonResponse({'success': False, 'error': 'Unknown job kind or invalid params'}, status=400)
+    if not jobs.can_access(request.user, kind):
+        return JsonResponse({'success': False, 'error': 'Permission denied'}, status=403)
+    
+    job = jobs.submit(kind, params, request.user)
+    return JsonResponse({'success': True, 'job': job_status(job)}, status=200 if job.status == 'done' else 202)
+
+@login_required
+@throttle('jobs')
+def job_detail(request: HttpRequest, job_id: int) -> JsonResponse:
+    """Status of a background job, for polling"""
+    job = Job.objects.defer('result').filter(pk=job_id).first()
+    if job is None or not jobs.can_access(request.user, job.kind):
+        return JsonResponse({'success': False, 'error': 'Job not found'}, status=404)
+    return JsonResponse({'success': True, 'job': job_status(job)})
+
+@login_required
+@throttle('jobs')
+def job_result(request: HttpRequest, job_id: int) -> JsonResponse:
+    """Result of a finished background job; 409 until it is done"""
+    job = Job.objects.filter(pk=job_id).first()
+    if job is None or not jobs.can_access(request.user, job.kind):
+        return JsonResponse({'success': False, 'error': 'Job not found'}, status=404)
+    if job.status != 'done':
+        return JsonResponse({'success': False, 'error': f'Job is {job.status}', 'job': job_status(job)}, status=409)
+    return JsonResponse({'success': True, 'job': job_status(job), 'result': job.result})
+
+@login_required
+def sales_report(request: HttpRequest) -> HttpResponse:
+    """Generate comprehensive sales report (Manager only)
     
-    daily_sales_list = sorted(daily_sales_list, key=lambda x: x['date'], reverse=True)
+    The report is computed by a background job; while it runs the page polls
+    the job and reloads itself once the result is stored, or after
+    JOB_INLINE_AFTER_SECONDS, when a job no worker has claimed is run here.
+    """
+    if not getattr(request.user, 'is_manager', False):
+        messages.error(request, 'Only Managers can access sales reports.')
+        return redirect('manager_dashboard')
     
+    start_date, end_date = sales_report_range(request.GET)
+    job = jobs.run_unclaimed(jobs.submit('sales_report', request.GET, request.user))
     context = {
         'start_date': start_date,
         'end_date': end_date,
-        'sales_by_rep': sales_by_rep,
-        'total_sales_count': total_sales_count,
-        'total_chicks_sold': total_chicks_sold,
-        'total_sales_value': total_sales_value,
-        'active_sales_reps': active_sales_reps,
-        'top_rep': top_rep,
-        'daily_sales': daily_sales_list,
-        'average_sale_value': total_sales_value / total_sales_count if total_sales_count > 0 else 0,
-        'average_chicks_per_sale': total_chicks_sold / total_sales_count if total_sales_count > 0 else 0,
     }
+    if job.status != 'done':
+        context.update({
+            'job': job,
+            'status_url': reverse('api_job_status', args=[job.pk]),
+            'reload_after': getattr(settings, 'JOB_INLINE_AFTER_SECONDS', 15),
+        })
+        return render(request, 'reports/report_pending.html', context, using=hot_page_engine())
     
-    return render(request, 'reports/sales_report.html', context)
+    context.update(sales_report_context(job.result))
+    context['generated_at'] = job.finished_at
+    return render(request, 'reports/sales_report.html', context, using=hot_page_engine())